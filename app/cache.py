@@ -0,0 +1,145 @@
+import hashlib
+import pickle
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Hashable
+
+try:
+    from redis import asyncio as redis
+except ImportError:  # optional, only needed for RESULT_CACHE_URL
+    redis = None
+
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ResultCache(ABC):
+    """Read-through cache of analytics results.
+
+    Every entry belongs to a ``group`` (a departure/arrival pair) so writes
+    can drop only the results they make stale. ``get`` returns ``MISSING``
+    rather than ``None``, so "no route" results can be cached too.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    async def get(self, key: Hashable) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, key: Hashable, value: Any, group: Hashable):
+        ...
+
+    @abstractmethod
+    async def invalidate(self, group: Hashable):
+        ...
+
+
+class LocalResultCache(ResultCache):
+    """In-process LRU cache with a per-entry TTL.
+
+    Invalidation only reaches this worker's entries: other workers keep
+    serving theirs until the TTL expires. Set ``RESULT_CACHE_URL`` to share
+    one cache, and its invalidations, across workers.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires, group, value)
+        self._groups: dict[Hashable, set] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.stats.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[2]
+
+    async def set(self, key, value, group):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, group, value)
+        self._groups.setdefault(group, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    async def invalidate(self, group):
+        for key in self._groups.pop(group, ()):
+            self._entries.pop(key, None)
+            self.stats.invalidations += 1
+
+    def _remove(self, key):
+        _, group, _ = self._entries.pop(key)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+
+class RedisResultCache(ResultCache):
+    """Cache shared by all gunicorn workers.
+
+    Redis expires entries after ``ttl`` and should run with an LRU
+    ``maxmemory-policy`` to bound its size; hit/miss counters are per worker.
+    """
+
+    def __init__(self, url: str, ttl: float = 60.0, prefix: str = "flights"):
+        if redis is None:
+            raise RuntimeError("RESULT_CACHE_URL requires the 'redis' package")
+        super().__init__()
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key):
+        payload = await self.client.get(self._key(key))
+        if payload is None:
+            self.stats.misses += 1
+            return MISSING
+        self.stats.hits += 1
+        return pickle.loads(payload)
+
+    async def set(self, key, value, group):
+        name, group_name = self._key(key), self._key(group, "group")
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(name, pickle.dumps(value), px=int(self.ttl * 1000))
+            pipe.sadd(group_name, name)
+            pipe.pexpire(group_name, int(self.ttl * 1000))
+            await pipe.execute()
+
+    async def invalidate(self, group):
+        group_name = self._key(group, "group")
+        names = await self.client.smembers(group_name)
+        if names:
+            await self.client.delete(*names)
+            self.stats.invalidations += len(names)
+        await self.client.delete(group_name)
+
+    def _key(self, key, kind="result") -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f"{self.prefix}:{kind}:{digest}"
@@ -1,8 +1,94 @@
+import asyncio
+import logging
+import time
+from datetime import date
+from functools import lru_cache
+
 from databases import Database
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 
-from .models import metadata
+from .cache import LocalResultCache, RedisResultCache
+from .executor import ComputeExecutor
+from .graph import RouteGraphEngine
+from .jobs import JobRunner
+from .metrics import Metrics
+from .models import flights, metadata, route_signature, route_sketches
+from .partitions import (
+    EXISTING_PARTITIONS,
+    TABLE_EXISTS,
+    FlightPartitions,
+    add_months,
+    create_partition,
+    month_start,
+    months,
+    partition_month,
+    partition_name,
+    retire_partition,
+)
 from .settings import Settings
+from .sketch import TDigest
+from .slowlog import SlowQueryLog
+from .waypoints import WaypointDirectory
+
+logger = logging.getLogger(__name__)
+
+
+# seeds route_usage from flights written before the aggregate existed
+BACKFILL_ROUTE_USAGE = """
+    INSERT INTO route_usage (
+        departure, arrival, airline_id, aircraft_id, day, fpl,
+        flight_count, fuel_sum, duration_sum
+    )
+    SELECT
+        departure, arrival, airline_id, aircraft_id, departure_time::date, fpl,
+        COUNT(*),
+        COALESCE(SUM(fuel_consumption), 0),
+        COALESCE(SUM(EXTRACT(EPOCH FROM arrival_time - departure_time)), 0)
+    FROM flights
+    WHERE NOT EXISTS (SELECT 1 FROM route_usage)
+        AND departure IS NOT NULL AND arrival IS NOT NULL
+        AND airline_id IS NOT NULL AND aircraft_id IS NOT NULL
+        AND departure_time IS NOT NULL AND fpl IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+# per-route daily values for route_sketches, when flights predate the sketches
+BACKFILL_ROUTE_SKETCHES = """
+    SELECT
+        departure, arrival, departure_time::date AS day, fpl,
+        COUNT(*) AS flight_count,
+        array_agg(fuel_consumption) AS fuel,
+        array_agg(
+            EXTRACT(EPOCH FROM arrival_time - departure_time)::double precision
+        ) AS block_time
+    FROM flights
+    WHERE NOT EXISTS (SELECT 1 FROM route_sketches)
+        AND departure IS NOT NULL AND arrival IS NOT NULL
+        AND departure_time IS NOT NULL AND fpl IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+"""
+BACKFILL_BATCH_SIZE = 1000
+
+
+# rows of a pre-partitioning flights table, moved into the partitioned one
+MOVE_UNPARTITIONED_FLIGHTS = """
+    WITH moved AS (
+        DELETE FROM flights_unpartitioned
+        WHERE departure_time IS NOT NULL
+        RETURNING *
+    )
+    INSERT INTO flights (
+        id, airline_id, aircraft_id, departure, arrival,
+        departure_time, arrival_time, fuel_consumption, fpl, flown_fpl
+    )
+    SELECT
+        id, airline_id, aircraft_id, departure, arrival,
+        departure_time, arrival_time, fuel_consumption, fpl, flown_fpl
+    FROM moved
+"""
 
 
 async def create_db_and_tables():
@@ -10,14 +96,255 @@ async def create_db_and_tables():
 
     engine = create_async_engine(settings.db_url)
     async with engine.begin() as conn:
+        unpartitioned = await conn.run_sync(_set_aside_unpartitioned_flights)
         await conn.run_sync(metadata.create_all)
+        await conn.run_sync(_upgrade_tables)
+        await conn.run_sync(_partition_flights, unpartitioned, settings)
+        await conn.execute(text(BACKFILL_ROUTE_USAGE))
+        await _backfill_route_sketches(conn)
+    await engine.dispose()
+
+
+async def _backfill_route_sketches(conn):
+    """Sketch the flights of every route and day, streaming the groups."""
+    result = await conn.stream(text(BACKFILL_ROUTE_SKETCHES))
+    async for rows in result.mappings().partitions(BACKFILL_BATCH_SIZE):
+        await conn.execute(
+            route_sketches.insert(),
+            [
+                {
+                    "departure": row["departure"],
+                    "arrival": row["arrival"],
+                    "day": row["day"],
+                    "fpl": row["fpl"],
+                    "flight_count": row["flight_count"],
+                    "fuel": TDigest.of(row["fuel"]).to_bytes(),
+                    "block_time": TDigest.of(row["block_time"]).to_bytes(),
+                }
+                for row in rows
+            ],
+        )
+
+
+def _upgrade_tables(conn):
+    """Add newer columns and indexes to pre-existing tables."""
+    conn.execute(route_signature)
+    conn.execute(
+        text("ALTER TABLE edges ADD COLUMN IF NOT EXISTS eet double precision")
+    )
+    conn.execute(
+        text("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS heartbeat_at timestamptz")
+    )
+    for index in flights.indexes:
+        index.create(conn, checkfirst=True)
 
 
+def _set_aside_unpartitioned_flights(conn) -> bool:
+    """Rename a plain ``flights`` table out of the way of the partitioned one.
+
+    Returns whether a ``flights_unpartitioned`` table is waiting to be moved.
+    """
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('flights')")
+    ).scalar()
+    if kind != "r":
+        return conn.execute(
+            text("SELECT to_regclass('flights_unpartitioned') IS NOT NULL")
+        ).scalar()
+
+    conn.execute(
+        text("ALTER TABLE flights ADD COLUMN IF NOT EXISTS flown_fpl integer[]")
+    )
+    conn.execute(
+        text(
+            """
+            ALTER TABLE IF EXISTS trajectories
+            DROP CONSTRAINT IF EXISTS trajectories_flight_id_fkey
+            """
+        )
+    )
+    conn.execute(text("ALTER TABLE flights RENAME TO flights_unpartitioned"))
+    indexes = conn.execute(
+        text(
+            """
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'flights_unpartitioned'
+                AND schemaname = current_schema()
+            """
+        )
+    ).scalars()
+    for index in indexes.all():
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+    conn.execute(
+        text(
+            """
+            ALTER SEQUENCE IF EXISTS flights_id_seq
+            RENAME TO flights_unpartitioned_id_seq
+            """
+        )
+    )
+    return True
+
+
+def _partition_flights(conn, unpartitioned: bool, settings: Settings):
+    """Create monthly partitions up to ``FLIGHTS_PARTITIONS_AHEAD`` months from
+    now, move rows over from an unpartitioned table, and retire months older
+    than ``FLIGHTS_RETENTION_MONTHS``."""
+    this_month = month_start(date.today())
+    first = this_month
+    if unpartitioned:
+        oldest = conn.execute(
+            text("SELECT min(departure_time) FROM flights_unpartitioned")
+        ).scalar()
+        if oldest is not None:
+            first = min(first, month_start(oldest))
+    last = add_months(this_month, settings.FLIGHTS_PARTITIONS_AHEAD)
+    for month in months(first, last):
+        conn.execute(text(create_partition(month)))
+
+    if unpartitioned:
+        conn.execute(text(MOVE_UNPARTITIONED_FLIGHTS))
+        conn.execute(
+            text(
+                """
+                SELECT setval(pg_get_serial_sequence('flights', 'id'), GREATEST(
+                    (SELECT max(id) FROM flights),
+                    (SELECT max(id) FROM flights_unpartitioned),
+                    1
+                ))
+                """
+            )
+        )
+        left = conn.execute(text("SELECT count(*) FROM flights_unpartitioned")).scalar()
+        if left:
+            logger.warning(
+                "%s flights without departure_time left in flights_unpartitioned",
+                left,
+            )
+        else:
+            conn.execute(text("DROP TABLE flights_unpartitioned"))
+
+    if settings.FLIGHTS_RETENTION_MONTHS > 0:
+        cutoff = add_months(this_month, -settings.FLIGHTS_RETENTION_MONTHS)
+        names = conn.execute(text(EXISTING_PARTITIONS)).scalars().all()
+        schema = settings.FLIGHTS_ARCHIVE_SCHEMA
+        for month in sorted(filter(None, map(partition_month, names))):
+            if add_months(month, 1) > cutoff:
+                break
+            archived = f"{schema}.{partition_name(month)}"
+            if schema and conn.execute(text(TABLE_EXISTS), {"name": archived}).scalar():
+                logger.warning("Not retiring %s: %s exists", month, archived)
+                continue
+            for statement in retire_partition(month, schema):
+                conn.execute(text(statement))
+            logger.info("Retired flights partition %s", partition_name(month))
+
+
+@lru_cache
 def get_settings():
     return Settings()
 
 
-async def get_db():
+@lru_cache
+def get_route_graph():
+    settings = get_settings()
+    return RouteGraphEngine(
+        contract=settings.ROUTE_GRAPH_CONTRACT,
+        verify_samples=settings.ROUTE_GRAPH_VERIFY_SAMPLES,
+        snapshot_path=settings.ROUTE_GRAPH_SNAPSHOT,
+        snapshot_max_age=settings.ROUTE_GRAPH_SNAPSHOT_MAX_AGE,
+    )
+
+
+@lru_cache
+def get_executor():
+    settings = get_settings()
+    return ComputeExecutor(
+        processes=settings.EXECUTOR_PROCESSES,
+        threads=settings.EXECUTOR_THREADS,
+        max_pending=settings.EXECUTOR_MAX_PENDING,
+        timeout=settings.EXECUTOR_TIMEOUT,
+    )
+
+
+@lru_cache
+def get_job_runner():
+    settings = get_settings()
+    return JobRunner(
+        workers=settings.JOB_WORKERS,
+        result_ttl=settings.JOB_RESULT_TTL,
+        poll_interval=settings.JOB_POLL_INTERVAL,
+        lease=settings.JOB_LEASE,
+        purge_interval=settings.JOB_PURGE_INTERVAL,
+        settings=settings,
+    )
+
+
+@lru_cache
+def get_metrics():
+    settings = get_settings()
+    return Metrics() if settings.METRICS_ENABLED else None
+
+
+@lru_cache
+def get_slow_query_log():
+    settings = get_settings()
+    if settings.SLOW_QUERY_THRESHOLD <= 0:
+        return None
+    return SlowQueryLog(
+        threshold=settings.SLOW_QUERY_THRESHOLD,
+        explain_rate=settings.SLOW_QUERY_EXPLAIN_RATE,
+        size=settings.SLOW_QUERY_LOG_SIZE,
+        analyze=settings.SLOW_QUERY_EXPLAIN_ANALYZE,
+    )
+
+
+@lru_cache
+def get_flight_partitions():
+    settings = get_settings()
+    return FlightPartitions(archive_schema=settings.FLIGHTS_ARCHIVE_SCHEMA)
+
+
+@lru_cache
+def get_waypoint_directory():
+    return WaypointDirectory()
+
+
+@lru_cache
+def get_result_cache():
+    settings = get_settings()
+    if settings.RESULT_CACHE_URL:
+        return RedisResultCache(settings.RESULT_CACHE_URL, settings.RESULT_CACHE_TTL)
+    return LocalResultCache(settings.RESULT_CACHE_SIZE, settings.RESULT_CACHE_TTL)
+
+
+def create_database(settings: Settings = None) -> Database:
+    """App-lifetime database; its asyncpg pool is opened once in lifespan."""
+    settings = settings or get_settings()
+    return Database(
+        settings.db_url,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+    )
+
+
+async def get_db(request: Request):
+    """Borrow one pooled connection for the duration of the request."""
     settings = get_settings()
-    async with Database(settings.db_url) as db:
-        yield db
+    metrics = get_metrics()
+    connection = request.app.state.db.connection()
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            connection.__aenter__(), settings.DB_POOL_ACQUIRE_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(503, "Database connection pool exhausted")
+    finally:
+        if metrics is not None:
+            metrics.pool_wait_seconds.observe(time.perf_counter() - started)
+    try:
+        yield connection
+    finally:
+        await connection.__aexit__()
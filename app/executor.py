@@ -0,0 +1,106 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+
+class ExecutorSaturated(RuntimeError):
+    """More tasks are queued or running than ``max_pending`` allows."""
+
+
+@dataclass
+class ExecutorStats:
+    submitted: int = 0
+    completed: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ComputeExecutor:
+    """Runs CPU-bound work off the event loop.
+
+    ``run`` uses a thread pool, for NumPy/SciPy code that releases the GIL and
+    for work on in-process objects such as the route graph. ``run_process``
+    uses a process pool for pure-Python work on picklable inputs, such as
+    parsing; with ``processes=0`` it falls back to the threads.
+
+    Both share one bound of ``max_pending`` queued or running tasks; beyond it
+    submissions fail fast with ``ExecutorSaturated`` rather than queue up.
+    A task still running at ``timeout`` raises ``asyncio.TimeoutError`` to its
+    caller. It cannot be interrupted, so it keeps counting as pending until it
+    ends.
+    """
+
+    def __init__(
+        self,
+        processes: int = 2,
+        threads: int = 4,
+        max_pending: int = 64,
+        timeout: float = 30.0,
+    ):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.stats = ExecutorStats()
+        self.pending = 0
+        self._lock = threading.Lock()  # done callbacks run on pool threads
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="compute")
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    async def run(self, fn: Callable, *args, timeout: float = None) -> Any:
+        return await self._submit(self._threads, fn, args, timeout)
+
+    async def run_process(self, fn: Callable, *args, timeout: float = None) -> Any:
+        return await self._submit(self._process_pool(), fn, args, timeout)
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+    def _process_pool(self) -> Executor:
+        if not self.processes:
+            return self._threads
+        if self._processes is None:
+            # spawn: forking a process that runs an event loop and threads
+            # can copy held locks into the child
+            self._processes = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._processes
+
+    async def _submit(self, pool: Executor, fn, args, timeout):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.stats.rejected += 1
+                raise ExecutorSaturated(f"{self.pending} tasks pending")
+            self.pending += 1
+            self.stats.submitted += 1
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            # e.g. a shut down pool or a broken process pool: nothing to release
+            with self._lock:
+                self.pending -= 1
+                self.stats.submitted -= 1
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()  # only stops it if it has not started yet
+            with self._lock:
+                self.stats.timeouts += 1
+            raise
+
+    def _release(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+            self.stats.completed += 1
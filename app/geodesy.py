@@ -0,0 +1,105 @@
+"""Vectorized great-circle geometry over waypoint coordinates (degrees, km)."""
+from typing import NamedTuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class CandidateEdges(NamedTuple):
+    sources: np.ndarray  # positions in the input coordinate arrays
+    targets: np.ndarray
+    costs: np.ndarray  # great-circle distance, km
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; arguments broadcast against each other."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def pairwise_haversine(lat, lon) -> np.ndarray:
+    """Full ``n x n`` distance matrix; only meant for small point sets."""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    return haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def to_unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.asarray(km) / (2 * EARTH_RADIUS_KM))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+class SpatialIndex:
+    """KD-tree over unit-sphere vectors.
+
+    Chord length is monotonic in great-circle distance, so euclidean nearest
+    neighbours in 3D are the great-circle nearest neighbours.
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.tree = cKDTree(to_unit_vectors(self.lat, self.lon))
+
+    def __len__(self):
+        return len(self.lat)
+
+    def nearest(self, lat, lon, k: int = 1):
+        """Return ``(distances_km, positions)`` of the ``k`` nearest points."""
+        k = min(k, len(self))
+        chord, positions = self.tree.query(to_unit_vectors(lat, lon), k=k)
+        return chord_to_km(chord), positions
+
+    def within(self, lat, lon, radius_km: float) -> list[list[int]]:
+        return self.tree.query_ball_point(
+            to_unit_vectors(lat, lon), float(km_to_chord(radius_km))
+        )
+
+    def knn_edges(self, k: int, symmetric: bool = True) -> CandidateEdges:
+        """Connect every point to its ``k`` nearest neighbours."""
+        if len(self) < 2:
+            return _edges(np.empty(0, np.int64), np.empty(0, np.int64), self)
+        _, positions = self.tree.query(self.tree.data, k=min(k + 1, len(self)))
+        sources = np.repeat(np.arange(len(self)), positions.shape[1])
+        targets = positions.ravel()
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+        if symmetric:
+            sources, targets = (
+                np.concatenate((sources, targets)),
+                np.concatenate((targets, sources)),
+            )
+        return _edges(sources, targets, self)
+
+    def radius_edges(self, radius_km: float) -> CandidateEdges:
+        """Connect every pair of points closer than ``radius_km``, both ways."""
+        pairs = self.tree.query_pairs(
+            float(km_to_chord(radius_km)), output_type="ndarray"
+        )
+        sources = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        targets = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        return _edges(sources, targets, self)
+
+
+def _edges(sources: np.ndarray, targets: np.ndarray, index: SpatialIndex):
+    if len(sources):
+        pairs = np.unique(np.column_stack((sources, targets)), axis=0)
+        sources, targets = pairs[:, 0], pairs[:, 1]
+    costs = haversine(
+        index.lat[sources], index.lon[sources], index.lat[targets], index.lon[targets]
+    )
+    return CandidateEdges(sources.astype(np.int64), targets.astype(np.int64), costs)
@@ -0,0 +1,718 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from enum import Enum
+from functools import cached_property
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+from databases.core import Connection
+
+from .geodesy import EARTH_RADIUS_KM, SpatialIndex, haversine, to_unit_vectors
+from .hierarchy import ContractionHierarchy, verify
+from .snapshot import (
+    SnapshotError,
+    read_header,
+    read_snapshot,
+    snapshot_lock,
+    write_snapshot,
+)
+from .wind import DEFAULT_TAS_KT, KM_PER_NM
+
+logger = logging.getLogger(__name__)
+
+
+class SearchAlgorithm(str, Enum):
+    dijkstra = "dijkstra"
+    astar = "astar"
+    bidirectional = "bidirectional"
+    ch = "ch"  # contraction hierarchy
+
+
+class CostMetric(str, Enum):
+    distance = "distance"  # km
+    time = "time"  # seconds, wind-corrected when a wind snapshot was applied
+
+
+class SearchResult(NamedTuple):
+    path: list[int]  # internal node indices, departure first
+    cost: float
+    expanded: int
+
+
+class ParetoPath(NamedTuple):
+    path: list[int]
+    time: float  # seconds
+    distance: float  # km
+
+
+class RouteGraph:
+    """Immutable waypoint graph in CSR form.
+
+    Waypoints are renumbered to dense ``0..n-1`` indices in ``waypoints.id``
+    order; ``ids`` maps an index back to the id. Outgoing edges of node ``i``
+    are ``indices[indptr[i]:indptr[i + 1]]`` with matching ``costs`` (km) and
+    ``times`` (seconds); ``by_time`` is the same graph weighted by time.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        names: list[str],
+        lat: np.ndarray,
+        lon: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        costs: np.ndarray,
+        times: np.ndarray = None,
+    ):
+        self.ids = ids
+        self.names = names
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices
+        self.costs = costs
+        self.times = _still_air_times(costs) if times is None else times
+
+    @classmethod
+    def load(cls, path: str, verify: bool = True) -> "RouteGraph":
+        """Map a snapshot written by ``save``; see ``app.snapshot``."""
+        return cls(*read_snapshot(path, verify))
+
+    def save(self, path: str):
+        write_snapshot(self, path)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        ids,
+        names,
+        lat,
+        lon,
+        sources,
+        targets,
+        costs,
+        times=None,
+    ) -> "RouteGraph":
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        names = [names[i] for i in order.tolist()]
+        lat = np.asarray(lat, dtype=np.float64)[order]
+        lon = np.asarray(lon, dtype=np.float64)[order]
+
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        costs = np.asarray(costs, dtype=np.float64)
+        if times is None:
+            times = _still_air_times(costs)
+        else:
+            times = np.array(times, dtype=np.float64)
+            missing = np.isnan(times)
+            times[missing] = _still_air_times(costs[missing])
+        src, known_src = _lookup(ids, sources)
+        dst, known_dst = _lookup(ids, targets)
+        keep = known_src & known_dst
+        edge_order = np.lexsort((dst[keep], src[keep]))
+        src, dst = src[keep][edge_order], dst[keep][edge_order]
+        costs, times = costs[keep][edge_order], times[keep][edge_order]
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        return cls(
+            ids,
+            names,
+            lat,
+            lon,
+            indptr,
+            dst.astype(np.int32),
+            costs,
+            times,
+        )
+
+    @property
+    def node_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def index_of(self, waypoint_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.ids, waypoint_id))
+        if position < len(self.ids) and self.ids[position] == waypoint_id:
+            return position
+        return None
+
+    def waypoint_ids(self, path: list[int]) -> list[int]:
+        return [int(self.ids[i]) for i in path]
+
+    def waypoint_names(self, path: list[int]) -> list[str]:
+        return [self.names[i] for i in path]
+
+    # plain lists are much faster than numpy scalars in the search loop; they
+    # are built on first search, so mapping a snapshot stays cheap
+    @cached_property
+    def _indptr(self) -> list[int]:
+        return self.indptr.tolist()
+
+    @cached_property
+    def _indices(self) -> list[int]:
+        return self.indices.tolist()
+
+    @cached_property
+    def _costs(self) -> list[float]:
+        return self.costs.tolist()
+
+    @cached_property
+    def _times(self) -> list[float]:
+        return self.times.tolist()
+
+    @cached_property
+    def reverse(self):
+        """Incoming edges in CSR form: ``(indptr, sources, costs)`` as lists."""
+        targets = np.asarray(self.indices, dtype=np.int64)
+        sources = np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+        order = np.lexsort((sources, targets))
+        indptr = np.zeros(self.node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=self.node_count), out=indptr[1:])
+        return indptr.tolist(), sources[order].tolist(), self.costs[order].tolist()
+
+    @cached_property
+    def by_time(self) -> "RouteGraph":
+        """This graph with flight time as the edge cost."""
+        return RouteGraph(
+            self.ids,
+            self.names,
+            self.lat,
+            self.lon,
+            self.indptr,
+            self.indices,
+            self.times,
+            self.times,
+        )
+
+    def weighted(self, metric: CostMetric) -> "RouteGraph":
+        return self.by_time if metric == CostMetric.time else self
+
+    @cached_property
+    def hierarchy(self) -> ContractionHierarchy:
+        return ContractionHierarchy.build(self)
+
+    @cached_property
+    def heuristic_scale(self) -> float:
+        """Largest factor k with ``k * great_circle_km <= cost`` on every edge.
+
+        Scaling the great-circle distance by it keeps the A* heuristic
+        admissible whatever unit ``edges.cost`` is expressed in.
+        """
+        sources = np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+        lengths = haversine(
+            self.lat[sources],
+            self.lon[sources],
+            self.lat[self.indices],
+            self.lon[self.indices],
+        )
+        measurable = lengths > 1e-9
+        if not measurable.any():
+            return 0.0
+        return max(float(np.min(self.costs[measurable] / lengths[measurable])), 0.0)
+
+    @cached_property
+    def located_nodes(self) -> np.ndarray:
+        """Nodes with coordinates, in ``spatial_index`` position order."""
+        return np.flatnonzero(~(np.isnan(self.lat) | np.isnan(self.lon)))
+
+    @cached_property
+    def spatial_index(self) -> SpatialIndex:
+        nodes = self.located_nodes
+        return SpatialIndex(self.lat[nodes], self.lon[nodes])
+
+    @cached_property
+    def _unit_vectors(self):
+        located = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        vectors = to_unit_vectors(
+            np.where(located, self.lat, 0.0), np.where(located, self.lon, 0.0)
+        )
+        xs, ys, zs = vectors.T.tolist()
+        return xs, ys, zs, located.tolist()
+
+    def geodesic_heuristic(self, target: int) -> Callable[[int], float]:
+        """Admissible lower bound on the remaining cost to ``target``."""
+        xs, ys, zs, located = self._unit_vectors
+        scale = 2 * EARTH_RADIUS_KM * self.heuristic_scale
+        if not located[target] or not scale:
+            return lambda node: 0.0
+        tx, ty, tz = xs[target], ys[target], zs[target]
+        asin, sqrt = math.asin, math.sqrt
+
+        def heuristic(node: int) -> float:
+            if not located[node]:
+                return 0.0
+            chord = sqrt(
+                (xs[node] - tx) ** 2 + (ys[node] - ty) ** 2 + (zs[node] - tz) ** 2
+            )
+            return scale * asin(min(chord / 2, 1.0))
+
+        return heuristic
+
+    def search(
+        self,
+        source: int,
+        target: int,
+        algorithm: SearchAlgorithm = SearchAlgorithm.dijkstra,
+    ) -> SearchResult:
+        if algorithm == SearchAlgorithm.astar:
+            return self.shortest_path(source, target, self.geodesic_heuristic(target))
+        if algorithm == SearchAlgorithm.bidirectional:
+            return self.bidirectional_path(source, target)
+        if algorithm == SearchAlgorithm.ch:
+            return self.hierarchy.query(source, target)
+        return self.shortest_path(source, target)
+
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        heuristic: Callable[[int], float] = None,
+    ) -> SearchResult:
+        """Dijkstra between two node indices, or A* when a heuristic is given."""
+        indptr, indices, costs = self._indptr, self._indices, self._costs
+        distances = {source: 0.0}
+        previous = {}
+        visited = set()
+        queue = [(heuristic(source) if heuristic else 0.0, source)]
+
+        while queue:
+            _, node = heapq.heappop(queue)
+            if node in visited:
+                continue
+            if node == target:
+                return SearchResult(
+                    _unwind(previous, target), distances[target], len(visited)
+                )
+            visited.add(node)
+
+            distance = distances[node]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                candidate = distance + costs[edge]
+                if candidate < distances.get(neighbor, float("inf")):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = node
+                    priority = candidate
+                    if heuristic:
+                        priority += heuristic(neighbor)
+                    heapq.heappush(queue, (priority, neighbor))
+
+        return SearchResult([], float("inf"), len(visited))
+
+    def bidirectional_path(self, source: int, target: int) -> SearchResult:
+        """Dijkstra grown from both ends, stopping once the frontiers meet."""
+        if source == target:
+            return SearchResult([source], 0.0, 0)
+        forward = (self._indptr, self._indices, self._costs)
+        backward = self.reverse
+        distances = ({source: 0.0}, {target: 0.0})
+        previous = ({}, {})
+        visited = (set(), set())
+        queues = ([(0.0, source)], [(0.0, target)])
+        best, meeting = float("inf"), None
+
+        while queues[0] and queues[1]:
+            if queues[0][0][0] + queues[1][0][0] >= best:
+                break
+            side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+            distance, node = heapq.heappop(queues[side])
+            if node in visited[side]:
+                continue
+            visited[side].add(node)
+
+            indptr, indices, costs = forward if side == 0 else backward
+            own, other = distances[side], distances[1 - side]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                candidate = distance + costs[edge]
+                if candidate < own.get(neighbor, float("inf")):
+                    own[neighbor] = candidate
+                    previous[side][neighbor] = node
+                    heapq.heappush(queues[side], (candidate, neighbor))
+                if neighbor in other and candidate + other[neighbor] < best:
+                    best, meeting = candidate + other[neighbor], neighbor
+
+        expanded = len(visited[0]) + len(visited[1])
+        if meeting is None:
+            return SearchResult([], float("inf"), expanded)
+        path = _unwind(previous[0], meeting)
+        node = meeting
+        while node in previous[1]:
+            node = previous[1][node]
+            path.append(node)
+        return SearchResult(path, best, expanded)
+
+    def k_shortest_paths(
+        self,
+        source: int,
+        target: int,
+        k: int,
+        deadline: float = None,
+    ) -> list[SearchResult]:
+        """Up to ``k`` loopless paths by increasing cost (Yen's algorithm).
+
+        Stops early, returning what it has, once ``time.perf_counter()``
+        passes ``deadline``.
+        """
+        first = self.shortest_path(source, target)
+        if not first.path:
+            return []
+        found = [first]
+        seen = {tuple(first.path)}
+        candidates = []
+        edge_cost = self._edge_cost
+
+        while len(found) < k:
+            previous = found[-1].path
+            root_cost = 0.0
+            for i, spur in enumerate(previous[:-1]):
+                if deadline is not None and time.perf_counter() > deadline:
+                    return found
+                root = previous[: i + 1]
+                banned_edges = {
+                    (p.path[i], p.path[i + 1])
+                    for p in found
+                    if len(p.path) > i + 1 and p.path[: i + 1] == root
+                }
+                spur_result = self._restricted_path(
+                    spur, target, set(root[:-1]), banned_edges
+                )
+                if spur_result.path:
+                    path = root[:-1] + spur_result.path
+                    if tuple(path) not in seen:
+                        seen.add(tuple(path))
+                        cost = root_cost + spur_result.cost
+                        heapq.heappush(candidates, (cost, path))
+                root_cost += edge_cost[(spur, previous[i + 1])]
+            if not candidates:
+                break
+            cost, path = heapq.heappop(candidates)
+            found.append(SearchResult(path, cost, 0))
+        return found
+
+    def pareto_paths(
+        self,
+        source: int,
+        target: int,
+        max_front: int = 16,
+        deadline: float = None,
+    ) -> list[ParetoPath]:
+        """Paths no other path beats on both time and distance.
+
+        Multi-criteria label setting: labels are settled in lexicographic
+        (time, distance) order, so a settled label is never dominated by a
+        later one, and a label is dropped as soon as one already settled at
+        its node, or at the target, dominates it. Each node keeps at most
+        ``max_front`` labels, which bounds the work on dense graphs; a capped
+        front holds the fastest ``max_front`` trade-offs. Returns the front
+        found so far if ``time.perf_counter()`` passes ``deadline``.
+        """
+        indptr, indices = self._indptr, self._indices
+        times, costs = self._times, self._costs
+        labels = [(source, -1, 0.0, 0.0)]  # node, parent label, time, distance
+        settled: dict[int, list[tuple[float, float]]] = {}
+        front = settled.setdefault(target, [])
+        found = []  # labels settled at the target
+        queue = [(0.0, 0.0, 0)]
+
+        def dominated(node, time_, distance):
+            for t, d in settled.get(node, ()):
+                if t <= time_ and d <= distance:
+                    return True
+            for t, d in front:
+                if t <= time_ and d <= distance:
+                    return True
+            return False
+
+        while queue and len(front) < max_front:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            time_, distance, label = heapq.heappop(queue)
+            node = labels[label][0]
+            node_labels = settled.setdefault(node, [])
+            if len(node_labels) >= max_front or dominated(node, time_, distance):
+                continue
+            node_labels.append((time_, distance))
+            if node == target:
+                found.append(label)
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                candidate = (time_ + times[edge], distance + costs[edge])
+                if not dominated(neighbor, *candidate):
+                    labels.append((neighbor, label, *candidate))
+                    heapq.heappush(queue, (*candidate, len(labels) - 1))
+
+        return [
+            ParetoPath(_unwind_label(labels, label), *labels[label][2:])
+            for label in found
+        ]
+
+    def path_length_km(self, path: list[int]) -> float:
+        """Great-circle length along ``path``; NaN if a waypoint has no position."""
+        if len(path) < 2:
+            return 0.0
+        lat, lon = self.lat[path], self.lon[path]
+        return float(haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]).sum())
+
+    @cached_property
+    def _edge_cost(self) -> dict[tuple[int, int], float]:
+        edge_cost = {}
+        indptr, indices, costs = self._indptr, self._indices, self._costs
+        for tail in range(self.node_count):
+            for edge in range(indptr[tail], indptr[tail + 1]):
+                key = (tail, indices[edge])
+                edge_cost[key] = min(costs[edge], edge_cost.get(key, float("inf")))
+        return edge_cost
+
+    def _restricted_path(
+        self, source: int, target: int, banned_nodes: set, banned_edges: set
+    ) -> SearchResult:
+        indptr, indices, costs = self._indptr, self._indices, self._costs
+        distances = {source: 0.0}
+        previous = {}
+        visited = set(banned_nodes)
+        queue = [(0.0, source)]
+
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if node in visited:
+                continue
+            if node == target:
+                return SearchResult(_unwind(previous, target), distance, 0)
+            visited.add(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                if neighbor in visited or (node, neighbor) in banned_edges:
+                    continue
+                candidate = distance + costs[edge]
+                if candidate < distances.get(neighbor, float("inf")):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = node
+                    heapq.heappush(queue, (candidate, neighbor))
+
+        return SearchResult([], float("inf"), 0)
+
+
+class RouteGraphEngine:
+    """Process-wide holder of the compiled ``RouteGraph``.
+
+    The graph is loaded lazily on first use. Call ``refresh`` after edges or
+    waypoints change, or ``invalidate`` to rebuild on the next request. With
+    ``contract`` the contraction hierarchy is built, and checked against
+    Dijkstra on ``verify_samples`` random pairs, as part of every load.
+    Without it, ``hierarchy_ready`` builds it in the background when first
+    asked for.
+
+    With a ``snapshot_path`` the worker processes share the graph: the first
+    one to load builds it from the database and writes the snapshot, the
+    others map that file as long as it is younger than ``snapshot_max_age``.
+    A rebuild in any worker replaces the file, and the rest switch to it on
+    their next request after ``SNAPSHOT_CHECK_INTERVAL``.
+    """
+
+    SNAPSHOT_CHECK_INTERVAL = 1.0  # seconds between stats of the snapshot
+
+    def __init__(
+        self,
+        contract: bool = False,
+        verify_samples: int = 0,
+        snapshot_path: str = None,
+        snapshot_max_age: float = 300.0,
+    ):
+        self.graph: Optional[RouteGraph] = None
+        self.version = 0
+        self.build_seconds = 0.0  # how long the last load took
+        self.contract = contract
+        self.verify_samples = verify_samples
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+        self._lock = asyncio.Lock()
+        self._contracting: dict[RouteGraph, asyncio.Task] = {}
+        self._stale = False  # the snapshot predates a local change
+        self._mapped: Optional[tuple[int, int]] = None  # (st_ino, st_mtime_ns)
+        self._checked = 0.0
+
+    async def get(self, db: Connection) -> RouteGraph:
+        graph = self.graph
+        if graph is None or self._snapshot_replaced():
+            async with self._lock:
+                if self.graph is graph:
+                    self.graph = await self._compile(db, reuse=not self._stale)
+                    self.version += 1
+                graph = self.graph
+        return graph
+
+    async def refresh(self, db: Connection) -> RouteGraph:
+        async with self._lock:
+            self.graph = await self._compile(db)
+            self.version += 1
+            return self.graph
+
+    def invalidate(self):
+        self.graph = None
+        self._stale = True
+
+    def hierarchy_ready(self, graph: RouteGraph, metric: CostMetric) -> bool:
+        """Whether ``graph`` has its contraction hierarchy.
+
+        If not, one build is started in a thread of its own, however many
+        requests ask meanwhile; a failed build is retried on the next ask.
+        """
+        if "hierarchy" in vars(graph):  # the cached_property was computed
+            return True
+        if graph not in self._contracting:
+            task = asyncio.create_task(
+                asyncio.to_thread(self._contract, graph, metric)
+            )
+            task.add_done_callback(lambda _: self._contracted(graph, task))
+            self._contracting[graph] = task
+        return False
+
+    def _contracted(self, graph: RouteGraph, task: asyncio.Task):
+        del self._contracting[graph]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Could not contract the route graph", exc_info=task.exception()
+            )
+
+    async def _compile(self, db: Connection, reuse: bool = False) -> RouteGraph:
+        started = time.perf_counter()
+        if self.snapshot_path:
+            graph = await self._share(db, reuse)
+        else:
+            graph = await load_graph(db)
+        self._stale = False
+        if self.contract:
+            # pure-Python loops over the whole graph; requests go on meanwhile
+            await asyncio.to_thread(self._contract_all, graph)
+        self.build_seconds = time.perf_counter() - started
+        return graph
+
+    async def _share(self, db: Connection, reuse: bool) -> RouteGraph:
+        """Map the shared snapshot, building it first if it is missing or old."""
+        path = self.snapshot_path
+        async with snapshot_lock(path):
+            if reuse:
+                try:
+                    if read_header(path).age < self.snapshot_max_age:
+                        graph = await asyncio.to_thread(RouteGraph.load, path)
+                        self._remember(path)
+                        return graph
+                except FileNotFoundError:
+                    pass
+                except SnapshotError as e:
+                    logger.warning("Rebuilding route graph snapshot: %s", e)
+            graph = await load_graph(db)
+            await asyncio.to_thread(graph.save, path)
+            self._remember(path)
+        # serve from the mapping, so this worker shares pages with the rest
+        return RouteGraph.load(path, verify=False)
+
+    def _remember(self, path: str):
+        stat = os.stat(path)
+        self._mapped = stat.st_ino, stat.st_mtime_ns
+
+    def _snapshot_replaced(self) -> bool:
+        """Whether another worker wrote a newer snapshot; stats at most once
+        per ``SNAPSHOT_CHECK_INTERVAL``."""
+        if not self.snapshot_path or self._mapped is None:
+            return False
+        now = time.monotonic()
+        if now - self._checked < self.SNAPSHOT_CHECK_INTERVAL:
+            return False
+        self._checked = now
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._mapped
+
+    def _contract_all(self, graph: RouteGraph):
+        for metric in CostMetric:
+            self._contract(graph.weighted(metric), metric)
+
+    def _contract(self, graph: RouteGraph, metric: CostMetric):
+        hierarchy = graph.hierarchy
+        logger.info(
+            "Contracted %s waypoints by %s, %s shortcuts",
+            graph.node_count,
+            metric.value,
+            hierarchy.shortcut_count,
+        )
+        mismatches = verify(graph, hierarchy, self.verify_samples)
+        if mismatches:
+            logger.warning(
+                "Contraction hierarchy disagrees with Dijkstra on %s of %s pairs",
+                len(mismatches),
+                self.verify_samples,
+            )
+
+
+async def load_graph(db: Connection) -> RouteGraph:
+    nodes = await db.fetch_all(
+        """
+        SELECT id, name, ST_Y(geom::geometry) AS lat, ST_X(geom::geometry) AS lon
+        FROM waypoints
+        """
+    )
+    links = await db.fetch_all(
+        """
+        SELECT source, target, cost, eet
+        FROM edges
+        WHERE source IS NOT NULL AND target IS NOT NULL AND cost IS NOT NULL
+        """
+    )
+    nan = float("nan")
+    return RouteGraph.from_arrays(
+        [n["id"] for n in nodes],
+        [n["name"] for n in nodes],
+        [nan if n["lat"] is None else n["lat"] for n in nodes],
+        [nan if n["lon"] is None else n["lon"] for n in nodes],
+        [e["source"] for e in links],
+        [e["target"] for e in links],
+        [e["cost"] for e in links],
+        [nan if e["eet"] is None else e["eet"] for e in links],
+    )
+
+
+def _still_air_times(costs: np.ndarray) -> np.ndarray:
+    """Seconds to fly ``costs`` km at the default cruise TAS in calm air."""
+    return costs / (DEFAULT_TAS_KT * KM_PER_NM) * 3600
+
+
+def _lookup(ids: np.ndarray, values: np.ndarray):
+    """Map waypoint ids to dense indices; also return which ids were known."""
+    if not len(ids):
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), bool)
+    positions = np.searchsorted(ids, values).clip(0, len(ids) - 1)
+    return positions, ids[positions] == values
+
+
+def _unwind_label(labels: list, label: int) -> list[int]:
+    path = []
+    while label >= 0:
+        node, label = labels[label][:2]
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def _unwind(previous: dict, node: int) -> list[int]:
+    path = [node]
+    while node in previous:
+        node = previous[node]
+        path.append(node)
+    path.reverse()
+    return path
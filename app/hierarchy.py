@@ -0,0 +1,240 @@
+"""Contraction hierarchy over a ``RouteGraph``.
+
+Nodes are contracted one by one in order of importance; whenever removing a
+node would break a shortest path ``u -> v -> w`` a shortcut ``u -> w`` is
+added that remembers ``v``. A query then only relaxes edges leading to more
+important nodes from both ends, which settles a few hundred nodes instead of
+most of the graph, and the path is unpacked back through the shortcuts.
+"""
+import heapq
+import math
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .graph import RouteGraph, SearchResult
+
+NO_MIDDLE = -1
+
+
+class Mismatch(NamedTuple):
+    source: int
+    target: int
+    expected: "SearchResult"
+    actual: "SearchResult"
+
+
+class ContractionHierarchy:
+    def __init__(self, rank, up, down, middles):
+        self.rank = rank
+        # (indptr, heads, costs) of edges towards higher ranked nodes;
+        # ``down`` holds incoming edges of a node, for the backward search
+        self.up = up
+        self.down = down
+        self.middles = middles  # (tail, head) -> contracted node or NO_MIDDLE
+
+    @property
+    def shortcut_count(self) -> int:
+        return sum(middle != NO_MIDDLE for middle in self.middles.values())
+
+    @classmethod
+    def build(cls, graph: "RouteGraph", witness_limit: int = 64):
+        n = graph.node_count
+        out = [dict() for _ in range(n)]
+        inc = [dict() for _ in range(n)]
+        indptr = graph.indptr.tolist()
+        indices, costs = graph.indices.tolist(), graph.costs.tolist()
+        middles = {}
+        for tail in range(n):
+            for edge in range(indptr[tail], indptr[tail + 1]):
+                head, cost = indices[edge], costs[edge]
+                if head != tail and cost < out[tail].get(head, float("inf")):
+                    out[tail][head] = inc[head][tail] = cost
+                    middles[(tail, head)] = NO_MIDDLE
+
+        contracted = [False] * n
+        contracted_neighbors = [0] * n
+
+        def shortcuts_for(node, limit):
+            found = []
+            heads = [(w, c) for w, c in out[node].items() if not contracted[w]]
+            if not heads:
+                return found
+            for tail, in_cost in inc[node].items():
+                if contracted[tail]:
+                    continue
+                targets = {w: in_cost + c for w, c in heads if w != tail}
+                if not targets:
+                    continue
+                witness = _witness_search(
+                    out, contracted, tail, node, max(targets.values()), limit
+                )
+                for head, cost in targets.items():
+                    if witness.get(head, float("inf")) > cost:
+                        found.append((tail, head, cost))
+            return found
+
+        def priority(node):
+            degree = sum(not contracted[w] for w in out[node])
+            degree += sum(not contracted[u] for u in inc[node])
+            shortcuts = len(shortcuts_for(node, witness_limit // 4))
+            return shortcuts - degree + contracted_neighbors[node]
+
+        queue = [(priority(node), node) for node in range(n)]
+        heapq.heapify(queue)
+        rank = [0] * n
+        order = 0
+        while queue:
+            _, node = heapq.heappop(queue)
+            current = priority(node)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, node))
+                continue
+
+            for tail, head, cost in shortcuts_for(node, witness_limit):
+                if cost < out[tail].get(head, float("inf")):
+                    out[tail][head] = inc[head][tail] = cost
+                    middles[(tail, head)] = node
+            contracted[node] = True
+            rank[node] = order
+            order += 1
+            for neighbor in set(out[node]) | set(inc[node]):
+                contracted_neighbors[neighbor] += 1
+
+        up = [[] for _ in range(n)]
+        down = [[] for _ in range(n)]
+        for tail in range(n):
+            for head, cost in out[tail].items():
+                if rank[head] > rank[tail]:
+                    up[tail].append((head, cost))
+                else:
+                    down[head].append((tail, cost))
+        return cls(rank, _to_csr(up), _to_csr(down), middles)
+
+    def query(self, source: int, target: int) -> "SearchResult":
+        from .graph import SearchResult
+
+        if source == target:
+            return SearchResult([source], 0.0, 0)
+        distances = ({source: 0.0}, {target: 0.0})
+        previous = ({}, {})
+        settled = (set(), set())
+        queues = ([(0.0, source)], [(0.0, target)])
+        best, meeting = float("inf"), None
+
+        while queues[0] or queues[1]:
+            side = _next_side(queues)
+            if queues[side][0][0] >= best:
+                # every remaining label on this side is already too long
+                queues[side].clear()
+                continue
+            distance, node = heapq.heappop(queues[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            if node in distances[1 - side]:
+                total = distance + distances[1 - side][node]
+                if total < best:
+                    best, meeting = total, node
+
+            indptr, heads, costs = self.up if side == 0 else self.down
+            own = distances[side]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = heads[edge]
+                candidate = distance + costs[edge]
+                if candidate < own.get(neighbor, float("inf")):
+                    own[neighbor] = candidate
+                    previous[side][neighbor] = node
+                    heapq.heappush(queues[side], (candidate, neighbor))
+
+        expanded = len(settled[0]) + len(settled[1])
+        if meeting is None:
+            return SearchResult([], float("inf"), expanded)
+
+        forward = [meeting]
+        while forward[-1] in previous[0]:
+            forward.append(previous[0][forward[-1]])
+        forward.reverse()
+        backward = [meeting]
+        while backward[-1] in previous[1]:
+            backward.append(previous[1][backward[-1]])
+        hops = forward + backward[1:]
+
+        path = [hops[0]]
+        for tail, head in zip(hops, hops[1:]):
+            path.extend(self._unpack(tail, head))
+        return SearchResult(path, best, expanded)
+
+    def _unpack(self, tail: int, head: int) -> list[int]:
+        """Expand a (possibly shortcut) edge to original nodes, ``tail`` excluded."""
+        path = []
+        stack = [(tail, head)]
+        while stack:
+            tail, head = stack.pop()
+            middle = self.middles[(tail, head)]
+            if middle == NO_MIDDLE:
+                path.append(head)
+            else:
+                stack.append((middle, head))
+                stack.append((tail, middle))
+        return path
+
+
+def verify(
+    graph: "RouteGraph",
+    hierarchy: ContractionHierarchy,
+    samples: int = 100,
+    seed: int = 0,
+) -> list[Mismatch]:
+    """Compare hierarchy queries with plain Dijkstra on random pairs."""
+    if not graph.node_count:
+        return []
+    rng = np.random.default_rng(seed)
+    mismatches = []
+    for source, target in rng.integers(0, graph.node_count, (samples, 2)).tolist():
+        expected = graph.shortest_path(source, target)
+        actual = hierarchy.query(source, target)
+        same_cost = math.isclose(expected.cost, actual.cost)
+        if expected.path != actual.path or not same_cost:
+            mismatches.append(Mismatch(source, target, expected, actual))
+    return mismatches
+
+
+def _witness_search(out, contracted, source, excluded, max_cost, limit):
+    distances = {source: 0.0}
+    queue = [(0.0, source)]
+    settled = 0
+    while queue and settled < limit:
+        distance, node = heapq.heappop(queue)
+        if distance > max_cost:
+            break
+        if distance > distances[node]:
+            continue
+        settled += 1
+        for neighbor, cost in out[node].items():
+            if neighbor == excluded or contracted[neighbor]:
+                continue
+            candidate = distance + cost
+            if candidate < distances.get(neighbor, float("inf")):
+                distances[neighbor] = candidate
+                heapq.heappush(queue, (candidate, neighbor))
+    return distances
+
+
+def _next_side(queues) -> int:
+    if not queues[0]:
+        return 1
+    if not queues[1]:
+        return 0
+    return 0 if queues[0][0][0] <= queues[1][0][0] else 1
+
+
+def _to_csr(adjacency):
+    indptr, heads, costs = [0], [], []
+    for edges in adjacency:
+        for head, cost in edges:
+            heads.append(head)
+            costs.append(cost)
+        indptr.append(len(heads))
+    return indptr, heads, costs
@@ -0,0 +1,425 @@
+"""Background jobs for computations that outlive an HTTP request.
+
+Jobs are rows in ``jobs``; every worker process runs ``JOB_WORKERS``
+consumers that claim queued rows with ``FOR UPDATE SKIP LOCKED``, so the
+table is the queue and concurrency is bounded per process. Results are
+appended to ``job_results`` as they are produced and can be downloaded while
+the job still runs. A running job's ``heartbeat_at`` is its lease: when the
+process running it dies, the job is claimed again once the lease expires.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Optional
+
+from databases import Database
+from databases.core import Connection
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel, TypeAdapter
+
+from .schemas import DayAlternativesJob, JobCreate, MapMatchJob, ShortestRoutesJob
+from .settings import Settings
+
+if TYPE_CHECKING:  # services imports deps, which builds the runner
+    from .services import FlightService
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes
+RESULT_PAGE_SIZE = 1000
+SATURATED_BACKOFF = 0.5  # seconds to wait on a 429 or 503
+
+CLAIM_JOB = """
+    UPDATE jobs SET status = 'running', started_at = now(), heartbeat_at = now()
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE status = 'queued' OR (
+            status = 'running'
+            AND COALESCE(heartbeat_at, started_at)
+                < now() - make_interval(secs => :lease)
+        )
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, params
+"""
+
+HEARTBEAT = """
+    UPDATE jobs SET heartbeat_at = now()
+    WHERE id = :job_id AND status = 'running'
+"""
+
+FINISH_JOB = """
+    UPDATE jobs SET
+        status = :status,
+        error = :error,
+        finished_at = now(),
+        expires_at = now() + make_interval(secs => :ttl)
+    WHERE id = :job_id AND status IN ('queued', 'running')
+    RETURNING *
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Lets a running job report progress and emit results.
+
+    Results are buffered and written in batches; ``progress`` writes at most
+    once per ``PROGRESS_INTERVAL`` and raises ``JobCancelled`` once the job
+    was cancelled, from this process or any other.
+    """
+
+    def __init__(
+        self,
+        db: Connection,
+        job_id: uuid.UUID,
+        settings: Settings,
+        flush_size: int = 500,
+    ):
+        self.db = db
+        self.job_id = job_id
+        self.settings = settings
+        self.flush_size = flush_size
+        self._items: list[str] = []
+        self._seq = 0
+        self._reported = 0.0
+
+    def emit(self, item: dict):
+        self._items.append(json.dumps(item, default=str))
+
+    async def progress(self, done: int, total: int = None):
+        if len(self._items) >= self.flush_size:
+            await self.flush()
+        now = time.monotonic()
+        if now - self._reported < PROGRESS_INTERVAL and done != total:
+            return
+        self._reported = now
+        await self.flush()
+        status = await self.db.fetch_val(
+            """
+            UPDATE jobs SET done = :done, total = COALESCE(:total, total)
+            WHERE id = :job_id
+            RETURNING status
+            """,
+            values={"done": done, "total": total, "job_id": self.job_id},
+        )
+        if status == "cancelled":
+            raise JobCancelled
+
+    async def flush(self):
+        if not self._items:
+            return
+        items, self._items = self._items, []
+        seqs = list(range(self._seq + 1, self._seq + len(items) + 1))
+        self._seq = seqs[-1]
+        await self.db.execute(
+            """
+            INSERT INTO job_results (job_id, seq, item)
+            SELECT CAST(:job_id AS uuid), seq, CAST(item AS jsonb)
+            FROM unnest(CAST(:seqs AS integer[]), CAST(:items AS text[]))
+                AS t(seq, item)
+            """,
+            values={"job_id": self.job_id, "seqs": seqs, "items": items},
+        )
+
+
+class JobRunner:
+    """Process-wide job queue consumer.
+
+    ``start`` launches ``workers`` consumer tasks; each runs one job at a
+    time on its own connection and renews its ``lease`` (seconds) while it
+    runs. Jobs interrupted by ``stop`` go back to the queue, and finished
+    jobs are deleted ``result_ttl`` seconds after they end, checked every
+    ``purge_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        result_ttl: float = 86400.0,
+        poll_interval: float = 5.0,
+        lease: float = 60.0,
+        purge_interval: float = 300.0,
+        settings: Settings = None,
+    ):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.purge_interval = purge_interval
+        self.settings = settings or Settings()
+        self.database: Optional[Database] = None
+        self._make_service: Optional[Callable[[Connection], "FlightService"]] = None
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._running: dict[uuid.UUID, asyncio.Task] = {}
+        self._stopping = False
+
+    async def start(
+        self,
+        database: Database,
+        make_service: Callable[[Connection], "FlightService"],
+    ):
+        self.database = database
+        self._make_service = make_service
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_periodically()))
+
+    async def stop(self):
+        self._stopping = True
+        tasks = [*self._tasks, *self._running.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, db: Connection, job: BaseModel):
+        row = await db.fetch_one(
+            """
+            INSERT INTO jobs (id, kind, params)
+            VALUES (:job_id, :kind, CAST(:params AS jsonb))
+            RETURNING *
+            """,
+            values={
+                "job_id": uuid.uuid4(),
+                "kind": job.kind,
+                "params": job.model_dump_json(),
+            },
+        )
+        self._wake.set()
+        return row
+
+    async def get(self, db: Connection, job_id: uuid.UUID):
+        row = await db.fetch_one(
+            "SELECT * FROM jobs WHERE id = :job_id", values={"job_id": job_id}
+        )
+        if not row:
+            raise HTTPException(404)
+        return row
+
+    async def cancel(self, db: Connection, job_id: uuid.UUID):
+        """Cancel a queued or running job; finished jobs are left as they are."""
+        row = await db.fetch_one(
+            FINISH_JOB,
+            values={
+                "status": "cancelled",
+                "error": None,
+                "ttl": self.result_ttl,
+                "job_id": job_id,
+            },
+        )
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return row or await self.get(db, job_id)
+
+    async def iter_results(
+        self, db: Connection, job_id: uuid.UUID
+    ) -> AsyncIterator[bytes]:
+        """Results emitted so far as newline-delimited JSON, page by page."""
+        after = 0
+        while True:
+            rows = await db.fetch_all(
+                """
+                SELECT seq, CAST(item AS text) AS item FROM job_results
+                WHERE job_id = :job_id AND seq > :after
+                ORDER BY seq
+                LIMIT :limit
+                """,
+                values={"job_id": job_id, "after": after, "limit": RESULT_PAGE_SIZE},
+            )
+            if not rows:
+                return
+            yield "".join(f"{row['item']}\n" for row in rows).encode()
+            after = rows[-1]["seq"]
+
+    async def purge(self, db: Connection) -> int:
+        rows = await db.fetch_all(
+            "DELETE FROM jobs WHERE expires_at < now() RETURNING id"
+        )
+        return len(rows)
+
+    async def _purge_periodically(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                async with self.database.connection() as db:
+                    await self.purge(db)
+            except Exception:
+                logger.exception("Could not purge expired jobs")
+
+    async def _work(self):
+        while True:
+            try:
+                async with self.database.connection() as db:
+                    job = await db.fetch_one(CLAIM_JOB, values={"lease": self.lease})
+            except Exception:
+                # e.g. a dropped connection; the worker lives on to retry
+                logger.exception("Could not claim a job")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._running[job["id"]] = task
+            try:
+                # cancelling one job must not end its worker
+                while not task.done():
+                    await asyncio.wait({task}, timeout=self.lease / 3)
+                    if not task.done():
+                        await self._heartbeat(job["id"])
+            finally:
+                self._running.pop(job["id"], None)
+
+    async def _heartbeat(self, job_id):
+        try:
+            async with self.database.connection() as db:
+                await db.execute(HEARTBEAT, values={"job_id": job_id})
+        except Exception:
+            # the next beat may get through before the lease runs out
+            logger.exception("Could not renew the lease of job %s", job_id)
+
+    async def _execute(self, job):
+        job_id = job["id"]
+        async with self.database.connection() as db:
+            context = JobContext(db, job_id, self.settings)
+            try:
+                # left over when the job was claimed before and its lease ran out
+                await db.execute(
+                    "DELETE FROM job_results WHERE job_id = :job_id",
+                    values={"job_id": job_id},
+                )
+                params = job["params"]
+                if isinstance(params, str):
+                    spec = JOB_SPEC.validate_json(params)
+                else:
+                    spec = JOB_SPEC.validate_python(params)
+                await HANDLERS[spec.kind](self._make_service(db), spec, context)
+                await context.flush()
+                await self._finish(db, job_id, "succeeded")
+            except JobCancelled:
+                pass
+            except asyncio.CancelledError:
+                if self._stopping:
+                    await self._requeue(db, job_id)
+                raise
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job_id, job["kind"])
+                await self._finish(db, job_id, "failed", f"{type(e).__name__}: {e}")
+
+    async def _finish(self, db, job_id, status: str, error: str = None):
+        await db.execute(
+            FINISH_JOB,
+            values={
+                "status": status,
+                "error": error,
+                "ttl": self.result_ttl,
+                "job_id": job_id,
+            },
+        )
+
+    async def _requeue(self, db, job_id):
+        await db.execute(
+            "DELETE FROM job_results WHERE job_id = :job_id",
+            values={"job_id": job_id},
+        )
+        await db.execute(
+            """
+            UPDATE jobs SET status = 'queued', started_at = NULL, done = 0
+            WHERE id = :job_id AND status = 'running'
+            """,
+            values={"job_id": job_id},
+        )
+
+
+async def _patiently(call: Callable[[], Awaitable]):
+    """Wait out executor saturation, or a contraction hierarchy being built,
+    instead of failing the whole job."""
+    while True:
+        try:
+            return await call()
+        except HTTPException as e:
+            if e.status_code not in (429, 503):
+                raise
+            await asyncio.sleep(SATURATED_BACKOFF)
+
+
+async def run_shortest_routes(
+    service: "FlightService", job: ShortestRoutesJob, context: JobContext
+):
+    pairs = [(a, b) for a in job.waypoints for b in job.waypoints if a != b]
+    for done, (departure, arrival) in enumerate(pairs, 1):
+        try:
+            route = await _patiently(
+                lambda: service.get_shortest_route(
+                    departure, arrival, job.algorithm, job.metric
+                )
+            )
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            route = {"fpl": None}
+        context.emit({"departure": departure, "arrival": arrival, **route})
+        await context.progress(done, len(pairs))
+
+
+async def run_day_alternatives(
+    service: "FlightService", job: DayAlternativesJob, context: JobContext
+):
+    start = datetime.combine(job.day, datetime.min.time())
+    flight_ids = [
+        row["id"]
+        for row in await service.db.fetch_all(
+            """
+            SELECT id FROM flights
+            WHERE departure_time >= :start AND departure_time < :end
+            ORDER BY id
+            """,
+            values={"start": start, "end": start + timedelta(days=1)},
+        )
+    ]
+    budget = context.settings.ALTERNATIVES_CPU_BUDGET
+    for done, flight_id in enumerate(flight_ids, 1):
+        alternatives = await _patiently(
+            lambda: service.get_alternatives(flight_id, job.k, budget)
+        )
+        context.emit({"flight_id": flight_id, "alternatives": alternatives})
+        await context.progress(done, len(flight_ids))
+
+
+async def run_map_match(
+    service: "FlightService", job: MapMatchJob, context: JobContext
+):
+    radius_km = context.settings.TRACK_MATCH_RADIUS_KM
+    for done, flight_id in enumerate(job.flight_ids, 1):
+        try:
+            flown = await _patiently(
+                lambda: service.match_stored_trajectory(flight_id, radius_km)
+            )
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            flown = None
+        context.emit({"flight_id": flight_id, "flown_fpl": flown})
+        await context.progress(done, len(job.flight_ids))
+
+
+JOB_SPEC = TypeAdapter(JobCreate)
+HANDLERS = {
+    "shortest_routes": run_shortest_routes,
+    "alternatives": run_day_alternatives,
+    "map_match": run_map_match,
+}
@@ -0,0 +1,27 @@
+"""Snap flown tracks onto the waypoint graph."""
+import numpy as np
+
+from .graph import RouteGraph
+
+
+def match_track(
+    graph: RouteGraph, lat, lon, radius_km: float = 5.0
+) -> list[int]:
+    """Graph nodes overflown by a track, in the order they were passed.
+
+    Every track point is snapped to its nearest located waypoint in a single
+    KD-tree query; points further than ``radius_km`` from any waypoint are
+    en-route and dropped. What remains is collapsed to one entry per
+    consecutive visit, so a fix the track lingers near (a hold, a slow
+    climb-out) appears once.
+    """
+    if not len(lat) or not len(graph.located_nodes):
+        return []
+    distance, position = graph.spatial_index.nearest(
+        np.asarray(lat, np.float64), np.asarray(lon, np.float64)
+    )
+    nodes = graph.located_nodes[position[distance <= radius_km]]
+    if not len(nodes):
+        return []
+    changed = np.r_[True, nodes[1:] != nodes[:-1]]
+    return nodes[changed].tolist()
@@ -0,0 +1,290 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Recording is a dict lookup and a few additions, with no I/O and no locks
+(everything runs on the event loop). Gauges and counters that already exist
+elsewhere, such as cache and executor stats, are only read when ``/metrics``
+is scraped.
+"""
+import sys
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from databases.core import Connection
+
+from .cache import ResultCache
+from .executor import ComputeExecutor
+from .graph import RouteGraphEngine
+from .slowlog import SlowQueryLog
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count above the last, sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1)
+            series.append(0.0)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                total += count
+                bucket = _labels((*self.labels, "le"), (*label_values, bound))
+                yield f"{self.name}_bucket{bucket} {total}"
+            yield f"{self.name}_sum{labels} {series[-1]}"
+            yield f"{self.name}_count{labels} {total}"
+
+
+class Metrics:
+    """Everything ``/metrics`` exposes for this worker process."""
+
+    def __init__(self):
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds",
+            "Time to answer a request, by route template.",
+            ("method", "route", "status"),
+        )
+        self.db_seconds = Histogram(
+            "db_query_duration_seconds",
+            "Time spent in database calls, by the function that made them.",
+            ("caller", "call"),
+        )
+        self.pool_wait_seconds = Histogram(
+            "db_pool_wait_seconds",
+            "Time a request waited for a pooled connection.",
+        )
+
+    def render(
+        self,
+        cache: ResultCache,
+        route_graph: RouteGraphEngine,
+        executor: ComputeExecutor,
+    ) -> str:
+        """Recorded histograms, plus counters and gauges read right now."""
+        lines = []
+        for histogram in (
+            self.request_seconds,
+            self.db_seconds,
+            self.pool_wait_seconds,
+        ):
+            lines.extend(histogram.render())
+        for name, kind, help, value in _state(cache, route_graph, executor):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request.
+
+    Requests are labelled by the matched route's path template, so
+    ``/flights/{flight_id}/trajectory`` is one series however many flights
+    are asked for.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            self.metrics.request_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
+
+
+class TimedConnection:
+    """A ``databases`` connection whose queries are timed.
+
+    Durations go to ``histogram`` and, past its threshold, to ``slow_queries``;
+    either may be ``None``. Each call is labelled with the nearest public
+    function up the call stack, so a query run by a private helper counts
+    towards the endpoint-facing method that needed it. Everything else is
+    passed through untouched.
+    """
+
+    def __init__(
+        self,
+        db: Connection,
+        histogram: Optional[Histogram],
+        slow_queries: Optional[SlowQueryLog] = None,
+    ):
+        self._db = db
+        self._histogram = histogram
+        self._slow_queries = slow_queries
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    async def execute(self, query, values: dict = None):
+        return await self._timed(
+            "execute", query, values, self._db.execute(query, values)
+        )
+
+    async def execute_many(self, query, values: list):
+        return await self._timed(
+            "execute_many", query, None, self._db.execute_many(query, values)
+        )
+
+    async def fetch_all(self, query, values: dict = None):
+        return await self._timed(
+            "fetch_all", query, values, self._db.fetch_all(query, values)
+        )
+
+    async def fetch_one(self, query, values: dict = None):
+        return await self._timed(
+            "fetch_one", query, values, self._db.fetch_one(query, values)
+        )
+
+    async def fetch_val(self, query, values: dict = None, column=0):
+        return await self._timed(
+            "fetch_val", query, values, self._db.fetch_val(query, values, column)
+        )
+
+    async def _timed(self, call: str, query, values, awaitable):
+        caller = _public_caller(sys._getframe(2))
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            seconds = time.perf_counter() - started
+            if self._histogram is not None:
+                self._histogram.observe(seconds, caller, call)
+            if self._slow_queries is not None:
+                self._slow_queries.record(query, values, seconds, caller)
+
+
+def _state(
+    cache: ResultCache, route_graph: RouteGraphEngine, executor: ComputeExecutor
+) -> list[tuple[str, str, str, float]]:
+    graph = route_graph.graph
+    samples = [
+        (f"result_cache_{name}_total", "counter", f"Result cache {name}.", value)
+        for name, value in cache.stats.as_dict().items()
+    ]
+    samples += [
+        (f"executor_tasks_{name}_total", "counter", f"Executor tasks {name}.", value)
+        for name, value in executor.stats.as_dict().items()
+    ]
+    samples += [
+        (
+            "executor_pending_tasks",
+            "gauge",
+            "Executor tasks queued or running.",
+            executor.pending,
+        ),
+        ("route_graph_builds_total", "counter", "Graph loads.", route_graph.version),
+        (
+            "route_graph_build_seconds",
+            "gauge",
+            "Duration of the last graph load.",
+            route_graph.build_seconds,
+        ),
+        (
+            "route_graph_nodes",
+            "gauge",
+            "Waypoints in the route graph.",
+            graph.node_count if graph is not None else 0,
+        ),
+        (
+            "route_graph_edges",
+            "gauge",
+            "Edges in the route graph.",
+            graph.edge_count if graph is not None else 0,
+        ),
+    ]
+    return samples
+
+
+def _public_caller(frame, depth: int = 8) -> str:
+    first = _qualname(frame)
+    for _ in range(depth):
+        if frame is None:
+            break
+        name = _qualname(frame)
+        if not name.rpartition(".")[2].startswith("_"):
+            return name
+        frame = frame.f_back
+    return first
+
+
+def _qualname(frame) -> str:
+    # code objects only carry co_qualname from Python 3.11
+    code = frame.f_code
+    qualname = getattr(code, "co_qualname", None)
+    if qualname is not None:
+        return qualname
+    owner = frame.f_locals.get("self")
+    if owner is None:
+        return code.co_name
+    return f"{type(owner).__name__}.{code.co_name}"
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
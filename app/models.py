@@ -1,20 +1,39 @@
-import random
-
 from geoalchemy2 import Geography
 from sqlalchemy import (
     ARRAY,
+    DDL,
+    BigInteger,
     Column,
+    Computed,
+    Date,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     MetaData,
     String,
     Table,
+    Text,
+    Uuid,
+    event,
+    func,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 
 metadata = MetaData()
 
+# 64-bit signature of a filed route, so queries group on a bigint, not an array
+route_signature = DDL(
+    """
+    CREATE OR REPLACE FUNCTION route_signature(integer[]) RETURNS bigint
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$ SELECT hashtextextended(array_to_string($1, ','), 0) $$
+    """
+)
+event.listen(metadata, "before_create", route_signature)
+
 airlines = Table(
     "airlines",
     metadata,
@@ -43,20 +62,155 @@ edges = Table(
     Column("name", String, primary_key=True),
     Column("source", Integer, ForeignKey("waypoints.id")),
     Column("target", Integer, ForeignKey("waypoints.id")),
-    Column("cost", Float, default=lambda _: random.random()),
-    # eet, mach...
+    Column("cost", Float),  # great-circle distance, km
+    Column("eet", Float),  # flight time in seconds at cruise Mach, with wind
+)
+
+# winds applied to edges.eet, the latest one also times newly generated edges
+wind_snapshots = Table(
+    "wind_snapshots",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+    Column("report", JSONB, nullable=False),  # see app.wind.wind_report
 )
 
+# partitioned by month of departure_time, see app/partitions.py; the partition
+# key has to be part of every unique constraint, so it is in the primary key
 flights = Table(
     "flights",
     metadata,
-    Column("id", Integer, primary_key=True, index=True),
+    Column("id", Integer, primary_key=True, autoincrement=True),
     Column("airline_id", ForeignKey(airlines.c.id)),
     Column("aircraft_id", ForeignKey(aircrafts.c.id)),
     Column("departure", ForeignKey(waypoints.c.id)),
     Column("arrival", ForeignKey(waypoints.c.id)),
-    Column("departure_time", DateTime),
+    Column("departure_time", DateTime, primary_key=True),
     Column("arrival_time", DateTime),
     Column("fuel_consumption", Float),
     Column("fpl", ARRAY(Integer)),
+    Column(
+        "fpl_signature",
+        BigInteger,
+        Computed("route_signature(fpl)", persisted=True),
+    ),
+    Column("flown_fpl", ARRAY(Integer)),  # map-matched from the trajectory
+    Index(
+        "ix_flights_departure_arrival_time",
+        "departure",
+        "arrival",
+        "departure_time",
+    ),
+    Index(
+        "ix_flights_departure_arrival_route",
+        "departure",
+        "arrival",
+        "fpl_signature",
+        postgresql_include=[
+            "departure_time",
+            "arrival_time",
+            "fuel_consumption",
+        ],
+    ),
+    # a few pages per month partition; serves unfiltered date-range scans
+    Index("ix_flights_departure_time_brin", "departure_time", postgresql_using="brin"),
+    postgresql_partition_by="RANGE (departure_time)",
+)
+
+# per-day usage of every filed route, maintained on insert into flights
+route_usage = Table(
+    "route_usage",
+    metadata,
+    Column("departure", ForeignKey(waypoints.c.id), primary_key=True),
+    Column("arrival", ForeignKey(waypoints.c.id), primary_key=True),
+    Column("airline_id", ForeignKey(airlines.c.id), primary_key=True),
+    Column("aircraft_id", ForeignKey(aircrafts.c.id), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column(
+        "fpl_signature",
+        BigInteger,
+        Computed("route_signature(fpl)", persisted=True),
+        primary_key=True,
+    ),
+    Column("fpl", ARRAY(Integer), nullable=False),
+    Column("flight_count", BigInteger, nullable=False),
+    Column("fuel_sum", Float, nullable=False),
+    Column("duration_sum", Float, nullable=False),  # seconds
+    Index(
+        "ix_route_usage_departure_arrival_route",
+        "departure",
+        "arrival",
+        "fpl_signature",
+        postgresql_include=[
+            "day",
+            "airline_id",
+            "aircraft_id",
+            "flight_count",
+            "fuel_sum",
+            "duration_sum",
+        ],
+    ),
+)
+
+# t-digests of each filed route's fuel and block time per day, see app.sketch
+route_sketches = Table(
+    "route_sketches",
+    metadata,
+    Column("departure", ForeignKey(waypoints.c.id), primary_key=True),
+    Column("arrival", ForeignKey(waypoints.c.id), primary_key=True),
+    Column(
+        "fpl_signature",
+        BigInteger,
+        Computed("route_signature(fpl)", persisted=True),
+        primary_key=True,
+    ),
+    Column("day", Date, primary_key=True),
+    Column("fpl", ARRAY(Integer), nullable=False),
+    Column("flight_count", BigInteger, nullable=False),
+    Column("fuel", LargeBinary, nullable=False),
+    Column("block_time", LargeBinary, nullable=False),  # seconds
+)
+
+# flown track of a flight, one packed little-endian float32 array per column;
+# flights.id alone is not unique to Postgres, so flight_id has no foreign key
+# and retiring a partition removes its trajectories (app/partitions.py)
+trajectories = Table(
+    "trajectories",
+    metadata,
+    Column("flight_id", Integer, primary_key=True, autoincrement=False),
+    Column("point_count", Integer, nullable=False),
+    Column("latitude", LargeBinary, nullable=False),
+    Column("longitude", LargeBinary, nullable=False),
+    Column("altitude", LargeBinary),
+    Column("time", LargeBinary),  # seconds since departure_time
+)
+
+# background computations, claimed by workers with FOR UPDATE SKIP LOCKED
+jobs = Table(
+    "jobs",
+    metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("kind", String, nullable=False),
+    Column("params", JSONB, nullable=False),
+    # queued, running, succeeded, failed or cancelled
+    Column("status", String, nullable=False, server_default="queued"),
+    Column("done", Integer, nullable=False, server_default="0"),
+    Column("total", Integer),
+    Column("error", Text),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("started_at", DateTime(timezone=True)),
+    # renewed while running; a job whose lease ran out is claimed again
+    Column("heartbeat_at", DateTime(timezone=True)),
+    Column("finished_at", DateTime(timezone=True)),
+    Column("expires_at", DateTime(timezone=True)),
+    Index("ix_jobs_status_created_at", "status", "created_at"),
+    Index("ix_jobs_expires_at", "expires_at"),
+)
+
+job_results = Table(
+    "job_results",
+    metadata,
+    Column("job_id", ForeignKey(jobs.c.id, ondelete="CASCADE"), primary_key=True),
+    Column("seq", Integer, primary_key=True),
+    Column("item", JSONB, nullable=False),
 )
@@ -0,0 +1,208 @@
+"""ICAO field 15 route strings and operational flight plan (OFP) documents."""
+import re
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple, Optional
+
+# cruising speed and level, or just a level; "A791" is one, and an airway too
+SPEED_LEVEL = r"(?:[NK]\d{4}|M\d{3})?(?:[FA]\d{3}|[SM]\d{4}|VFR)"
+SPEED_LEVEL_PATTERN = re.compile(SPEED_LEVEL)
+# Checked in order, first match wins; each token of the route string must
+# match one of these in full. A speed/level group only stands on its own
+# right after the departure aerodrome, anywhere else it is a point's suffix.
+TOKEN_TYPES = [
+    ("dct", r"DCT"),
+    ("coordinates", r"\d{2}(?:\d{2})?[NS]\d{3}(?:\d{2})?[EW]"),
+    ("procedure", r"[A-Z]{3,5}\d[A-Z]"),  # SID or STAR, e.g. VASTO9Q
+    ("airway", r"[A-Z]{1,2}\d{1,3}[A-Z]?"),
+    ("aerodrome", r"[A-Z]{4}"),
+    ("point", r"[A-Z]{2,5}"),
+]
+TOKEN_PATTERN = re.compile(
+    "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in TOKEN_TYPES)
+)
+# "POINT/N0450F370" changes speed/level at a point, "EDDL/23L" is a runway
+SUFFIX_PATTERN = re.compile(
+    rf"(?P<runway>\d{{2}}[LRC]?)|(?P<speed_level>{SPEED_LEVEL})"
+)
+AERODROME_PATTERN = re.compile(r"[A-Z]{4}")
+# OFP entries that are not fixes: climb/descent points; 4-letter names
+# other than the aerodromes are FIR boundary crossings
+PSEUDO_WAYPOINTS = {"TOC", "TOD"}
+
+
+class RouteSyntaxError(ValueError):
+    pass
+
+
+class RoutePoint(NamedTuple):
+    name: str
+    via: Optional[str] = None  # airway from the previous point, None for DCT
+    speed_level: Optional[str] = None  # new speed/level from this point on
+
+
+class Route(NamedTuple):
+    departure: str
+    arrival: str
+    points: list[RoutePoint]
+    departure_runway: Optional[str] = None
+    arrival_runway: Optional[str] = None
+    sid: Optional[str] = None
+    star: Optional[str] = None
+    cruise: Optional[str] = None  # initial speed/level
+
+    @property
+    def names(self) -> list[str]:
+        return [self.departure, *(p.name for p in self.points), self.arrival]
+
+
+def parse_route(route: str) -> Route:
+    """Tokenize a route such as ``GCFV/01 F360 VASTO DCT BAROK UM163 ... EDDL/23L``."""
+    tokens = route.split()
+    if len(tokens) < 2:
+        raise RouteSyntaxError(f"route too short: {route!r}")
+
+    departure, departure_runway = _aerodrome(tokens[0])
+    arrival, arrival_runway = _aerodrome(tokens[-1])
+    points = []
+    sid = star = cruise = via = None
+    match = TOKEN_PATTERN.fullmatch
+    body = tokens[1:-1]
+    if body and SPEED_LEVEL_PATTERN.fullmatch(body[0]):
+        cruise, body = body[0], body[1:]
+    for token in body:
+        name, _, suffix = token.partition("/")
+        found = match(name)
+        if found is None:
+            raise RouteSyntaxError(f"unexpected token {token!r}")
+        kind = found.lastgroup
+        if kind == "dct":
+            via = None
+        elif kind == "airway":
+            via = name
+        elif kind == "procedure":
+            if points:
+                star = name
+            else:
+                sid = name
+        else:  # point, coordinates or an aerodrome used as a fix
+            speed_level = None
+            if suffix:
+                found = SUFFIX_PATTERN.fullmatch(suffix)
+                if found is None:
+                    raise RouteSyntaxError(f"unexpected suffix in {token!r}")
+                speed_level = found.group("speed_level")
+            points.append(RoutePoint(name, via, speed_level))
+            via = None
+    return Route(
+        departure,
+        arrival,
+        points,
+        departure_runway,
+        arrival_runway,
+        sid,
+        star,
+        cruise,
+    )
+
+
+def _aerodrome(token: str):
+    name, _, runway = token.partition("/")
+    if not AERODROME_PATTERN.fullmatch(name):
+        raise RouteSyntaxError(f"expected an aerodrome, got {token!r}")
+    return name, runway or None
+
+
+class OfpWaypoint(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    eet: timedelta
+
+
+class OfpFlight(NamedTuple):
+    departure: str
+    arrival: str
+    route: Route
+    waypoints: list[OfpWaypoint]
+    fuel_consumption: float
+    duration: timedelta
+
+    def fixes(self) -> list[OfpWaypoint]:
+        """OFP waypoints that are navigation fixes, without consecutive repeats."""
+        fixes = []
+        for waypoint in self.waypoints:
+            name = waypoint.name
+            if name in PSEUDO_WAYPOINTS or fixes and fixes[-1].name == name:
+                continue
+            if AERODROME_PATTERN.fullmatch(name) and name not in (
+                self.departure,
+                self.arrival,
+            ):
+                continue
+            fixes.append(waypoint)
+        return fixes
+
+    def fpl_names(self) -> list[str]:
+        return [waypoint.name for waypoint in self.fixes()]
+
+    def to_flight(
+        self,
+        waypoint_ids: dict[str, int],
+        airline_id: int,
+        aircraft_id: int,
+        departure_time: datetime,
+    ) -> dict:
+        return {
+            "departure": waypoint_ids[self.departure],
+            "arrival": waypoint_ids[self.arrival],
+            "airline_id": airline_id,
+            "aircraft_id": aircraft_id,
+            "fuel_consumption": self.fuel_consumption,
+            "departure_time": departure_time,
+            "arrival_time": departure_time + self.duration,
+            "fpl": [waypoint_ids[name] for name in self.fpl_names()],
+        }
+
+
+def parse_ofp(document: dict) -> OfpFlight:
+    """Read the parts of an OFP document (see sample_tech_test.json) we store."""
+    ofp = document["lastOfp"]
+    route = parse_route(ofp.get("fpl") or document["fpl"])
+    route = route._replace(
+        sid=route.sid or ofp.get("sid"), star=route.star or ofp.get("star")
+    )
+    waypoints = [
+        OfpWaypoint(
+            wp["name"],
+            wp["latitude"],
+            wp["longitude"],
+            timedelta(hours=wp["eet"][0], minutes=wp["eet"][1], seconds=wp["eet"][2]),
+        )
+        for wp in ofp["waypoints"]
+    ]
+    flight = OfpFlight(
+        document.get("departure") or route.departure,
+        document.get("arrival") or route.arrival,
+        route,
+        waypoints,
+        float(ofp["tripFuel"]),
+        waypoints[-1].eet if waypoints else timedelta(),
+    )
+    # to_flight needs a position, and so an id, for both aerodromes
+    names = set(flight.fpl_names())
+    for aerodrome in (flight.departure, flight.arrival):
+        if aerodrome not in names:
+            raise ValueError(f"{aerodrome} is not among the OFP waypoints")
+    return flight
+
+
+def waypoint_positions(
+    flights: Iterable[OfpFlight],
+) -> dict[str, tuple[float, float]]:
+    """First reported position of every fix across ``flights``."""
+    positions = {}
+    for flight in flights:
+        for waypoint in flight.fixes():
+            if waypoint.name not in positions:
+                positions[waypoint.name] = (waypoint.latitude, waypoint.longitude)
+    return positions
@@ -0,0 +1,22 @@
+"""Pareto fronts of routes scored on several costs, all minimized."""
+import numpy as np
+
+
+def non_dominated(costs, max_size: int = None) -> np.ndarray:
+    """Indices of the rows of ``costs`` that no other row dominates.
+
+    The front comes back sorted by the first cost. Beyond ``max_size`` it is
+    thinned evenly along that order, keeping both extremes.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    if not len(costs):
+        return np.empty(0, np.int64)
+    # row i is dominated by j if j <= i everywhere and j < i somewhere
+    no_worse = (costs[None, :, :] <= costs[:, None, :]).all(axis=2)
+    better = (costs[None, :, :] < costs[:, None, :]).any(axis=2)
+    front = np.flatnonzero(~(no_worse & better).any(axis=1))
+    front = front[np.lexsort(costs[front].T[::-1])]
+    if max_size is not None and len(front) > max_size:
+        keep = np.linspace(0, len(front) - 1, max_size).round().astype(np.int64)
+        front = front[np.unique(keep)]
+    return front
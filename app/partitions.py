@@ -0,0 +1,184 @@
+"""Monthly range partitions of ``flights`` on ``departure_time``.
+
+Each month is a partition named ``flights_pYYYYMM``. Schema setup creates
+them from the oldest flight to ``FLIGHTS_PARTITIONS_AHEAD`` months from now,
+and ``FlightPartitions.ensure`` adds any other month just before rows for it
+are written, so there is no default partition to fill up and later split.
+Old months are retired by detaching them, and then either moving them to an
+archive schema or dropping them.
+"""
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+import asyncpg
+from databases.core import Connection
+
+PARTITION_PREFIX = "flights_p"
+
+EXISTING_PARTITIONS = """
+    SELECT child.relname AS name, GREATEST(child.reltuples, 0) AS estimated_rows
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    JOIN pg_namespace ON pg_namespace.oid = parent.relnamespace
+    WHERE parent.relname = 'flights' AND pg_namespace.nspname = current_schema()
+"""
+
+# whether a table, named with its schema, exists
+TABLE_EXISTS = "SELECT to_regclass(:name) IS NOT NULL"
+
+
+class PartitionArchived(ValueError):
+    """A month to archive already has a table in the archive schema."""
+
+
+def month_start(moment: date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    year, index = divmod(month.year * 12 + month.month - 1 + count, 12)
+    return date(year, index + 1, 1)
+
+
+def months(first: date, last: date) -> list[date]:
+    """Every month from ``first``'s to ``last``'s, inclusive."""
+    month, last = month_start(first), month_start(last)
+    result = []
+    while month <= last:
+        result.append(month)
+        month = add_months(month, 1)
+    return result
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """The month a partition holds, or ``None`` for tables not named by month."""
+    suffix = name[len(PARTITION_PREFIX) :]
+    if not name.startswith(PARTITION_PREFIX) or len(suffix) != 6:
+        return None
+    try:
+        return date(int(suffix[:4]), int(suffix[4:]), 1)
+    except ValueError:
+        return None
+
+
+def create_partition(month: date) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF flights
+        FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')
+    """
+
+
+def retire_partition(month: date, archive_schema: Optional[str]) -> list[str]:
+    """Statements detaching one month, archiving it with its trajectories when
+    ``archive_schema`` is given and dropping both otherwise.
+
+    ``trajectories`` cannot reference a partitioned ``flights`` by foreign
+    key, so their rows are moved or deleted here explicitly.
+    """
+    name = partition_name(month)
+    statements = [f"ALTER TABLE flights DETACH PARTITION {name}"]
+    if archive_schema:
+        statements += [
+            f"CREATE SCHEMA IF NOT EXISTS {archive_schema}",
+            f"""
+            CREATE TABLE IF NOT EXISTS {archive_schema}.trajectories
+            (LIKE trajectories INCLUDING ALL)
+            """,
+            f"""
+            INSERT INTO {archive_schema}.trajectories
+            SELECT trajectories.* FROM trajectories
+            JOIN {name} ON {name}.id = trajectories.flight_id
+            """,
+        ]
+    statements.append(
+        f"""
+        DELETE FROM trajectories USING {name}
+        WHERE {name}.id = trajectories.flight_id
+        """
+    )
+    if archive_schema:
+        statements.append(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+    else:
+        statements.append(f"DROP TABLE {name}")
+    return statements
+
+
+class FlightPartitions:
+    """Process-wide record of which monthly partitions exist.
+
+    ``ensure`` is called before every write to ``flights``; when all months
+    are known, which is nearly always, it is a set difference and no query.
+    """
+
+    def __init__(self, archive_schema: Optional[str] = "archive"):
+        self.archive_schema = archive_schema
+        self._known: set[date] = set()
+
+    async def existing(self, db: Connection) -> set[date]:
+        rows = await db.fetch_all(EXISTING_PARTITIONS)
+        found = {partition_month(row["name"]) for row in rows}
+        found.discard(None)
+        self._known = found
+        return found
+
+    async def describe(self, db: Connection) -> list[dict]:
+        """Partitions by month, with the planner's row estimates."""
+        rows = await db.fetch_all(EXISTING_PARTITIONS)
+        partitions = [
+            {
+                "name": row["name"],
+                "month": partition_month(row["name"]),
+                "estimated_rows": int(row["estimated_rows"]),
+            }
+            for row in rows
+        ]
+        return sorted(
+            (p for p in partitions if p["month"] is not None),
+            key=lambda p: p["month"],
+        )
+
+    async def ensure(self, db: Connection, times: Iterable[datetime]):
+        """Create the partitions rows departing at ``times`` belong in.
+
+        Must run outside a transaction: a concurrent worker creating the same
+        partition makes this one fail, and that is fine.
+        """
+        missing = {month_start(moment) for moment in times} - self._known
+        if not missing:
+            return
+        missing -= await self.existing(db)
+        for month in sorted(missing):
+            try:
+                await db.execute(create_partition(month))
+            except (asyncpg.DuplicateTableError, asyncpg.UniqueViolationError):
+                pass
+            self._known.add(month)
+
+    async def retire(self, db: Connection, before: date, archive: bool = True):
+        """Retire every month that ends on or before ``before``.
+
+        Returns the names of the partitions retired. Raises
+        ``PartitionArchived``, before retiring any, if a month was archived
+        already: it was written to again after its retirement, and the two
+        tables need merging by hand.
+        """
+        schema = self.archive_schema if archive else None
+        due = [m for m in sorted(await self.existing(db)) if add_months(m, 1) <= before]
+        if schema:
+            for month in due:
+                archived = f"{schema}.{partition_name(month)}"
+                if await db.fetch_val(TABLE_EXISTS, values={"name": archived}):
+                    raise PartitionArchived(f"{archived} already exists")
+        retired = []
+        for month in due:
+            async with db.transaction():
+                for statement in retire_partition(month, schema):
+                    await db.execute(statement)
+            self._known.discard(month)
+            retired.append(partition_name(month))
+        return retired
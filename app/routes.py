@@ -1,14 +1,54 @@
-from datetime import datetime
+from datetime import date, datetime
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query
+from databases.core import Connection
 
+from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi.exceptions import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from .cache import ResultCache
+from .executor import ComputeExecutor
+from .deps import (
+    get_db,
+    get_executor,
+    get_flight_partitions,
+    get_job_runner,
+    get_metrics,
+    get_result_cache,
+    get_route_graph,
+    get_settings,
+    get_slow_query_log,
+)
+from .graph import CostMetric, RouteGraphEngine, SearchAlgorithm
+from .jobs import JobRunner
+from .metrics import CONTENT_TYPE, Metrics
+from .partitions import FlightPartitions, PartitionArchived
 from .schemas import (
     AlternativeRoute,
+    AppliedWind,
+    BulkFlightResult,
     Flight,
     FlightCreate,
-    FlightRoute
+    FlightPartition,
+    FlightRoute,
+    GeneratedEdges,
+    Job,
+    JobCreate,
+    ParetoFront,
+    RetiredPartitions,
+    RoutePairsQuery,
+    RoutePairUsage,
+    RouteStatistics,
+    ShortestRoute,
+    SlowQuery,
+    StoredTrajectory,
+    TrajectoryPoints,
 )
 from .services import FlightService
+from .simplify import SimplifyMethod
+from .slowlog import SlowQueryLog
+from .settings import Settings
 
 router = APIRouter()
 
@@ -21,6 +61,43 @@ async def create_flight(
     return await service.create_flight(flight)
 
 
+@router.post(
+    "/flights/routes/bulk",
+    response_model=BulkFlightResult,
+    description="Load newline-delimited JSON flights (one FlightCreate per line)",
+)
+async def bulk_create_flights(
+    request: Request,
+    service: FlightService = Depends(FlightService),
+    settings: Settings = Depends(get_settings),
+):
+    return await service.bulk_create_flights(
+        request.stream(), settings.BULK_CHUNK_SIZE
+    )
+
+
+@router.post(
+    "/flights/ofp",
+    response_model=BulkFlightResult,
+    description="Create flights from newline-delimited OFP documents",
+)
+async def import_ofps(
+    request: Request,
+    airline_id: int = None,
+    aircraft_id: int = None,
+    departure_time: datetime = Query(None),
+    service: FlightService = Depends(FlightService),
+    settings: Settings = Depends(get_settings),
+):
+    return await service.import_ofps(
+        request.stream(),
+        airline_id,
+        aircraft_id,
+        departure_time,
+        settings.OFP_CHUNK_SIZE,
+    )
+
+
 @router.get("/flights/most_used", response_model=FlightRoute, description="Get most used flight route for given parameters")
 async def get_most_used_flight_route(
     departure: int,
@@ -41,6 +118,24 @@ async def get_most_used_flight_route(
     )
 
 
+@router.post(
+    "/flights/most_used/batch",
+    response_model=list[RoutePairUsage],
+    description="Most used flight route for many departure/arrival pairs",
+)
+async def get_most_used_flight_routes(
+    query: RoutePairsQuery,
+    service: FlightService = Depends(FlightService),
+):
+    return await service.get_most_used_routes(
+        [(pair.departure, pair.arrival) for pair in query.pairs],
+        query.airline_id,
+        query.aircraft_id,
+        query.start_date,
+        query.end_date,
+    )
+
+
 @router.get("/flights/most_efficient", response_model=FlightRoute)
 async def get_most_efficient_flight_route(
     departure: int,
@@ -57,12 +152,227 @@ async def get_most_efficient_flight_route(
     )
 
 
+@router.get("/flights/pareto", response_model=ParetoFront)
+async def get_pareto_flight_routes(
+    departure: int,
+    arrival: int,
+    max_front: int = Query(None, ge=1, le=100),
+    service: FlightService = Depends(FlightService),
+    settings: Settings = Depends(get_settings),
+):
+    return await service.get_pareto_routes(
+        departure,
+        arrival,
+        max_front or settings.PARETO_MAX_FRONT,
+        settings.PARETO_CPU_BUDGET,
+    )
+
+
+@router.get(
+    "/flights/statistics",
+    response_model=list[RouteStatistics],
+    description="Fuel and block time percentiles of the most flown routes",
+)
+async def get_route_statistics(
+    departure: int,
+    arrival: int,
+    start_date: datetime = Query(None),
+    end_date: datetime = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    service: FlightService = Depends(FlightService),
+):
+    return await service.get_route_statistics(
+        departure, arrival, start_date, end_date, limit
+    )
+
+
+@router.get("/flights/cache/stats", response_model=dict[str, int])
+async def get_result_cache_stats(cache: ResultCache = Depends(get_result_cache)):
+    return cache.stats.as_dict()
+
+
+@router.get("/flights/executor/stats", response_model=dict[str, int])
+async def get_executor_stats(executor: ComputeExecutor = Depends(get_executor)):
+    return {**executor.stats.as_dict(), "pending": executor.pending}
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics_text(
+    metrics: Metrics = Depends(get_metrics),
+    cache: ResultCache = Depends(get_result_cache),
+    route_graph: RouteGraphEngine = Depends(get_route_graph),
+    executor: ComputeExecutor = Depends(get_executor),
+):
+    if metrics is None:
+        raise HTTPException(404)
+    text = metrics.render(cache, route_graph, executor)
+    return Response(text, media_type=CONTENT_TYPE)
+
+
+@router.get("/admin/slow-queries", response_model=list[SlowQuery])
+async def get_slow_queries(
+    slow_queries: SlowQueryLog = Depends(get_slow_query_log),
+):
+    """Queries slower than SLOW_QUERY_THRESHOLD in this worker, by shape."""
+    if slow_queries is None:
+        raise HTTPException(404)
+    return [entry.as_dict() for entry in slow_queries.entries()]
+
+
+@router.delete("/admin/slow-queries", status_code=204)
+async def clear_slow_queries(
+    slow_queries: SlowQueryLog = Depends(get_slow_query_log),
+):
+    if slow_queries is not None:
+        slow_queries.clear()
+
+
+@router.get("/admin/partitions", response_model=list[FlightPartition])
+async def get_flight_partitions_list(
+    db: Connection = Depends(get_db),
+    partitions: FlightPartitions = Depends(get_flight_partitions),
+):
+    return await partitions.describe(db)
+
+
+@router.post("/admin/partitions/retire", response_model=RetiredPartitions)
+async def retire_flight_partitions(
+    before: date,
+    archive: bool = True,
+    db: Connection = Depends(get_db),
+    partitions: FlightPartitions = Depends(get_flight_partitions),
+    settings: Settings = Depends(get_settings),
+):
+    """Detach the months of flights that end on or before ``before``.
+
+    With ``archive`` they move to FLIGHTS_ARCHIVE_SCHEMA with their
+    trajectories; otherwise both are dropped. Only served with
+    PARTITION_ADMIN_ENABLED.
+    """
+    if not settings.PARTITION_ADMIN_ENABLED:
+        raise HTTPException(404)
+    archive = archive and bool(partitions.archive_schema)
+    try:
+        retired = await partitions.retire(db, before, archive)
+    except PartitionArchived as e:
+        raise HTTPException(409, f"{e}; merge or drop it before retiring again")
+    return {"retired": retired, "archived": archive}
+
+
 @router.get("/flights/alternatives", response_model=list[AlternativeRoute])
 async def get_alternative_route(
-    flight_id: int, service: FlightService = Depends(FlightService)
+    flight_id: int,
+    k: int = Query(5, ge=1, le=50),
+    service: FlightService = Depends(FlightService),
+    settings: Settings = Depends(get_settings),
+):
+    return await service.get_alternatives(
+        flight_id, k, settings.ALTERNATIVES_CPU_BUDGET
+    )
+
+
+@router.get("/flights/shortest", response_model=ShortestRoute)
+async def get_shortest_route(
+    departure: int,
+    arrival: int,
+    algorithm: SearchAlgorithm = SearchAlgorithm.dijkstra,
+    metric: CostMetric = CostMetric.distance,
+    service: FlightService = Depends(FlightService),
+):
+    return await service.get_shortest_route(departure, arrival, algorithm, metric)
+
+
+@router.post("/flights/graph/refresh", status_code=204)
+async def refresh_route_graph(service: FlightService = Depends(FlightService)):
+    await service.route_graph.refresh(service.db)
+    await service.waypoint_names.refresh(service.db)
+
+
+@router.post("/flights/graph/edges", response_model=GeneratedEdges)
+async def generate_route_graph_edges(
+    k: int = Query(8, ge=1),
+    radius_km: float = Query(None, gt=0),
+    service: FlightService = Depends(FlightService),
 ):
-    return await service.get_alternatives(flight_id)
+    return {"edges": await service.generate_edges(k, radius_km)}
 
 
-# TODO
-# @router.get("/flights/shortest")
+@router.post("/flights/graph/wind", response_model=AppliedWind)
+async def apply_route_graph_wind(
+    ofp: dict = Body(..., description="OFP document with per-waypoint winds"),
+    service: FlightService = Depends(FlightService),
+):
+    return await service.apply_wind(ofp)
+
+
+@router.post("/flights/jobs", response_model=Job, status_code=202)
+async def submit_job(
+    job: JobCreate,
+    db: Connection = Depends(get_db),
+    runner: JobRunner = Depends(get_job_runner),
+):
+    return await runner.submit(db, job)
+
+
+@router.get("/flights/jobs/{job_id}", response_model=Job)
+async def get_job(
+    job_id: UUID,
+    db: Connection = Depends(get_db),
+    runner: JobRunner = Depends(get_job_runner),
+):
+    return await runner.get(db, job_id)
+
+
+@router.delete("/flights/jobs/{job_id}", response_model=Job)
+async def cancel_job(
+    job_id: UUID,
+    db: Connection = Depends(get_db),
+    runner: JobRunner = Depends(get_job_runner),
+):
+    return await runner.cancel(db, job_id)
+
+
+@router.get("/flights/jobs/{job_id}/results")
+async def get_job_results(
+    job_id: UUID,
+    db: Connection = Depends(get_db),
+    runner: JobRunner = Depends(get_job_runner),
+):
+    """Results emitted so far, as newline-delimited JSON."""
+    await runner.get(db, job_id)
+    # the request's connection is held until the stream ends
+    return StreamingResponse(
+        runner.iter_results(db, job_id), media_type="application/x-ndjson"
+    )
+
+
+@router.put("/flights/{flight_id}/trajectory", response_model=StoredTrajectory)
+async def store_flight_trajectory(
+    flight_id: int,
+    request: Request,
+    service: FlightService = Depends(FlightService),
+    settings: Settings = Depends(get_settings),
+):
+    return await service.store_trajectory(
+        flight_id, request.stream(), settings.TRACK_MATCH_RADIUS_KM
+    )
+
+
+@router.get("/flights/{flight_id}/trajectory", response_model=TrajectoryPoints)
+async def get_flight_trajectory(
+    flight_id: int,
+    start: int = None,
+    stop: int = None,
+    start_time: datetime = Query(None),
+    end_time: datetime = Query(None),
+    tolerance: float = Query(
+        None, gt=0, description="Simplify to within this many metres"
+    ),
+    method: SimplifyMethod = SimplifyMethod.douglas_peucker,
+    points: int = Query(None, ge=2, description="Return at most this many points"),
+    service: FlightService = Depends(FlightService),
+):
+    trajectory = await service.get_trajectory(
+        flight_id, start, stop, start_time, end_time, tolerance, method, points
+    )
+    return trajectory.to_dict()
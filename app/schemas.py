@@ -1,6 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import Annotated, Literal, Optional, Union
+from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+from .graph import CostMetric, SearchAlgorithm
 
 
 class AirlineBase(BaseModel):
@@ -49,15 +53,169 @@ class Flight(FlightBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class BulkError(BaseModel):
+    line: int
+    error: str
+
+
+class BulkFlightResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[BulkError]  # capped, see services.MAX_REPORTED_ERRORS
+    seconds: float
+    rows_per_second: float
+
+
 class FlightRoute(BaseModel):
     fpl: list[str]
 
 
+class ParetoRoute(FlightRoute):
+    time: float  # seconds
+    fuel: Optional[float]
+    distance: Optional[float]  # km
+    flights: Optional[int] = None  # flown routes only
+
+
+class ParetoFront(BaseModel):
+    history: list[ParetoRoute]
+    graph: list[ParetoRoute]
+
+
+class RoutePair(BaseModel):
+    departure: int
+    arrival: int
+
+
+class RoutePairsQuery(BaseModel):
+    pairs: list[RoutePair] = Field(max_length=10_000)
+    airline_id: Optional[int] = None
+    aircraft_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+
+class RoutePairUsage(RoutePair):
+    fpl: Optional[list[str]]  # None when the pair has no flights
+    usage_count: int
+
+
+class Percentiles(BaseModel):
+    p50: Optional[float]  # None when no flight recorded a value
+    p90: Optional[float]
+    p99: Optional[float]
+
+
+class RouteStatistics(FlightRoute):
+    flights: int
+    fuel: Percentiles
+    block_time: Percentiles  # seconds
+
+
+class ShortestRoute(FlightRoute):
+    cost: float  # km, or seconds with the time metric
+    algorithm: str
+    metric: str
+    expanded: int  # nodes settled by the search
+
+
+class GeneratedEdges(BaseModel):
+    edges: int
+
+
+class AppliedWind(BaseModel):
+    edges: int
+    observations: int
+    true_airspeed: float  # knots
+
+
+class FlightPartition(BaseModel):
+    name: str
+    month: date
+    estimated_rows: int
+
+
+class RetiredPartitions(BaseModel):
+    retired: list[str]
+    archived: bool
+
+
+class SlowQuery(BaseModel):
+    fingerprint: str
+    shape: str
+    caller: str
+    count: int
+    total_seconds: float
+    max_seconds: float
+    last_seconds: float
+    last_values: dict
+    last_seen: datetime
+    plan: Optional[str]  # EXPLAIN output, when one was sampled
+    plan_values: Optional[dict]
+    plan_captured: Optional[datetime]
+
+
 class AlternativeRoute(FlightRoute):
     fuel_savings: float
     time_savings: str
 
 
+class ShortestRoutesJob(BaseModel):
+    """Shortest route between every ordered pair of ``waypoints``."""
+
+    kind: Literal["shortest_routes"]
+    waypoints: list[int] = Field(min_length=2, max_length=500)
+    algorithm: SearchAlgorithm = SearchAlgorithm.dijkstra
+    metric: CostMetric = CostMetric.distance
+
+
+class DayAlternativesJob(BaseModel):
+    """Alternatives for every flight departing on ``day``."""
+
+    kind: Literal["alternatives"]
+    day: date
+    k: int = Field(5, ge=1, le=50)
+
+
+class MapMatchJob(BaseModel):
+    """Map-match the stored trajectories of ``flight_ids`` again."""
+
+    kind: Literal["map_match"]
+    flight_ids: list[int] = Field(min_length=1, max_length=100_000)
+
+
+JobCreate = Annotated[
+    Union[ShortestRoutesJob, DayAlternativesJob, MapMatchJob],
+    Field(discriminator="kind"),
+]
+
+
+class Job(BaseModel):
+    id: UUID
+    kind: str
+    status: str  # queued, running, succeeded, failed or cancelled
+    done: int
+    total: Optional[int]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    expires_at: Optional[datetime]
+
+
+class StoredTrajectory(BaseModel):
+    flight_id: int
+    points: int
+    flown_fpl: list[str]
+
+
+class TrajectoryPoints(BaseModel):
+    latitude: list[float]
+    longitude: list[float]
+    altitude: Optional[list[float]]
+    time: Optional[list[float]] = None  # seconds since departure, if stored
+
+
 class NodeBase(BaseModel):
     pass
 
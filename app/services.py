@@ -1,27 +1,300 @@
-import heapq
-import itertools
-from datetime import timedelta
+import asyncio
+import json
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 
-from databases import Database
+import asyncpg
+import numpy as np
+from databases.core import Connection
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
+from pydantic import ValidationError
 
-from app.deps import get_db
+from app.deps import (
+    get_db,
+    get_executor,
+    get_flight_partitions,
+    get_metrics,
+    get_result_cache,
+    get_route_graph,
+    get_slow_query_log,
+    get_waypoint_directory,
+)
 
-from .models import flights, waypoints
-from .schemas import Edge, Flight, FlightCreate, Node
+from .cache import MISSING, ResultCache
+from .executor import ComputeExecutor, ExecutorSaturated
+from .graph import CostMetric, RouteGraphEngine, SearchAlgorithm
+from .matching import match_track
+from .metrics import Metrics, TimedConnection
+from .models import flights, wind_snapshots
+from .ofp import parse_ofp, waypoint_positions
+from .pareto import non_dominated
+from .partitions import FlightPartitions
+from .schemas import Flight, FlightCreate
+from .simplify import SimplifyMethod, downsample, simplify
+from .sketch import PERCENTILES, fold_sketches, merged_percentiles
+from .slowlog import SlowQueryLog
+from .trajectory import Trajectory, pack, read_track_arrays, seconds_since
+from .waypoints import WaypointDirectory
+from .wind import WindSnapshot, leg_times, wind_from_ofp, wind_report
+
+
+MAX_REPORTED_ERRORS = 100
+
+# fpl arrays travel as text since unnest() would flatten an integer[][]
+UPSERT_ROUTE_USAGE = """
+    INSERT INTO route_usage AS usage (
+        departure, arrival, airline_id, aircraft_id, day, fpl,
+        flight_count, fuel_sum, duration_sum
+    )
+    SELECT dep, arr, airline, aircraft, day, CAST(fpl AS integer[]), n, fuel, duration
+    FROM unnest(
+        CAST(:departures AS integer[]),
+        CAST(:arrivals AS integer[]),
+        CAST(:airline_ids AS integer[]),
+        CAST(:aircraft_ids AS integer[]),
+        CAST(:days AS date[]),
+        CAST(:fpls AS text[]),
+        CAST(:counts AS bigint[]),
+        CAST(:fuel AS double precision[]),
+        CAST(:durations AS double precision[])
+    ) AS t(dep, arr, airline, aircraft, day, fpl, n, fuel, duration)
+    ON CONFLICT (departure, arrival, airline_id, aircraft_id, day, fpl_signature)
+    DO UPDATE SET
+        flight_count = usage.flight_count + EXCLUDED.flight_count,
+        fuel_sum = usage.fuel_sum + EXCLUDED.fuel_sum,
+        duration_sum = usage.duration_sum + EXCLUDED.duration_sum
+"""
+
+# creates missing day sketches empty and locks them all, returning their state
+LOCK_ROUTE_SKETCHES = """
+    INSERT INTO route_sketches AS sketch (
+        departure, arrival, day, fpl, flight_count, fuel, block_time
+    )
+    SELECT dep, arr, day, CAST(fpl AS integer[]), n, '', ''
+    FROM unnest(
+        CAST(:departures AS integer[]),
+        CAST(:arrivals AS integer[]),
+        CAST(:days AS date[]),
+        CAST(:fpls AS text[]),
+        CAST(:counts AS bigint[])
+    ) AS t(dep, arr, day, fpl, n)
+    ON CONFLICT (departure, arrival, fpl_signature, day)
+    DO UPDATE SET flight_count = sketch.flight_count + EXCLUDED.flight_count
+    RETURNING departure, arrival, day, fpl, fuel, block_time
+"""
+
+UPDATE_ROUTE_SKETCHES = """
+    UPDATE route_sketches AS sketch
+    SET fuel = t.fuel, block_time = t.block_time
+    FROM unnest(
+        CAST(:departures AS integer[]),
+        CAST(:arrivals AS integer[]),
+        CAST(:days AS date[]),
+        CAST(:fpls AS text[]),
+        CAST(:fuel AS bytea[]),
+        CAST(:block_times AS bytea[])
+    ) AS t(dep, arr, day, fpl, fuel, block_time)
+    WHERE sketch.departure = t.dep
+        AND sketch.arrival = t.arr
+        AND sketch.day = t.day
+        AND sketch.fpl_signature = route_signature(CAST(t.fpl AS integer[]))
+"""
 
 
 class FlightService:
-    def __init__(self, db: Database = Depends(get_db)):
+    def __init__(
+        self,
+        db: Connection = Depends(get_db),
+        route_graph: RouteGraphEngine = Depends(get_route_graph),
+        cache: ResultCache = Depends(get_result_cache),
+        waypoint_names: WaypointDirectory = Depends(get_waypoint_directory),
+        executor: ComputeExecutor = Depends(get_executor),
+        metrics: Optional[Metrics] = Depends(get_metrics),
+        slow_queries: Optional[SlowQueryLog] = Depends(get_slow_query_log),
+        partitions: FlightPartitions = Depends(get_flight_partitions),
+    ):
+        if metrics is not None or slow_queries is not None:
+            db = TimedConnection(db, metrics and metrics.db_seconds, slow_queries)
         self.db = db
+        self.route_graph = route_graph
+        self.cache = cache
+        self.waypoint_names = waypoint_names
+        self.executor = executor
+        self.partitions = partitions
 
     async def create_flight(self, flight_data: FlightCreate) -> Flight:
-        flight = flight_data.model_dump()
-        query = flights.insert()
-        created_id = await self.db.execute(query, values=flight)
+        # naive UTC, as _copy_flights writes them
+        flight = {k: _to_copy(v) for k, v in flight_data.model_dump().items()}
+        query = flights.insert().returning(flights.c.id)
+        await self.partitions.ensure(self.db, [flight["departure_time"]])
+        async with self.db.transaction():
+            created_id = await self.db.execute(query, values=flight)
+            pairs = await self._add_route_usage([flight])
+            await self._add_route_sketches([flight])
+        await self._invalidate(pairs)
         return {**flight, "id": created_id}
 
+    async def bulk_create_flights(
+        self, stream: AsyncIterator[bytes], chunk_size: int = 5000
+    ) -> dict:
+        """COPY newline-delimited ``FlightCreate`` JSON into ``flights``."""
+        return await self._bulk_load(
+            stream, parse_flight, self._copy_flights, chunk_size
+        )
+
+    async def import_ofps(
+        self,
+        stream: AsyncIterator[bytes],
+        airline_id: int = None,
+        aircraft_id: int = None,
+        departure_time: datetime = None,
+        chunk_size: int = 500,
+    ) -> dict:
+        """Create flights from newline-delimited OFP documents.
+
+        Documents look like ``sample_tech_test.json``; ``airlineId``,
+        ``aircraftId`` and ``departureTime`` keys in a document override the
+        defaults given here. Unknown fixes are added to ``waypoints`` at the
+        position the OFP reports.
+        """
+        parse = partial(
+            parse_ofp_line,
+            airline_id=airline_id,
+            aircraft_id=aircraft_id,
+            departure_time=departure_time,
+        )
+
+        async def write(documents: list):
+            ids = await self._upsert_waypoints(
+                waypoint_positions(ofp for ofp, *_ in documents)
+            )
+            await self._copy_flights(
+                [ofp.to_flight(ids, *defaults) for ofp, *defaults in documents]
+            )
+
+        result = await self._bulk_load(stream, parse, write, chunk_size)
+        await self.waypoint_names.refresh(self.db)
+        return result
+
+    async def _bulk_load(
+        self,
+        stream: AsyncIterator[bytes],
+        parse: Callable[[bytes], Any],
+        write: Callable[[list], Awaitable],
+        chunk_size: int,
+    ) -> dict:
+        """Parse a newline-delimited body and ``write`` it chunk by chunk.
+
+        Memory stays bounded by ``chunk_size`` lines. Each chunk is parsed in
+        the process pool, so ``parse`` must be picklable. Lines ``parse``
+        rejects are reported and skipped; a chunk rejected by the database is
+        reported as a whole.
+        """
+        started = time.perf_counter()
+        inserted, failed, errors = 0, 0, []
+
+        def report(line: int, error: str):
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "error": error})
+
+        async def flush(lines: list[tuple[int, bytes]]):
+            nonlocal inserted, failed
+            if not lines:
+                return
+            items, rejected = await self._compute(
+                parse_lines, parse, lines, process=True
+            )
+            for line_no, error in rejected:
+                failed += 1
+                report(line_no, error)
+            if not items:
+                return
+            first_line, last_line = lines[0][0], lines[-1][0]
+            try:
+                await write(items)
+                inserted += len(items)
+            except asyncpg.PostgresError as e:
+                failed += len(items)
+                report(first_line, f"lines {first_line}-{last_line}: {e}")
+
+        lines, line_no = [], 0
+        async for line in iter_lines(stream):
+            line_no += 1
+            if not line.strip():
+                continue
+            lines.append((line_no, line))
+            if len(lines) >= chunk_size:
+                await flush(lines)
+                lines = []
+        await flush(lines)
+
+        seconds = time.perf_counter() - started
+        return {
+            "inserted": inserted,
+            "failed": failed,
+            "errors": errors,
+            "seconds": seconds,
+            "rows_per_second": inserted / seconds if seconds else 0.0,
+        }
+
+    async def _copy_flights(self, rows: list[dict]):
+        """COPY ``FlightCreate``-shaped dicts into ``flights`` and the aggregates."""
+        columns = list(FlightCreate.model_fields)
+        rows = [{c: _to_copy(row[c]) for c in columns} for row in rows]
+        await self.partitions.ensure(self.db, {row["departure_time"] for row in rows})
+        async with self.db.transaction():
+            await self.db.raw_connection.copy_records_to_table(
+                flights.name,
+                records=[tuple(row.values()) for row in rows],
+                columns=columns,
+            )
+            pairs = await self._add_route_usage(rows)
+            await self._add_route_sketches(rows)
+        await self._invalidate(pairs)
+
+    async def _upsert_waypoints(
+        self, positions: dict[str, tuple[float, float]]
+    ) -> dict[str, int]:
+        """Ids of waypoints by name, inserting the ones not known yet."""
+        names = list(positions)
+        rows = await self.db.fetch_all(
+            """
+            SELECT DISTINCT ON (name) id, name FROM waypoints
+            WHERE name = ANY(:names)
+            ORDER BY name, id
+            """,
+            values={"names": names},
+        )
+        ids = {row["name"]: row["id"] for row in rows}
+        missing = [name for name in names if name not in ids]
+        if missing:
+            rows = await self.db.fetch_all(
+                """
+                INSERT INTO waypoints (name, geom)
+                SELECT name, CAST(ST_SetSRID(ST_MakePoint(lon, lat), 4326) AS geography)
+                FROM unnest(
+                    CAST(:names AS text[]),
+                    CAST(:lats AS double precision[]),
+                    CAST(:lons AS double precision[])
+                ) AS t(name, lat, lon)
+                RETURNING id, name
+                """,
+                values={
+                    "names": missing,
+                    "lats": [positions[name][0] for name in missing],
+                    "lons": [positions[name][1] for name in missing],
+                },
+            )
+            for row in rows:
+                ids[row["name"]] = row["id"]
+                self.waypoint_names.update(row["id"], row["name"])
+            self.route_graph.invalidate()
+        return ids
+
     async def get_most_used_route(
         self,
         departure,
@@ -38,139 +311,637 @@ class FlightService:
             aircraft_id,
             start_date,
             end_date,
+            by_day=True,
         )
 
         query = f"""
-            SELECT fpl, COUNT(*) as usage_count
-            FROM flights
+            SELECT MIN(fpl) AS fpl, SUM(flight_count) as usage_count
+            FROM route_usage
             WHERE {where}
-            GROUP BY fpl
+            GROUP BY fpl_signature
             ORDER BY usage_count DESC
             LIMIT 1;
         """
-        result = await self.db.fetch_one(query, values=values)
+        result = await self._fetch_route(query, values)
         if not result:
             raise HTTPException(404)
-        return {
-            **result,
-            "fpl": [wp.name for wp in await self.get_waypoints(result["fpl"])],
-        }
+        return result
 
     async def get_most_efficient(
         self,
         departure,
         arrival,
-        by_time=True,
+        by_time=False,
         by_fuel=False,
     ):
-        where, values = self._get_where(departure, arrival)
+        """Most fuel efficient route, or the fastest one with ``by_time``."""
+        if by_time and by_fuel:
+            raise HTTPException(
+                422, "Choose by_time or by_fuel; /flights/pareto ranks on both"
+            )
+        where, values = self._get_where(departure, arrival, by_day=True)
 
-        select_time = "RANK() OVER(ORDER BY AVG(EXTRACT(EPOCH FROM (flights.arrival_time - flights.departure_time)))) AS score"
-        select_fuel = "RANK() OVER(ORDER BY AVG(flights.fuel_consumption)) AS score"
+        select_time = "SUM(duration_sum) / SUM(flight_count) AS score"
+        select_fuel = "SUM(fuel_sum) / SUM(flight_count) AS score"
         query = f"""
-            SELECT fpl, {select_time if by_time else select_fuel}
-            FROM flights
+            SELECT MIN(fpl) AS fpl, {select_time if by_time else select_fuel}
+            FROM route_usage
             WHERE {where}
-            GROUP BY fpl
+            GROUP BY fpl_signature
             ORDER BY score ASC LIMIT 1
         """
-        result = await self.db.fetch_one(query, values=values)
+        result = await self._fetch_route(query, values)
         if not result:
             raise HTTPException(404)
+        return result
+
+    async def get_pareto_routes(
+        self,
+        departure: int,
+        arrival: int,
+        max_front: int = 16,
+        cpu_budget: float = 0.5,
+    ) -> dict:
+        """Routes between two waypoints that no other route beats on every cost.
+
+        ``history`` ranks the flown routes on average block time, fuel and
+        great-circle distance. ``graph`` is the time/distance front over
+        ``edges``, searched for at most ``cpu_budget`` seconds; its fuel is
+        the time at the pair's historical burn rate, when there is one.
+        """
+        where, values = self._get_where(departure, arrival, by_day=True)
+        rows = await self.db.fetch_all(
+            f"""
+            SELECT
+                MIN(fpl) AS fpl,
+                (SUM(duration_sum) / SUM(flight_count))::float8 AS time,
+                (SUM(fuel_sum) / SUM(flight_count))::float8 AS fuel,
+                -- SUM of a bigint is numeric, which asyncpg returns as Decimal
+                SUM(flight_count)::bigint AS flights
+            FROM route_usage
+            WHERE {where}
+            GROUP BY fpl_signature
+            """,
+            values=values,
+        )
+        graph = await self.route_graph.get(self.db)
+
+        distances = []
+        for row in rows:
+            path = [graph.index_of(waypoint_id) for waypoint_id in row["fpl"]]
+            known = None not in path
+            distances.append(graph.path_length_km(path) if known else math.nan)
+        costs = np.array([[r["time"], r["fuel"]] for r in rows]).reshape(-1, 2)
+        if not np.isnan(distances).any():
+            costs = np.column_stack((costs, distances))
+        history = []
+        for i in non_dominated(costs, max_front).tolist():
+            history.append(
+                {
+                    "fpl": await self.get_waypoint_names(rows[i]["fpl"]),
+                    "time": rows[i]["time"],
+                    "fuel": rows[i]["fuel"],
+                    "distance": None if math.isnan(distances[i]) else distances[i],
+                    "flights": rows[i]["flights"],
+                }
+            )
+
+        flown_time = sum(r["time"] * r["flights"] for r in rows)
+        flown_fuel = sum(r["fuel"] * r["flights"] for r in rows)
+        burn_rate = flown_fuel / flown_time if flown_time else None
+        source, target = graph.index_of(departure), graph.index_of(arrival)
+        paths = []
+        if source is not None and target is not None:
+            deadline = time.perf_counter() + cpu_budget
+            paths = await self._compute(
+                graph.pareto_paths, source, target, max_front, deadline
+            )
         return {
-            **result,
-            "fpl": [wp.name for wp in await self.get_waypoints(result["fpl"])],
+            "history": history,
+            "graph": [
+                {
+                    "fpl": graph.waypoint_names(path.path),
+                    "time": path.time,
+                    "fuel": path.time * burn_rate if burn_rate else None,
+                    "distance": path.distance,
+                }
+                for path in paths
+            ],
         }
 
-    async def get_alternatives(self, flight_id: int):
-        flight = await self.db.fetch_one(
+    async def get_most_used_routes(
+        self,
+        pairs: list[tuple[int, int]],
+        airline_id=None,
+        aircraft_id=None,
+        start_date=None,
+        end_date=None,
+    ) -> list[dict]:
+        """Most used route of many pairs with one grouped query.
+
+        Pairs without flights come back with ``fpl`` set to ``None``.
+        """
+        unique = list(dict.fromkeys(pairs))
+        where, values = self._get_filters(
+            "route_usage", airline_id, aircraft_id, start_date, end_date
+        )
+        values["departures"] = [departure for departure, _ in unique]
+        values["arrivals"] = [arrival for _, arrival in unique]
+        query = f"""
+            SELECT DISTINCT ON (pairs.departure, pairs.arrival)
+                pairs.departure,
+                pairs.arrival,
+                MIN(route_usage.fpl) AS fpl,
+                SUM(route_usage.flight_count) AS usage_count
+            FROM unnest(
+                CAST(:departures AS integer[]), CAST(:arrivals AS integer[])
+            ) AS pairs(departure, arrival)
+            JOIN route_usage
+                ON route_usage.departure = pairs.departure
+                AND route_usage.arrival = pairs.arrival
+            WHERE TRUE {where}
+            GROUP BY pairs.departure, pairs.arrival, route_usage.fpl_signature
+            ORDER BY pairs.departure, pairs.arrival, usage_count DESC
+        """
+        found = {
+            (row["departure"], row["arrival"]): row
+            for row in await self.db.fetch_all(query, values=values)
+        }
+        # warm the directory with every id at once, then resolve from memory
+        await self.get_waypoint_names(
+            {i for row in found.values() for i in row["fpl"]}
+        )
+
+        results = []
+        for departure, arrival in pairs:
+            row = found.get((departure, arrival))
+            results.append(
+                {
+                    "departure": departure,
+                    "arrival": arrival,
+                    "fpl": row and await self.get_waypoint_names(row["fpl"]),
+                    "usage_count": row["usage_count"] if row else 0,
+                }
+            )
+        return results
+
+    async def get_route_statistics(
+        self,
+        departure: int,
+        arrival: int,
+        start_date=None,
+        end_date=None,
+        limit: int = 10,
+    ) -> list[dict]:
+        """Fuel and block time percentiles of the most flown routes of a pair.
+
+        Merges the routes' daily sketches over whole days of the date range,
+        so the cost grows with the days covered, not the flights.
+        """
+        where, values = self._get_filters(
+            "route_sketches", start_date=start_date, end_date=end_date
+        )
+        values.update(departure=departure, arrival=arrival, limit=limit)
+        query = f"""
+            SELECT
+                MIN(fpl) AS fpl,
+                SUM(flight_count) AS flights,
+                array_agg(fuel) AS fuel,
+                array_agg(block_time) AS block_time
+            FROM route_sketches
+            WHERE route_sketches.departure = :departure
+                AND route_sketches.arrival = :arrival{where}
+            GROUP BY fpl_signature
+            ORDER BY flights DESC
+            LIMIT :limit
+        """
+        key = (" ".join(query.split()), tuple(sorted(values.items())))
+        result = await self.cache.get(key)
+        if result is not MISSING:
+            return result
+
+        rows = await self.db.fetch_all(query, values=values)
+        groups = [row["fuel"] for row in rows] + [row["block_time"] for row in rows]
+        percentiles = await self._compute(merged_percentiles, groups, PERCENTILES)
+        result = [
+            {
+                "fpl": await self.get_waypoint_names(row["fpl"]),
+                "flights": row["flights"],
+                "fuel": percentiles[i],
+                "block_time": percentiles[len(rows) + i],
+            }
+            for i, row in enumerate(rows)
+        ]
+        await self.cache.set(key, result, (departure, arrival))
+        return result
+
+    async def _fetch_route(self, query: str, values: dict):
+        """Run a route query through the result cache, resolving fpl names."""
+        key = (" ".join(query.split()), tuple(sorted(values.items())))
+        result = await self.cache.get(key)
+        if result is MISSING:
+            row = await self.db.fetch_one(query, values=values)
+            result = row and {
+                **row,
+                "fpl": await self.get_waypoint_names(row["fpl"]),
+            }
+            pair = (values["departure"], values["arrival"])
+            await self.cache.set(key, result, pair)
+        return result
+
+    async def _invalidate(self, pairs):
+        for pair in pairs:
+            await self.cache.invalidate(pair)
+
+    async def get_alternatives(
+        self, flight_id: int, k: int = 5, cpu_budget: float = 0.2
+    ):
+        """Routes that would have saved fuel/time compared to ``flight_id``.
+
+        Candidates are the other routes flown between the same pair, with
+        averaged deltas from ``route_usage``, plus up to ``k`` loopless
+        shortest paths over ``edges`` found within ``cpu_budget`` seconds.
+        Graph paths have no flown history, so their fuel and time are
+        estimated from this flight's per-km consumption.
+        """
+        row = await self.db.fetch_one(
             flights.select().where(flights.c.id == flight_id)
         )
-        if not flight:
+        if not row:
             return []
 
-        flight = Flight(**flight[0])
-        where, values = self._get_where(flight.departure, flight.arrival)
-        where = f"{where} AND flights.id != :flight_id"
+        flight = Flight(**row._mapping)
+        duration = (flight.arrival_time - flight.departure_time).total_seconds()
+        where, values = self._get_where(
+            flight.departure, flight.arrival, by_day=True
+        )
+        values["fpl"] = flight.fpl
+        values["current_fuel"] = flight.fuel_consumption
+        values["current_duration"] = duration
+        values["k"] = k
+        query = f"""
+            SELECT
+                MIN(fpl) AS fpl,
+                :current_fuel - SUM(fuel_sum) / SUM(flight_count) AS fuel_savings,
+                :current_duration - SUM(duration_sum) / SUM(flight_count)
+                    AS time_savings
+            FROM route_usage
+            WHERE {where}
+                AND fpl_signature != route_signature(CAST(:fpl AS integer[]))
+            GROUP BY fpl_signature
+            ORDER BY fuel_savings DESC, time_savings DESC
+            LIMIT :k
+        """
+        alternatives = {
+            tuple(r["fpl"]): (r["fuel_savings"], r["time_savings"])
+            for r in await self.db.fetch_all(query, values=values)
+        }
 
-        values["flight"] = flight_id
-        values["current_arrival"] = flight.arrival_time
-        values["current_fuel_consumption"] = flight.fuel_consumption
+        graph = await self.route_graph.get(self.db)
+        source = graph.index_of(flight.departure)
+        target = graph.index_of(flight.arrival)
+        filed = [graph.index_of(i) for i in flight.fpl]
+        if source is not None and target is not None and None not in filed:
+            filed_km = graph.path_length_km(filed)
+            deadline = time.perf_counter() + cpu_budget
+            paths = await self._compute(
+                graph.k_shortest_paths, source, target, k, deadline
+            )
+            for path in paths:
+                ids = tuple(graph.waypoint_ids(path.path))
+                if ids == tuple(flight.fpl) or ids in alternatives:
+                    continue
+                length_km = graph.path_length_km(path.path)
+                ratio = length_km / filed_km if filed_km else 1.0
+                if not math.isnan(ratio):  # a waypoint without position
+                    alternatives[ids] = (
+                        flight.fuel_consumption * (1 - ratio),
+                        duration * (1 - ratio),
+                    )
 
-        query = f"""
-        SELECT
-            edges.id, edges.path,
-            AVG(EXTRACT(EPOCH FROM(:current_arrival - flights.arrival_time))) AS time_savings,
-            AVG(:current_fuel_consumption - flights.fuel_consumption) AS fuel_savings
-        FROM
-            edges
-        JOIN
-            flights ON edges.source_id = flights.departure AND edges.target_id = flights.arrival
-        WHERE
-            {where}
-        GROUP BY
-            edges.id;
-        """
-        result = await self.db.fetch_all(query, values=values)
+        ranked = sorted(alternatives.items(), key=lambda i: i[1], reverse=True)
         return [
             {
-                "id": i.id,
-                "path": i.path,
-                "time_savings": str(timedelta(seconds=int(i.time_savings))),
-                "fuel_savings": int(i.fuel_savings),
+                "fpl": await self.get_waypoint_names(fpl),
+                "time_savings": str(timedelta(seconds=int(time_savings))),
+                "fuel_savings": int(fuel_savings),
             }
-            for i in result
+            for fpl, (fuel_savings, time_savings) in ranked[:k]
         ]
 
-    async def get_shortest_route(self, departure: Node, arrival: Node):
-        all_waypoints: list[Node] = await self.db.fetch_all(waypoints)
-
-        def calculate_distance(node1: Node, node2: Node) -> float:
-            return geopy.distance.distance(
-                (node1.lat, node1.lon), (node2.lat, node2.lon)
-            ).km
-
-        edges = []
-        for source, target in itertools.permutations(all_waypoints, 2):
-            cost = calculate_distance(source, target)
-            edges.append(Edge(source, target, cost))
-
-        def get_neighbors(node: Node):
-            neighbors = []
-            for edge in edges:
-                if edge.source == node:
-                    neighbors.append(edge)
-            return neighbors
-
-        # use Dijkstra's algorithm
-        distances = {departure.id: 0}
-        priority_queue = [(0, departure.id)]
-        previous_nodes = {}
-        visited = set()
-
-        while priority_queue:
-            current_distance, current_node = heapq.heappop(priority_queue)
-
-            if current_node == arrival.id:
-                path = []
-                while current_node in previous_nodes:
-                    path.insert(0, current_node)
-                    current_node = previous_nodes[current_node]
-                return [departure.id] + path
-
-            if current_node in visited:
-                continue
+    async def get_shortest_route(
+        self,
+        departure: int,
+        arrival: int,
+        algorithm: SearchAlgorithm = SearchAlgorithm.dijkstra,
+        metric: CostMetric = CostMetric.distance,
+    ):
+        graph = (await self.route_graph.get(self.db)).weighted(metric)
+        source, target = graph.index_of(departure), graph.index_of(arrival)
+        if source is None or target is None:
+            raise HTTPException(404)
+        if algorithm == SearchAlgorithm.ch:
+            # contracting takes far longer than a request may compute
+            if not self.route_graph.hierarchy_ready(graph, metric):
+                raise HTTPException(
+                    503, "Contraction hierarchy is being built", {"Retry-After": "5"}
+                )
 
-            visited.add(current_node)
-            for edge in get_neighbors(current_node):
-                neighbor = edge.target.id
-                distance = current_distance + edge.cost
-                if neighbor not in distances or distance < distances[neighbor]:
-                    distances[neighbor] = distance
-                    previous_nodes[neighbor] = current_node
-                    heapq.heappush(priority_queue, (distance, neighbor))
+        result = await self._compute(graph.search, source, target, algorithm)
+        if not result.path:
+            raise HTTPException(404)
+        return {
+            "fpl": graph.waypoint_names(result.path),
+            "cost": result.cost,
+            "algorithm": algorithm,
+            "metric": metric,
+            "expanded": result.expanded,
+        }
+
+    async def generate_edges(self, k: int = 8, radius_km: float = None) -> int:
+        """Replace ``edges`` with a sparse geodesic neighbour graph.
+
+        Each waypoint is linked to its ``k`` nearest neighbours, or to every
+        waypoint within ``radius_km`` when given; ``cost`` is the distance in km
+        and ``eet`` the flight time through the last applied wind snapshot.
+        """
+        graph = await self.route_graph.refresh(self.db)
+        located, index = graph.located_nodes, graph.spatial_index
+        if radius_km:
+            candidates = await self._compute(index.radius_edges, radius_km)
+        else:
+            candidates = await self._compute(index.knn_edges, k)
+
+        sources = located[candidates.sources]
+        targets = located[candidates.targets]
+        eets = await self._leg_times(graph, sources, targets)
+        sources, targets = graph.ids[sources].tolist(), graph.ids[targets].tolist()
+        values = {
+            "names": [f"{s}-{t}" for s, t in zip(sources, targets)],
+            "sources": sources,
+            "targets": targets,
+            "costs": candidates.costs.tolist(),
+            "eets": eets.tolist(),
+        }
+        async with self.db.transaction():
+            await self.db.execute("DELETE FROM edges")
+            await self.db.execute(
+                """
+                INSERT INTO edges (name, source, target, cost, eet)
+                SELECT * FROM unnest(
+                    CAST(:names AS text[]),
+                    CAST(:sources AS integer[]),
+                    CAST(:targets AS integer[]),
+                    CAST(:costs AS double precision[]),
+                    CAST(:eets AS double precision[])
+                )
+                """,
+                values=values,
+            )
+        await self.route_graph.refresh(self.db)
+        await self.waypoint_names.refresh(self.db)
+        return len(sources)
+
+    async def apply_wind(self, document: dict) -> dict:
+        """Recompute ``edges.eet`` for every edge through the winds of an OFP.
+
+        The costs of all edges are computed in one vectorized pass and written
+        back in a single statement, so time-weighted searches never recompute
+        them per query. The winds are stored too, for edges generated later.
+        Other workers time their searches with the new ``eet`` once they
+        reload the graph, at once when they share ``ROUTE_GRAPH_SNAPSHOT``.
+        """
+        try:
+            report = wind_report(document)
+            snapshot = wind_from_ofp(report)
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(422, f"Invalid OFP: {e!r}")
+        graph = await self.route_graph.refresh(self.db)
+        sources = np.repeat(np.arange(graph.node_count), np.diff(graph.indptr))
+        targets = graph.indices
+        eets = await self._leg_times(graph, sources, targets, snapshot)
+        async with self.db.transaction():
+            await self.db.execute(wind_snapshots.insert().values(report=report))
+            await self.db.execute(
+                """
+                UPDATE edges SET eet = wind.eet
+                FROM unnest(
+                    CAST(:sources AS integer[]),
+                    CAST(:targets AS integer[]),
+                    CAST(:eets AS double precision[])
+                ) AS wind (source, target, eet)
+                WHERE edges.source = wind.source AND edges.target = wind.target
+                """,
+                values={
+                    "sources": graph.ids[sources].tolist(),
+                    "targets": graph.ids[targets].tolist(),
+                    "eets": eets.tolist(),
+                },
+            )
+        await self.route_graph.refresh(self.db)
+        return {
+            "edges": len(eets),
+            "observations": len(snapshot.wind),
+            "true_airspeed": snapshot.true_airspeed,
+        }
+
+    async def _leg_times(
+        self,
+        graph,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        snapshot: Optional[WindSnapshot] = None,
+    ):
+        """Flight times of legs through ``snapshot``, by default the winds
+        applied last by any worker."""
+        if snapshot is None:
+            report = await self.db.fetch_val(
+                "SELECT report FROM wind_snapshots ORDER BY id DESC LIMIT 1"
+            )
+            if report is None:
+                snapshot = WindSnapshot(None)
+            else:
+                if isinstance(report, str):
+                    report = json.loads(report)
+                snapshot = wind_from_ofp(report)
+        return await self._compute(
+            leg_times,
+            graph.lat[sources],
+            graph.lon[sources],
+            graph.lat[targets],
+            graph.lon[targets],
+            snapshot.true_airspeed,
+            snapshot.wind,
+        )
+
+    async def store_trajectory(
+        self, flight_id: int, stream: AsyncIterator[bytes], radius_km: float = 5.0
+    ) -> dict:
+        """Store the LATITUDE/LONGITUDE/ALTITUDE arrays of a JSON document.
+
+        The track is map-matched onto the waypoint graph and the overflown
+        waypoints are saved as the flight's ``flown_fpl``.
+        """
+        flight = await self.db.fetch_one(
+            "SELECT departure, arrival FROM flights WHERE id = :flight_id",
+            values={"flight_id": flight_id},
+        )
+        if not flight:
+            raise HTTPException(404)
+        try:
+            arrays = await read_track_arrays(stream)
+        except ValueError as e:
+            raise HTTPException(422, f"Malformed trajectory: {e}")
+        if "latitude" not in arrays or "longitude" not in arrays:
+            raise HTTPException(422, "LATITUDE and LONGITUDE arrays are required")
+        points = len(arrays["latitude"])
+        if any(len(values) != points for values in arrays.values()):
+            raise HTTPException(422, "Trajectory arrays differ in length")
+
+        flown = await self._flown_route(
+            flight, arrays["latitude"], arrays["longitude"], radius_km
+        )
+        values = {column: None for column in ("altitude", "time")}
+        values.update({column: pack(v) for column, v in arrays.items()})
+        values.update(flight_id=flight_id, point_count=points)
+        async with self.db.transaction():
+            await self.db.execute(
+                """
+                INSERT INTO trajectories
+                    (flight_id, point_count, latitude, longitude, altitude, time)
+                VALUES
+                    (:flight_id, :point_count, :latitude, :longitude, :altitude, :time)
+                ON CONFLICT (flight_id) DO UPDATE SET
+                    point_count = EXCLUDED.point_count,
+                    latitude = EXCLUDED.latitude,
+                    longitude = EXCLUDED.longitude,
+                    altitude = EXCLUDED.altitude,
+                    time = EXCLUDED.time
+                """,
+                values=values,
+            )
+            await self.db.execute(
+                "UPDATE flights SET flown_fpl = :flown WHERE id = :flight_id",
+                values={"flown": flown, "flight_id": flight_id},
+            )
+        await self.cache.invalidate(("trajectory", flight_id))
+        return {
+            "flight_id": flight_id,
+            "points": points,
+            "flown_fpl": await self.get_waypoint_names(flown),
+        }
+
+    async def match_stored_trajectory(
+        self, flight_id: int, radius_km: float = 5.0
+    ) -> list[str]:
+        """Map-match the stored trajectory again, e.g. after waypoints changed."""
+        row = await self.db.fetch_one(
+            """
+            SELECT flights.departure, flights.arrival, latitude, longitude
+            FROM trajectories JOIN flights ON flights.id = trajectories.flight_id
+            WHERE trajectories.flight_id = :flight_id
+            """,
+            values={"flight_id": flight_id},
+        )
+        if not row:
+            raise HTTPException(404)
+        trajectory = Trajectory.from_row({**row, "altitude": None, "time": None})
+        flown = await self._flown_route(
+            row, trajectory.latitude, trajectory.longitude, radius_km
+        )
+        await self.db.execute(
+            "UPDATE flights SET flown_fpl = :flown WHERE id = :flight_id",
+            values={"flown": flown, "flight_id": flight_id},
+        )
+        return await self.get_waypoint_names(flown)
+
+    async def _flown_route(self, flight, lat, lon, radius_km: float) -> list[int]:
+        """Waypoint ids a track overflew, from the flight's departure to arrival."""
+        graph = await self.route_graph.get(self.db)
+        matched = await self._compute(match_track, graph, lat, lon, radius_km)
+        flown = graph.waypoint_ids(matched)
+        if not flown or flown[0] != flight["departure"]:
+            flown.insert(0, flight["departure"])
+        if flown[-1] != flight["arrival"]:
+            flown.append(flight["arrival"])
+        return flown
+
+    async def get_trajectory(
+        self,
+        flight_id: int,
+        start: int = None,
+        stop: int = None,
+        start_time: datetime = None,
+        end_time: datetime = None,
+        tolerance: float = None,
+        method: SimplifyMethod = SimplifyMethod.douglas_peucker,
+        points: int = None,
+    ) -> Trajectory:
+        """Stored track, sliced by point index and/or by time.
+
+        With ``tolerance`` (metres) the slice is simplified, and with
+        ``points`` thinned to at most that many evenly spaced points. Reduced
+        tracks are cached per flight until the trajectory is stored again.
+        """
+        # naive UTC, like the stored departure_time, and one cache key per instant
+        start_time, end_time = _to_copy(start_time), _to_copy(end_time)
+        reduced = tolerance is not None or points is not None
+        if reduced:
+            key = ("trajectory", flight_id, start, stop, start_time, end_time)
+            key += (tolerance, method, points)
+            trajectory = await self.cache.get(key)
+            if trajectory is not MISSING:
+                return trajectory
+
+        row = await self.db.fetch_one(
+            """
+            SELECT trajectories.*, flights.departure_time, flights.arrival_time
+            FROM trajectories JOIN flights ON flights.id = trajectories.flight_id
+            WHERE trajectories.flight_id = :flight_id
+            """,
+            values={"flight_id": flight_id},
+        )
+        if not row:
+            raise HTTPException(404)
+        trajectory = Trajectory.from_row(row)
+        if start_time or end_time:
+            departure = row["departure_time"]
+            trajectory = trajectory.time_slice(
+                seconds_since(departure, start_time),
+                seconds_since(departure, end_time),
+                (row["arrival_time"] - departure).total_seconds(),
+            )
+        trajectory = trajectory[start:stop]
+        if not reduced:
+            return trajectory
+
+        kept = np.arange(len(trajectory))
+        if tolerance is not None:
+            kept = await self._compute(
+                simplify, trajectory.latitude, trajectory.longitude, tolerance, method
+            )
+        if points is not None:
+            kept = kept[downsample(len(kept), points)]
+        # a copy of just the kept points, not a view pinning the whole track
+        trajectory = trajectory[kept]
+        await self.cache.set(key, trajectory, ("trajectory", flight_id))
+        return trajectory
 
-        return []
+    async def _compute(self, fn: Callable, *args, process: bool = False):
+        """Run ``fn`` on the executor, off the event loop.
+
+        ``process`` picks the process pool, for pure-Python work on picklable
+        arguments; the default thread pool suits NumPy and the route graph.
+        """
+        run = self.executor.run_process if process else self.executor.run
+        try:
+            return await run(fn, *args)
+        except ExecutorSaturated:
+            raise HTTPException(
+                429, "Too many computations in progress", {"Retry-After": "1"}
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Computation timed out")
 
     def _get_where(
         self,
@@ -180,28 +951,203 @@ class FlightService:
         aircraft_id=None,
         start_date=None,
         end_date=None,
+        by_day=False,
     ):
-        values = {
-            "departure": departure,
-            "arrival": arrival,
-        }
-        where = "flights.departure = :departure \
-            AND flights.arrival = :arrival"
+        """Filter ``flights``, or ``route_usage`` day buckets when ``by_day``.
+
+        Day buckets resolve the date range to whole days.
+        """
+        table = "route_usage" if by_day else "flights"
+        where, values = self._get_filters(
+            table, airline_id, aircraft_id, start_date, end_date
+        )
+        values["departure"] = departure
+        values["arrival"] = arrival
+        where = f"{table}.departure = :departure \
+            AND {table}.arrival = :arrival{where}"
+        return where, values
+
+    def _get_filters(
+        self,
+        table,
+        airline_id=None,
+        aircraft_id=None,
+        start_date=None,
+        end_date=None,
+    ):
+        """Optional filters shared by every pair, as `` AND ...`` conditions.
+
+        Tables other than ``flights`` hold day buckets, filtered on ``day``.
+        """
+        by_day = table != "flights"
+        values = {}
+        where = ""
         if airline_id:
             values["airline_id"] = airline_id
-            where += " AND flights.airline_id = :airline_id "
+            where += f" AND {table}.airline_id = :airline_id "
         if aircraft_id:
             values["aircraft_id"] = aircraft_id
-            where += " AND flights.aircraft_id = :aircraft_id "
+            where += f" AND {table}.aircraft_id = :aircraft_id "
         if start_date:
-            values["start_date"] = start_date
-            where += " AND flights.departure_time >= :start_date "
+            # buckets are keyed by UTC day, like the naive UTC departure_time
+            start_date = _to_copy(start_date)
+            if by_day:
+                values["start_date"] = start_date.date()
+                where += f" AND {table}.day >= :start_date "
+            else:
+                values["start_date"] = start_date
+                where += " AND flights.departure_time >= :start_date "
         if end_date:
-            values["end_date"] = end_date
-            where += " AND flights.departure_time <= :end_date "
+            end_date = _to_copy(end_date)
+            if by_day:
+                values["end_date"] = end_date.date()
+                where += f" AND {table}.day <= :end_date "
+            else:
+                values["end_date"] = end_date
+                where += " AND flights.departure_time <= :end_date "
         return where, values
 
-    async def get_waypoints(self, fpl: list[int]):
-        query = waypoints.select().where(waypoints.c.id.in_(fpl))
-        wps = {wp.id: wp for wp in await self.db.fetch_all(query)}
-        return [wps[i] for i in fpl]
+    async def _add_route_usage(self, rows: list[dict]) -> set[tuple[int, int]]:
+        """Fold inserted flights into their ``route_usage`` day buckets.
+
+        Returns the departure/arrival pairs that were touched.
+        """
+        buckets = {}
+        for row in rows:
+            key = (
+                row["departure"],
+                row["arrival"],
+                row["airline_id"],
+                row["aircraft_id"],
+                # the UTC day, whether the row came in singly or through COPY
+                _to_copy(row["departure_time"]).date(),
+                tuple(row["fpl"]),
+            )
+            bucket = buckets.setdefault(key, [0, 0.0, 0.0])
+            bucket[0] += 1
+            bucket[1] += row["fuel_consumption"] or 0.0
+            bucket[2] += (row["arrival_time"] - row["departure_time"]).total_seconds()
+        if not buckets:
+            return set()
+
+        keys, totals = list(buckets), list(buckets.values())
+        values = {
+            "departures": [k[0] for k in keys],
+            "arrivals": [k[1] for k in keys],
+            "airline_ids": [k[2] for k in keys],
+            "aircraft_ids": [k[3] for k in keys],
+            "days": [k[4] for k in keys],
+            "fpls": ["{%s}" % ",".join(map(str, k[5])) for k in keys],
+            "counts": [t[0] for t in totals],
+            "fuel": [t[1] for t in totals],
+            "durations": [t[2] for t in totals],
+        }
+        await self.db.execute(UPSERT_ROUTE_USAGE, values=values)
+        return {(k[0], k[1]) for k in keys}
+
+    async def _add_route_sketches(self, rows: list[dict]):
+        """Fold inserted flights' fuel and block time into their day sketches.
+
+        The sketches are locked, read, merged off the event loop and written
+        back within the caller's transaction; keys are locked in sorted order
+        so concurrent loads touching the same days cannot deadlock.
+        """
+        buckets = {}
+        for row in rows:
+            key = (
+                row["departure"],
+                row["arrival"],
+                _to_copy(row["departure_time"]).date(),  # as in route_usage
+                tuple(row["fpl"]),
+            )
+            fuel, block_times = buckets.setdefault(key, ([], []))
+            fuel.append(row["fuel_consumption"])
+            block_times.append(
+                (row["arrival_time"] - row["departure_time"]).total_seconds()
+            )
+        if not buckets:
+            return
+
+        keys = sorted(buckets)
+        values = {
+            "departures": [k[0] for k in keys],
+            "arrivals": [k[1] for k in keys],
+            "days": [k[2] for k in keys],
+            "fpls": ["{%s}" % ",".join(map(str, k[3])) for k in keys],
+        }
+        locked = await self.db.fetch_all(
+            LOCK_ROUTE_SKETCHES,
+            values={**values, "counts": [len(buckets[k][0]) for k in keys]},
+        )
+        current = {
+            (r["departure"], r["arrival"], r["day"], tuple(r["fpl"])): r
+            for r in locked
+        }
+        folded = await self._compute(
+            fold_sketches,
+            [current[k]["fuel"] for k in keys]
+            + [current[k]["block_time"] for k in keys],
+            [buckets[k][0] for k in keys] + [buckets[k][1] for k in keys],
+        )
+        values["fuel"] = folded[: len(keys)]
+        values["block_times"] = folded[len(keys) :]
+        await self.db.execute(UPDATE_ROUTE_SKETCHES, values=values)
+
+    async def get_waypoint_names(self, fpl: list[int]) -> list[str]:
+        return await self.waypoint_names.resolve(self.db, fpl)
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a chunked byte stream into lines without buffering all of it."""
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def parse_flight(line: bytes) -> dict:
+    return FlightCreate.model_validate_json(line).model_dump()
+
+
+def parse_ofp_line(
+    line: bytes,
+    airline_id: int = None,
+    aircraft_id: int = None,
+    departure_time: datetime = None,
+):
+    document = json.loads(line)
+    ofp = parse_ofp(document)
+    airline = document.get("airlineId", airline_id)
+    aircraft = document.get("aircraftId", aircraft_id)
+    departure = document.get("departureTime", departure_time)
+    if airline is None or aircraft is None or departure is None:
+        raise ValueError("airline_id, aircraft_id and departure_time required")
+    if isinstance(departure, str):
+        departure = datetime.fromisoformat(departure)
+    return ofp, airline, aircraft, departure
+
+
+def parse_lines(
+    parse: Callable[[bytes], Any], lines: list[tuple[int, bytes]]
+) -> tuple[list, list[tuple[int, str]]]:
+    """Parsed items, and ``(line number, error)`` for the lines rejected."""
+    items, rejected = [], []
+    for line_no, line in lines:
+        try:
+            items.append(parse(line))
+        except ValidationError as e:
+            rejected.append((line_no, str(e.errors(include_url=False))))
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            rejected.append((line_no, f"{type(e).__name__}: {e}"))
+    return items, rejected
+
+
+def _to_copy(value):
+    # flights.departure_time/arrival_time are timestamp without time zone
+    if isinstance(value, datetime) and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
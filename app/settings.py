@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,6 +11,54 @@ class Settings(BaseSettings):
     DB_USER: str = "flightsuser"
     DB_PASSWORD: str = "flightsuser"
 
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_ACQUIRE_TIMEOUT: float = 5.0  # seconds
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    RESULT_CACHE_SIZE: int = 10_000  # entries per worker
+    RESULT_CACHE_TTL: float = 60.0  # seconds
+    # redis://..., shared by all workers. Without it every worker has its own
+    # cache, and a write invalidates only the writing worker's entries; the
+    # others may serve stale results for up to RESULT_CACHE_TTL.
+    RESULT_CACHE_URL: Optional[str] = None
+
+    BULK_CHUNK_SIZE: int = 5000  # rows per COPY
+    OFP_CHUNK_SIZE: int = 500  # documents per waypoint upsert and COPY
+
+    FLIGHTS_PARTITIONS_AHEAD: int = 3  # monthly partitions created in advance
+    FLIGHTS_RETENTION_MONTHS: int = 0  # retire older months at startup; 0 keeps all
+    FLIGHTS_ARCHIVE_SCHEMA: Optional[str] = "archive"  # empty drops retired months
+    PARTITION_ADMIN_ENABLED: bool = False  # serve POST /admin/partitions/retire
+
+    ALTERNATIVES_CPU_BUDGET: float = 0.2  # seconds of path search per request
+    PARETO_CPU_BUDGET: float = 0.5
+    PARETO_MAX_FRONT: int = 16  # routes per front, and labels per waypoint
+
+    ROUTE_GRAPH_CONTRACT: bool = False  # build contraction hierarchy on load
+    ROUTE_GRAPH_VERIFY_SAMPLES: int = 100
+    ROUTE_GRAPH_SNAPSHOT: Optional[str] = None  # file all workers map
+    ROUTE_GRAPH_SNAPSHOT_MAX_AGE: float = 300.0  # seconds before a rebuild
+
+    EXECUTOR_PROCESSES: int = 2  # per worker; 0 runs everything on threads
+    EXECUTOR_THREADS: int = 4
+    EXECUTOR_MAX_PENDING: int = 64  # queued or running tasks before 429s
+    EXECUTOR_TIMEOUT: float = 30.0  # seconds per task
+
+    JOB_WORKERS: int = 2  # jobs run concurrently per worker process
+    JOB_RESULT_TTL: float = 86400.0  # seconds a finished job is kept
+    JOB_POLL_INTERVAL: float = 5.0  # seconds between checks for new jobs
+    JOB_LEASE: float = 60.0  # seconds without a heartbeat before a job is retried
+    JOB_PURGE_INTERVAL: float = 300.0  # seconds between deletes of expired jobs
+
+    METRICS_ENABLED: bool = True  # record latencies and serve /metrics
+    SLOW_QUERY_THRESHOLD: float = 0.25  # seconds; 0 turns the slow log off
+    SLOW_QUERY_EXPLAIN_RATE: float = 0.1  # of slow SELECTs re-run under EXPLAIN
+    SLOW_QUERY_EXPLAIN_ANALYZE: bool = False  # run them again for actual timings
+    SLOW_QUERY_LOG_SIZE: int = 100  # query shapes kept per worker
+
+    TRACK_MATCH_RADIUS_KM: float = 5.0  # track must pass this close to a fix
+
     @property
     def db_url(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}/{self.DB_NAME}"
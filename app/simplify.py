@@ -0,0 +1,134 @@
+"""Line simplification of trajectories; all functions return kept indices."""
+import heapq
+from enum import Enum
+
+import numpy as np
+
+from .geodesy import EARTH_RADIUS_KM, to_unit_vectors
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+
+
+class SimplifyMethod(str, Enum):
+    douglas_peucker = "douglas_peucker"
+    visvalingam = "visvalingam"
+
+
+def simplify(lat, lon, tolerance: float, method=SimplifyMethod.douglas_peucker):
+    if method == SimplifyMethod.visvalingam:
+        return visvalingam(lat, lon, tolerance)
+    return douglas_peucker(lat, lon, tolerance)
+
+
+def douglas_peucker(lat, lon, tolerance: float) -> np.ndarray:
+    """Keep points further than ``tolerance`` metres from the simplified line.
+
+    Distances are great-circle distances to the segment a point falls in.
+    Rather than recursing segment by segment, every open segment is split in
+    the same pass, so the loop runs once per level of the recursion tree.
+    """
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    points = to_unit_vectors(np.asarray(lat, np.float64), np.asarray(lon, np.float64))
+    max_angle = tolerance / EARTH_RADIUS_M
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    pending = ~keep  # interior points of segments not yet within tolerance
+    while pending.any():
+        index = np.flatnonzero(pending)
+        kept = np.flatnonzero(keep)
+        segment = np.searchsorted(kept, index) - 1
+        angles = _segment_distance(
+            points[index], points[kept[segment]], points[kept[segment + 1]]
+        )
+        # farthest point of each segment: first after sorting by (segment, -angle)
+        order = np.lexsort((-angles, segment))
+        first = np.flatnonzero(np.r_[True, np.diff(segment[order]) != 0])
+        farthest = order[first]
+        split = angles[farthest] > max_angle
+        keep[index[farthest[split]]] = True
+        done = ~split[np.searchsorted(segment[farthest], segment)]
+        pending[index[done]] = False
+        pending[index[farthest[split]]] = False
+    return np.flatnonzero(keep)
+
+
+def visvalingam(lat, lon, tolerance: float) -> np.ndarray:
+    """Drop points whose effective triangle is smaller than ``tolerance`` squared.
+
+    Areas are measured in square metres on an equirectangular projection
+    around the track's mean latitude.
+    """
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    lat = np.radians(np.asarray(lat, np.float64))
+    lon = np.radians(np.asarray(lon, np.float64))
+    x = (EARTH_RADIUS_M * np.cos(lat.mean()) * lon).tolist()
+    y = (EARTH_RADIUS_M * lat).tolist()
+    threshold = tolerance**2
+
+    def area(a, b, c):
+        return abs((x[b] - x[a]) * (y[c] - y[a]) - (x[c] - x[a]) * (y[b] - y[a])) / 2
+
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+    areas = [float("inf")] * n
+    for i in range(1, n - 1):
+        areas[i] = area(i - 1, i, i + 1)
+    queue = [(areas[i], i) for i in range(1, n - 1)]
+    heapq.heapify(queue)
+    removed = [False] * n
+
+    while queue:
+        current, i = heapq.heappop(queue)
+        if removed[i] or current != areas[i]:
+            continue
+        if current >= threshold:
+            break
+        removed[i] = True
+        before, after = previous[i], following[i]
+        following[before], previous[after] = after, before
+        for j in (before, after):
+            if 0 < j < n - 1:
+                # never let a neighbour drop below the area just removed
+                areas[j] = max(area(previous[j], j, following[j]), current)
+                heapq.heappush(queue, (areas[j], j))
+    return np.flatnonzero(~np.array(removed))
+
+
+def downsample(n: int, count: int) -> np.ndarray:
+    """``count`` evenly spaced indices of ``n`` points, ends included."""
+    if n <= count:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, count).round().astype(np.int64))
+
+
+def _segment_distance(points, start, end) -> np.ndarray:
+    """Angular distance of each unit vector to its great-circle arc ``start-end``.
+
+    All three arguments are ``(n, 3)`` arrays, one segment per point.
+    """
+    normal = np.cross(start, end)
+    length = np.linalg.norm(normal, axis=1)
+    degenerate = length < 1e-15
+    normal /= np.where(degenerate, 1.0, length)[:, None]
+    offset = _dot(points, normal)
+    cross_track = np.abs(np.arcsin(np.clip(offset, -1.0, 1.0)))
+    # the perpendicular foot lies on the arc only between start and end
+    projected = points - offset[:, None] * normal
+    inside = (_dot(np.cross(start, projected), normal) >= 0) & (
+        _dot(np.cross(projected, end), normal) >= 0
+    )
+    endpoint = np.minimum(_angle(points, start), _angle(points, end))
+    return np.where(inside & ~degenerate, cross_track, endpoint)
+
+
+def _dot(a, b) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _angle(points, target) -> np.ndarray:
+    chord = np.linalg.norm(points - target, axis=1)
+    return 2 * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
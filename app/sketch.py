@@ -0,0 +1,150 @@
+"""Mergeable quantile sketches (t-digest) for per-route statistics."""
+import math
+from typing import Iterable, Optional
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 200.0
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+class TDigest:
+    """A merging t-digest over float values.
+
+    Values are summarized by weighted centroids, small near the tails and
+    large in the middle, so extreme quantiles such as p99 stay accurate while
+    a digest holds about ``compression / 2`` centroids however many values
+    went in. Digests of disjoint data merge into the digest of their union,
+    which is what lets per-day digests be combined over any date range.
+    The exact minimum and maximum are kept as well.
+    """
+
+    def __init__(
+        self,
+        means=(),
+        weights=(),
+        minimum: float = math.inf,
+        maximum: float = -math.inf,
+        compression: float = DEFAULT_COMPRESSION,
+    ):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.compression = compression
+
+    @classmethod
+    def of(cls, values, compression: float = DEFAULT_COMPRESSION) -> "TDigest":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return cls(compression=compression)
+        means, weights = _compress(values, np.ones(len(values)), compression)
+        return cls(means, weights, values.min(), values.max(), compression)
+
+    @classmethod
+    def merged(
+        cls, digests: Iterable["TDigest"], compression: float = DEFAULT_COMPRESSION
+    ) -> "TDigest":
+        digests = [d for d in digests if d.count]
+        if not digests:
+            return cls(compression=compression)
+        means, weights = _compress(
+            np.concatenate([d.means for d in digests]),
+            np.concatenate([d.weights for d in digests]),
+            compression,
+        )
+        return cls(
+            means,
+            weights,
+            min(d.minimum for d in digests),
+            max(d.maximum for d in digests),
+            compression,
+        )
+
+    @property
+    def count(self) -> int:
+        return int(round(self.weights.sum()))
+
+    def __len__(self):
+        return len(self.means)
+
+    def quantile(self, q):
+        """Estimated value at quantile ``q`` (0..1); ``q`` may be an array."""
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        result = np.interp(
+            np.asarray(q, dtype=np.float64) * total,
+            np.r_[0.0, centers, total],
+            np.r_[self.minimum, self.means, self.maximum],
+        )
+        return result if np.ndim(q) else float(result)
+
+    def to_bytes(self) -> bytes:
+        """Little-endian float64s: minimum, maximum, means, then weights."""
+        if not self.count:
+            return b""
+        data = np.r_[self.minimum, self.maximum, self.means, self.weights]
+        return data.astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(
+        cls, data: bytes, compression: float = DEFAULT_COMPRESSION
+    ) -> "TDigest":
+        if not data:
+            return cls(compression=compression)
+        values = np.frombuffer(data, dtype="<f8")
+        size = (len(values) - 2) // 2
+        return cls(
+            values[2 : 2 + size],
+            values[2 + size :],
+            float(values[0]),
+            float(values[1]),
+            compression,
+        )
+
+
+def _compress(means: np.ndarray, weights: np.ndarray, compression: float):
+    """Merge sorted neighbours whose quantiles fall in the same unit of the
+    arcsine scale function, which bounds centroid sizes by their quantile."""
+    order = np.argsort(means, kind="stable")
+    means, weights = means[order], weights[order]
+    total = weights.sum()
+    q = (np.cumsum(weights) - weights / 2) / total
+    k = compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+    group = np.floor(k)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+
+def fold_sketches(sketches: list[bytes], values: list) -> list[bytes]:
+    """Each serialized sketch with the matching list of new values added."""
+    return [
+        TDigest.merged([TDigest.from_bytes(sketch), TDigest.of(new)]).to_bytes()
+        for sketch, new in zip(sketches, values)
+    ]
+
+
+def merged_percentiles(
+    groups: list[list[bytes]], quantiles: dict[str, float]
+) -> list[dict[str, Optional[float]]]:
+    """Named quantiles of each group of serialized sketches, merged.
+
+    Quantiles of a group without values are ``None``.
+    """
+    results = []
+    for sketches in groups:
+        digest = TDigest.merged(TDigest.from_bytes(s) for s in sketches)
+        estimates = digest.quantile(list(quantiles.values())).tolist()
+        results.append(
+            {
+                name: None if math.isnan(value) else value
+                for name, value in zip(quantiles, estimates)
+            }
+        )
+    return results
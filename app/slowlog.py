@@ -0,0 +1,165 @@
+"""Slow queries, grouped by shape, with sampled ``EXPLAIN`` plans."""
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from databases import Database
+
+logger = logging.getLogger(__name__)
+
+MAX_LISTED_VALUES = 10  # array binds are cut to this many items
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    shape: str
+    caller: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+    last_values: dict = field(default_factory=dict)
+    last_seen: Optional[datetime] = None
+    plan: Optional[str] = None
+    plan_values: Optional[dict] = None
+    plan_captured: Optional[datetime] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class SlowQueryLog:
+    """Per-process record of queries slower than ``threshold`` seconds.
+
+    Queries are grouped by their normalized text, which for the
+    filter-dependent SQL built in ``FlightService`` is one entry per
+    combination of filters; at most ``size`` shapes are kept, least recently
+    slow first out. A ``explain_rate`` fraction of slow read-only SQL text
+    queries is explained in the background, one at a time, on a connection
+    of its own. With ``analyze`` they are run again under
+    ``EXPLAIN (ANALYZE, BUFFERS)``, which doubles their cost.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.25,
+        explain_rate: float = 0.1,
+        size: int = 100,
+        analyze: bool = False,
+    ):
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.size = size
+        self.analyze = analyze
+        self.database: Optional[Database] = None  # set in lifespan for EXPLAIN
+        self._queries: OrderedDict[str, SlowQuery] = OrderedDict()
+        self._explaining: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._queries)
+
+    def record(self, query, values: Optional[dict], seconds: float, caller: str):
+        if seconds < self.threshold:
+            return
+        shape = normalize(query)
+        fingerprint = hashlib.sha1(shape.encode()).hexdigest()[:12]
+        summary = summarize(values)
+        logger.warning(
+            "Slow query %s in %s took %.3fs: %s %s",
+            fingerprint,
+            caller,
+            seconds,
+            shape,
+            summary,
+        )
+        entry = self._queries.get(fingerprint)
+        if entry is None:
+            entry = self._queries[fingerprint] = SlowQuery(fingerprint, shape, caller)
+            while len(self._queries) > self.size:
+                self._queries.popitem(last=False)
+        self._queries.move_to_end(fingerprint)
+        entry.count += 1
+        entry.total_seconds += seconds
+        entry.max_seconds = max(entry.max_seconds, seconds)
+        entry.last_seconds = seconds
+        entry.last_values = summary
+        entry.last_seen = datetime.now(timezone.utc)
+
+        if (
+            self.database is not None
+            and self._explaining is None
+            # SQLAlchemy statements keep their binds in the statement, not values
+            and isinstance(query, str)
+            and is_read_only(shape)
+            and random.random() < self.explain_rate
+        ):
+            self._explaining = asyncio.create_task(
+                self._explain(entry, query, values, summary)
+            )
+
+    def entries(self) -> list[SlowQuery]:
+        """Slow query shapes, the most total time first."""
+        return sorted(
+            self._queries.values(), key=lambda q: q.total_seconds, reverse=True
+        )
+
+    def clear(self):
+        self._queries.clear()
+
+    async def _explain(self, entry: SlowQuery, query: str, values, summary: dict):
+        try:
+            explain = "EXPLAIN (ANALYZE, BUFFERS)" if self.analyze else "EXPLAIN"
+            async with self.database.connection() as db:
+                started = time.perf_counter()
+                rows = await db.fetch_all(f"{explain} {query}", values=values)
+            entry.plan = "\n".join(row["QUERY PLAN"] for row in rows)
+            entry.plan_values = summary
+            entry.plan_captured = datetime.now(timezone.utc)
+            logger.info(
+                "Plan of slow query %s (%.3fs):\n%s",
+                entry.fingerprint,
+                time.perf_counter() - started,
+                entry.plan,
+            )
+        except Exception:
+            logger.exception("Could not explain slow query %s", entry.fingerprint)
+        finally:
+            self._explaining = None
+
+
+def normalize(query) -> str:
+    """One line per statement shape: whitespace collapsed, no trailing ``;``."""
+    return " ".join(str(query).split()).rstrip(";").rstrip()
+
+
+def is_read_only(shape: str) -> bool:
+    """Only plain SELECTs are explained; EXPLAIN ANALYZE executes its statement."""
+    return shape[:7].upper() == "SELECT " and " FOR UPDATE" not in shape.upper()
+
+
+def summarize(values: Optional[dict]) -> dict:
+    """Bind values as logged: long arrays are cut to their first items, and
+    binary values, such as packed tracks and sketches, replaced by their size.
+    """
+    summary = {}
+    for name, value in (values or {}).items():
+        if isinstance(value, (list, tuple)):
+            count = len(value)
+            value = [_placeholder(item) for item in value[:MAX_LISTED_VALUES]]
+            if count > MAX_LISTED_VALUES:
+                value.append(f"... {count} items")
+        summary[name] = _placeholder(value)
+    return summary
+
+
+def _placeholder(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes len={memoryview(value).nbytes}>"
+    return value
@@ -0,0 +1,193 @@
+"""Memory-mapped route graph snapshots shared by all worker processes.
+
+A snapshot is a header followed by the graph's flat arrays, each 8-byte
+aligned, and the waypoint names as one UTF-8 blob::
+
+    header          magic, format version, CRC32 of the body, counts, built_at
+    ids             int64[nodes]
+    lat, lon        float64[nodes]
+    indptr          int64[nodes + 1]
+    indices         int32[edges]
+    costs, times    float64[edges]
+    name_offsets    int64[nodes + 1]
+    named           uint8[nodes]    0 where the waypoint has no name
+    names           bytes
+
+Workers map the file read-only, so loading costs one ``mmap`` and the pages
+are shared through the OS page cache. Writers build a new file next to the
+old one and ``os.replace`` it, so readers see either snapshot, never half of
+one, and mappings of the old file stay valid until they are dropped.
+"""
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+from collections.abc import Sequence
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+MAGIC = b"RGSN"
+FORMAT_VERSION = 1
+# magic, version, crc32, nodes, edges, names size, built_at
+HEADER = struct.Struct("<4sIIqqqd")
+HEADER_SIZE = 64
+
+
+class SnapshotError(ValueError):
+    """The file is not a snapshot this version can read, or is corrupt."""
+
+
+class SnapshotHeader(NamedTuple):
+    checksum: int
+    node_count: int
+    edge_count: int
+    names_size: int
+    built_at: float  # unix time
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.built_at
+
+
+class NameTable(Sequence):
+    """Waypoint names decoded on access from the mapped blob."""
+
+    def __init__(self, offsets: np.ndarray, named: np.ndarray, blob: memoryview):
+        self._offsets = offsets
+        self._named = named
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._named)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if not self._named[index]:
+            return None
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return str(self._blob[start:end], "utf-8")
+
+
+def write_snapshot(graph, path: str):
+    """Write ``graph`` to ``path`` atomically."""
+    encoded = [b"" if name is None else name.encode() for name in graph.names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    named = np.array([name is not None for name in graph.names], dtype=np.uint8)
+    sections = [
+        np.ascontiguousarray(graph.ids, dtype=np.int64),
+        np.ascontiguousarray(graph.lat, dtype=np.float64),
+        np.ascontiguousarray(graph.lon, dtype=np.float64),
+        np.ascontiguousarray(graph.indptr, dtype=np.int64),
+        np.ascontiguousarray(graph.indices, dtype=np.int32),
+        np.ascontiguousarray(graph.costs, dtype=np.float64),
+        np.ascontiguousarray(graph.times, dtype=np.float64),
+        offsets,
+        named,
+        b"".join(encoded),
+    ]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(HEADER_SIZE))
+            checksum = 0
+            for section in sections:
+                data = memoryview(section).cast("B")
+                data = bytes(data) + bytes(-len(data) % 8)
+                checksum = zlib.crc32(data, checksum)
+                f.write(data)
+            f.seek(0)
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    FORMAT_VERSION,
+                    checksum,
+                    graph.node_count,
+                    graph.edge_count,
+                    int(offsets[-1]),
+                    time.time(),
+                )
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def read_header(path: str) -> SnapshotHeader:
+    with open(path, "rb") as f:
+        return _parse_header(f.read(HEADER_SIZE))
+
+
+def read_snapshot(path: str, verify: bool = True) -> tuple:
+    """Map the snapshot at ``path``; returns ``RouteGraph`` constructor args.
+
+    The arrays are read-only views of the mapping. ``verify`` checks the body
+    against the header checksum, which reads the whole file; without it only
+    the header and size are validated.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _parse_header(buffer[:HEADER_SIZE])
+    nodes, edges = header.node_count, header.edge_count
+    layout = [
+        (np.int64, nodes),
+        (np.float64, nodes),
+        (np.float64, nodes),
+        (np.int64, nodes + 1),
+        (np.int32, edges),
+        (np.float64, edges),
+        (np.float64, edges),
+        (np.int64, nodes + 1),
+        (np.uint8, nodes),
+    ]
+    arrays, offset = [], HEADER_SIZE
+    for dtype, count in layout:
+        size = np.dtype(dtype).itemsize * count
+        if offset + size > len(buffer):
+            raise SnapshotError(f"{path} is truncated")
+        arrays.append(np.frombuffer(buffer, dtype, count, offset))
+        offset += size + -size % 8
+    if offset + header.names_size + -header.names_size % 8 != len(buffer):
+        raise SnapshotError(f"{path} has the wrong size")
+    if verify and zlib.crc32(memoryview(buffer)[HEADER_SIZE:]) != header.checksum:
+        raise SnapshotError(f"{path} does not match its checksum")
+
+    ids, lat, lon, indptr, indices, costs, times, name_offsets, named = arrays
+    blob = memoryview(buffer)[offset : offset + header.names_size]
+    names = NameTable(name_offsets, named, blob)
+    return ids, names, lat, lon, indptr, indices, costs, times
+
+
+@asynccontextmanager
+async def snapshot_lock(path: str):
+    """Exclusive across processes, so one worker builds while the rest wait."""
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def _parse_header(data: bytes) -> SnapshotHeader:
+    if len(data) < HEADER.size:
+        raise SnapshotError("snapshot header is truncated")
+    magic, version, *fields = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("not a route graph snapshot")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"snapshot format {version}, expected {FORMAT_VERSION}")
+    return SnapshotHeader(*fields)
@@ -0,0 +1,189 @@
+"""Flown 4D trajectories stored as packed little-endian float32 columns."""
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import numpy as np
+
+DTYPE = np.dtype("<f4")
+# JSON keys of the per-point arrays, as in sample_tech_test.json, and the
+# trajectories column each one is stored in
+TRACK_KEYS = {
+    b"LATITUDE": "latitude",
+    b"LONGITUDE": "longitude",
+    b"ALTITUDE": "altitude",
+    b"TIME": "time",  # optional, seconds since departure
+}
+# what the scan for top-level keys stops at: strings and nesting
+STRUCTURE_PATTERN = re.compile(rb'["{}\[\]]')
+STRING_PATTERN = re.compile(rb'"((?:[^"\\]|\\.)*)"', re.DOTALL)
+ARRAY_VALUE_PATTERN = re.compile(rb"\s*:\s*\[")
+INCOMPLETE_VALUE_PATTERN = re.compile(rb"\s*(?::\s*)?")
+
+
+class Trajectory:
+    """Read-only view of one stored track.
+
+    Columns are ``numpy`` arrays viewing the stored bytes directly, and
+    slicing returns views of those, so nothing is copied until the values are
+    serialized.
+    """
+
+    def __init__(
+        self,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        altitude: Optional[np.ndarray] = None,
+        time: Optional[np.ndarray] = None,
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.time = time
+
+    def __len__(self):
+        return len(self.latitude)
+
+    @classmethod
+    def from_row(cls, row) -> "Trajectory":
+        return cls(
+            *(
+                None if row[column] is None else np.frombuffer(row[column], DTYPE)
+                for column in ("latitude", "longitude", "altitude", "time")
+            )
+        )
+
+    def __getitem__(self, index) -> "Trajectory":
+        """Slices are views; index arrays copy the selected points."""
+        return Trajectory(
+            self.latitude[index],
+            self.longitude[index],
+            None if self.altitude is None else self.altitude[index],
+            None if self.time is None else self.time[index],
+        )
+
+    def time_slice(
+        self,
+        start: float = None,
+        end: float = None,
+        duration: float = None,
+    ) -> "Trajectory":
+        """Points between ``start`` and ``end`` seconds after departure."""
+        time = self.seconds(duration)
+        lo = 0 if start is None else int(np.searchsorted(time, start, "left"))
+        hi = len(self) if end is None else int(np.searchsorted(time, end, "right"))
+        return self[lo:hi]
+
+    def seconds(self, duration: float = None) -> np.ndarray:
+        """Time of every point; uniform over ``duration`` if none was stored."""
+        if self.time is not None:
+            return self.time
+        if duration is None:
+            return np.arange(len(self), dtype=DTYPE)
+        return np.linspace(0, duration, len(self), dtype=DTYPE)
+
+    def to_dict(self) -> dict:
+        return {
+            "latitude": self.latitude.tolist(),
+            "longitude": self.longitude.tolist(),
+            "altitude": None if self.altitude is None else self.altitude.tolist(),
+            "time": None if self.time is None else self.time.tolist(),
+        }
+
+
+async def read_track_arrays(stream: AsyncIterator[bytes]) -> dict[str, np.ndarray]:
+    """Pull the per-point arrays out of a JSON document as it streams in.
+
+    Numbers are parsed straight from the raw bytes into float32 blocks, so
+    neither the whole document nor Python float lists are ever held in
+    memory. Only keys of the top-level object are read, other keys and
+    anything nested are skipped. A value that is not a finite number, or a
+    document that ends early, raises ``ValueError``.
+    """
+    arrays: dict[str, list[np.ndarray]] = {}
+    pending = b""
+    depth = 0  # of objects and arrays around the scan
+    current = None  # column being read, None while looking for a key
+    async for chunk in stream:
+        pending += chunk
+        while pending:
+            if current is None:
+                depth, current, consumed = _scan(pending, depth)
+                pending = pending[consumed:]
+                if current is None:
+                    break
+                arrays[current] = []
+            else:
+                end = pending.find(b"]")
+                if end >= 0:
+                    arrays[current].append(_parse_numbers(pending[:end]))
+                    pending = pending[end + 1:]
+                    current = None
+                    continue
+                cut = pending.rfind(b",")
+                if cut >= 0:
+                    arrays[current].append(_parse_numbers(pending[:cut]))
+                    pending = pending[cut + 1:]
+                break
+    if current is not None or depth or pending.strip():
+        raise ValueError("Document ends early")
+    return {column: np.concatenate(blocks) for column, blocks in arrays.items()}
+
+
+def _scan(data: bytes, depth: int):
+    """Look for a top-level track key followed by ``: [`` in ``data``.
+
+    Returns the depth reached, the column found or ``None``, and how many
+    bytes were consumed: up to the array's first value, or up to a string
+    or key that may continue in the next chunk.
+    """
+    position = 0
+    while True:
+        match = STRUCTURE_PATTERN.search(data, position)
+        if match is None:
+            return depth, None, len(data)
+        token, start = match.group(), match.start()
+        if token != b'"':
+            depth += 1 if token in b"{[" else -1
+            position = match.end()
+            continue
+        string = STRING_PATTERN.match(data, start)
+        if string is None:  # not closed yet
+            return depth, None, start
+        position = string.end()
+        if depth != 1 or string.group(1) not in TRACK_KEYS:
+            continue
+        value = ARRAY_VALUE_PATTERN.match(data, position)
+        if value is not None:
+            return depth, TRACK_KEYS[string.group(1)], value.end()
+        if INCOMPLETE_VALUE_PATTERN.fullmatch(data, position):
+            return depth, None, start  # the rest of the key in the next chunk
+
+
+def pack(values: np.ndarray) -> bytes:
+    return np.ascontiguousarray(values, dtype=DTYPE).tobytes()
+
+
+def seconds_since(departure_time: datetime, moment: Optional[datetime]):
+    """Seconds from ``departure_time`` to ``moment``; naive times are UTC."""
+    if moment is None:
+        return None
+    return (_as_utc(moment) - _as_utc(departure_time)).total_seconds()
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo:
+        return value.astimezone(timezone.utc)
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _parse_numbers(text: bytes) -> np.ndarray:
+    """Comma-separated numbers; raises ``ValueError`` on any other value, and
+    on values that are not finite once stored as float32."""
+    if not text.strip():
+        return np.empty(0, DTYPE)
+    with np.errstate(over="ignore"):  # out of float32 range is checked below
+        values = np.array(text.split(b",")).astype(np.float64).astype(DTYPE)
+    if not np.isfinite(values).all():
+        raise ValueError("Track values must be finite numbers")
+    return values
@@ -0,0 +1,73 @@
+import asyncio
+import sys
+from typing import Iterable
+
+from databases.core import Connection
+
+
+class WaypointDirectory:
+    """Process-wide ``waypoints.id -> name`` lookup.
+
+    Warmed once at startup; ids it has not seen yet are fetched in a single
+    batched query. Writers keep it current through ``update``, and
+    ``refresh``, run after imports and graph rebuilds, picks up waypoints
+    inserted by other processes.
+    """
+
+    def __init__(self):
+        self._names: dict[int, str] = {}
+        self._max_id = 0
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, waypoint_id: int):
+        return waypoint_id in self._names
+
+    async def warm(self, db: Connection):
+        async with self._lock:
+            rows = await db.fetch_all("SELECT id, name FROM waypoints")
+            self._names.clear()
+            self._max_id = 0
+            self._store(rows)
+
+    async def refresh(self, db: Connection):
+        """Load waypoints created since the last warm/refresh."""
+        async with self._lock:
+            rows = await db.fetch_all(
+                "SELECT id, name FROM waypoints WHERE id > :max_id",
+                values={"max_id": self._max_id},
+            )
+            self._store(rows)
+
+    async def resolve(self, db: Connection, ids: Iterable[int]) -> list[str]:
+        """Names for ``ids`` in order; raises ``KeyError`` for unknown ids."""
+        ids = list(ids)
+        missing = {i for i in ids if i not in self._names}
+        if missing:
+            rows = await db.fetch_all(
+                "SELECT id, name FROM waypoints WHERE id = ANY(:ids)",
+                values={"ids": list(missing)},
+            )
+            self._store(rows, advance=False)
+        names = self._names
+        return [names[i] for i in ids]
+
+    def get(self, waypoint_id: int, default=None):
+        return self._names.get(waypoint_id, default)
+
+    def update(self, waypoint_id: int, name: str):
+        self._store([{"id": waypoint_id, "name": name}], advance=False)
+
+    def _store(self, rows, advance: bool = True):
+        """Remember ``rows``; ``advance`` moves the mark ``refresh`` loads from,
+        which only a full scan of the newer ids may do, or lower ids other
+        processes inserted meanwhile would be skipped.
+        """
+        for row in rows:
+            name = row["name"]
+            # one shared str per name, however often it is refreshed
+            self._names[row["id"]] = sys.intern(name) if name is not None else None
+            if advance:
+                self._max_id = max(self._max_id, row["id"])
@@ -0,0 +1,149 @@
+"""Wind-corrected flight times over great-circle legs."""
+from typing import NamedTuple
+
+import numpy as np
+
+from .geodesy import SpatialIndex, haversine, to_unit_vectors
+
+KM_PER_NM = 1.852
+# speed of sound in knots is SPEED_OF_SOUND_KT * sqrt(temperature in kelvin)
+SPEED_OF_SOUND_KT = 38.967854
+ISA_SEA_LEVEL_K = 288.15
+ISA_LAPSE_K_PER_FT = 0.0019812
+ISA_TROPOPAUSE_K = 216.65
+DEFAULT_MACH = 0.78
+DEFAULT_FLIGHT_LEVEL = 350
+
+
+def true_airspeed(mach, flight_level, delta_isa=0.0):
+    """TAS in knots at ``mach`` and ``flight_level`` (hundreds of feet)."""
+    temperature = np.maximum(
+        ISA_SEA_LEVEL_K - ISA_LAPSE_K_PER_FT * np.asarray(flight_level) * 100,
+        ISA_TROPOPAUSE_K,
+    )
+    return mach * SPEED_OF_SOUND_KT * np.sqrt(temperature + delta_isa)
+
+
+DEFAULT_TAS_KT = float(true_airspeed(DEFAULT_MACH, DEFAULT_FLIGHT_LEVEL))
+
+
+class WindField:
+    """Wind interpolated from scattered observations.
+
+    Observations are reported the meteorological way: ``direction`` the wind
+    blows from, in degrees true, and ``speed`` in knots. The wind at a
+    position is an inverse-distance weighted mean of the ``k`` nearest
+    observations, fading to calm further than ``reach_km`` from any of them.
+    """
+
+    def __init__(self, lat, lon, direction, speed, reach_km: float = 500.0, k=4):
+        direction = np.radians(np.asarray(direction, dtype=np.float64))
+        speed = np.asarray(speed, dtype=np.float64)
+        # components the air moves towards: east and north
+        self.east = -speed * np.sin(direction)
+        self.north = -speed * np.cos(direction)
+        self.index = SpatialIndex(lat, lon)
+        self.reach_km = reach_km
+        self.k = k
+
+    def __len__(self):
+        return len(self.index)
+
+    def at(self, lat, lon):
+        """Wind ``(east, north)`` in knots at every position."""
+        if not len(self):
+            zeros = np.zeros(len(lat))
+            return zeros, zeros
+        distance, position = self.index.nearest(lat, lon, self.k)
+        if distance.ndim == 1:  # fewer than two observations
+            distance, position = distance[:, None], position[:, None]
+        weight = np.where(
+            distance < self.reach_km, 1 / np.maximum(distance, 1.0) ** 2, 0.0
+        )
+        # a calm pseudo-observation at reach_km
+        total = weight.sum(axis=1) + 1 / self.reach_km**2
+        east = (weight * self.east[position]).sum(axis=1) / total
+        north = (weight * self.north[position]).sum(axis=1) / total
+        return east, north
+
+
+class WindSnapshot(NamedTuple):
+    wind: WindField
+    mach: float = DEFAULT_MACH
+    flight_level: float = DEFAULT_FLIGHT_LEVEL
+    delta_isa: float = 0.0
+
+    @property
+    def true_airspeed(self) -> float:
+        return float(true_airspeed(self.mach, self.flight_level, self.delta_isa))
+
+
+def wind_from_ofp(document: dict) -> WindSnapshot:
+    """Winds reported at the waypoints of an OFP, at its cruise Mach and level."""
+    report = wind_report(document)
+    reports = report["waypoints"]
+    wind = WindField(
+        [wp["latitude"] for wp in reports],
+        [wp["longitude"] for wp in reports],
+        [wp["windDir"] for wp in reports],
+        [wp["windSpeed"] for wp in reports],
+    )
+    return WindSnapshot(
+        wind,
+        report["cruiseMach"] or DEFAULT_MACH,
+        report["cruiseLevel"] or DEFAULT_FLIGHT_LEVEL,
+        report["deltaIsa"] or 0.0,
+    )
+
+
+def wind_report(document: dict) -> dict:
+    """The parts of an OFP ``wind_from_ofp`` reads, as an OFP of their own."""
+    ofp = document.get("lastOfp", document)
+    return {
+        "waypoints": [
+            {key: wp[key] for key in ("latitude", "longitude", "windDir", "windSpeed")}
+            for wp in ofp["waypoints"]
+            if wp.get("windDir") is not None and wp.get("windSpeed") is not None
+        ],
+        "cruiseMach": ofp.get("cruiseMach"),
+        "cruiseLevel": ofp.get("cruiseLevel"),
+        "deltaIsa": ofp.get("deltaIsa"),
+    }
+
+
+def leg_times(lat1, lon1, lat2, lon2, tas_kt: float, wind: WindField = None):
+    """Seconds to fly each great-circle leg at ``tas_kt`` through ``wind``.
+
+    Wind and course are taken at the leg midpoint, and ground speed follows
+    from the wind triangle: the crosswind is crabbed out of the TAS and the
+    along-track component added. Ground speed never drops below a tenth of
+    the TAS, so a gale still gives a finite, very expensive leg.
+    """
+    start, end = to_unit_vectors(lat1, lon1), to_unit_vectors(lat2, lon2)
+    distance_nm = haversine(lat1, lon1, lat2, lon2) / KM_PER_NM
+    if wind is None or not len(wind):
+        return distance_nm / tas_kt * 3600
+
+    middle = start + end
+    middle /= np.maximum(np.linalg.norm(middle, axis=1), 1e-12)[:, None]
+    mid_lat = np.degrees(np.arcsin(np.clip(middle[:, 2], -1.0, 1.0)))
+    mid_lon = np.degrees(np.arctan2(middle[:, 1], middle[:, 0]))
+
+    # course at the midpoint, as a unit vector in local (east, north)
+    lat, lon = np.radians(mid_lat), np.radians(mid_lon)
+    chord = end - start
+    course_east = -np.sin(lon) * chord[:, 0] + np.cos(lon) * chord[:, 1]
+    course_north = (
+        -np.sin(lat) * np.cos(lon) * chord[:, 0]
+        - np.sin(lat) * np.sin(lon) * chord[:, 1]
+        + np.cos(lat) * chord[:, 2]
+    )
+    norm = np.maximum(np.hypot(course_east, course_north), 1e-12)
+    course_east, course_north = course_east / norm, course_north / norm
+
+    east, north = wind.at(mid_lat, mid_lon)
+    along = east * course_east + north * course_north
+    across = east * course_north - north * course_east
+    ground_speed = np.sqrt(np.maximum(tas_kt**2 - across**2, 0.0)) + along
+    ground_speed = np.maximum(ground_speed, 0.1 * tas_kt)
+    return distance_nm / ground_speed * 3600
@@ -0,0 +1,33 @@
+"""Throughput of OFP parsing on sample_tech_test.json.
+
+    python -m benchmarks.ofp [documents]
+"""
+import json
+import sys
+import time
+
+from app.ofp import parse_ofp, parse_route
+
+
+def main(count: int = 5000):
+    with open("sample_tech_test.json") as f:
+        document = json.loads(f.read())
+    # the trajectory arrays are not part of an OFP
+    document = {k: v for k, v in document.items() if k in ("fpl", "lastOfp", "id")}
+    line = json.dumps(document)
+
+    started = time.perf_counter()
+    for _ in range(count):
+        parse_route(document["fpl"])
+    elapsed = time.perf_counter() - started
+    print(f"parse_route       {count / elapsed:12,.0f} routes/s")
+
+    started = time.perf_counter()
+    for _ in range(count):
+        parse_ofp(json.loads(line)).fpl_names()
+    elapsed = time.perf_counter() - started
+    print(f"json + parse_ofp  {count / elapsed:12,.0f} documents/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
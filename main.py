@@ -2,15 +2,54 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from app.deps import create_db_and_tables
+from app.deps import (
+    create_database,
+    create_db_and_tables,
+    get_executor,
+    get_flight_partitions,
+    get_job_runner,
+    get_metrics,
+    get_result_cache,
+    get_route_graph,
+    get_slow_query_log,
+    get_waypoint_directory,
+)
+from app.metrics import MetricsMiddleware
 from app.routes import router
+from app.services import FlightService
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_db_and_tables()
-    yield
+    async with create_database() as db:
+        app.state.db = db
+        slow_queries = get_slow_query_log()
+        if slow_queries is not None:
+            slow_queries.database = db
+        await get_waypoint_directory().warm(db)
+        # maps the shared snapshot when another worker has just built it
+        await get_route_graph().get(db)
+        runner = get_job_runner()
+        await runner.start(
+            db,
+            lambda connection: FlightService(
+                connection,
+                get_route_graph(),
+                get_result_cache(),
+                get_waypoint_directory(),
+                get_executor(),
+                get_metrics(),
+                get_slow_query_log(),
+                get_flight_partitions(),
+            ),
+        )
+        yield
+        await runner.stop()
+    get_executor().shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(router)
+if get_metrics() is not None:
+    app.add_middleware(MetricsMiddleware, metrics=get_metrics())
@@ -4,9 +4,21 @@ from databases import Database
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
-from app.deps import get_db
+from app.cache import LocalResultCache
+from app.deps import (
+    get_db,
+    get_executor,
+    get_job_runner,
+    get_result_cache,
+    get_route_graph,
+    get_waypoint_directory,
+)
+from app.executor import ComputeExecutor
+from app.graph import RouteGraphEngine
+from app.jobs import JobRunner
 from app.models import metadata
 from app.settings import Settings
+from app.waypoints import WaypointDirectory
 from main import app
 
 TEST_DB_NAME = "test"
@@ -15,10 +27,11 @@ TEST_DB_NAME = "test"
 async def get_db_override():
     settings = Settings(DB_NAME=TEST_DB_NAME)
     async with Database(settings.db_url) as db:
-        yield db
+        async with db.connection() as connection:
+            yield connection
 
 
-@pytest.fixture(autouse=True, scope="session")
+@pytest.fixture(scope="session")
 async def clear_db():
     settings = Settings(DB_NAME="postgres")
     async with Database(settings.db_url) as db:
@@ -34,17 +47,33 @@ async def clear_db():
 
 
 @pytest.fixture
-async def db():
+async def db(clear_db):
     settings = Settings(DB_NAME=TEST_DB_NAME)
     async with Database(settings.db_url) as db:
         yield db
 
 
+@pytest.fixture
+def job_runner():
+    # not started: tests that need jobs to run start it on their own db
+    return JobRunner(workers=1, poll_interval=0.1)
+
+
 @pytest.fixture(name="client")
-async def client_fixture():
+async def client_fixture(clear_db, job_runner):
+    route_graph = RouteGraphEngine()
     app.dependency_overrides[get_db] = get_db_override
+    result_cache = LocalResultCache()
+    app.dependency_overrides[get_route_graph] = lambda: route_graph
+    app.dependency_overrides[get_result_cache] = lambda: result_cache
+    app.dependency_overrides[get_waypoint_directory] = WaypointDirectory
+    executor = ComputeExecutor(processes=0)
+    app.dependency_overrides[get_executor] = lambda: executor
+    app.dependency_overrides[get_job_runner] = lambda: job_runner
 
     async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
         yield client
 
     app.dependency_overrides.clear()
+    await job_runner.stop()
+    executor.shutdown()
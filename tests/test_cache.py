@@ -0,0 +1,54 @@
+import pytest
+
+from app.cache import MISSING, LocalResultCache, ResultCache
+
+
+async def test_lru_eviction_wout_db():
+    cache = LocalResultCache(maxsize=2)
+    await cache.set("a", 1, group=(1, 2))
+    await cache.set("b", None, group=(1, 2))
+    assert await cache.get("a") == 1  # "b" is now least recently used
+    await cache.set("c", 3, group=(3, 4))
+
+    assert await cache.get("b") is MISSING
+    assert await cache.get("c") == 3
+    assert cache.stats.as_dict() == {
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+        "invalidations": 0,
+    }
+
+
+async def test_ttl_expiry_wout_db():
+    cache = LocalResultCache(ttl=0)
+    await cache.set("a", 1, group=(1, 2))
+
+    assert await cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+async def test_invalidate_group_wout_db():
+    cache = LocalResultCache()
+    await cache.set("a", 1, group=(1, 2))
+    await cache.set("b", None, group=(1, 2))
+    await cache.set("c", 3, group=(3, 4))
+
+    await cache.invalidate((1, 2))
+
+    assert await cache.get("a") is MISSING
+    assert await cache.get("b") is MISSING
+    assert await cache.get("c") == 3
+    assert cache.stats.invalidations == 2
+
+
+def test_incomplete_backend_fails_on_creation_wout_db():
+    class NoInvalidation(ResultCache):
+        async def get(self, key):
+            return MISSING
+
+        async def set(self, key, value, group):
+            pass
+
+    with pytest.raises(TypeError, match="invalidate"):
+        NoInvalidation()
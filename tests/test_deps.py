@@ -0,0 +1,35 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.deps import _upgrade_tables
+from app.settings import Settings
+from tests.conftest import TEST_DB_NAME
+
+
+async def test_upgrade_tables(clear_db):
+    engine = create_async_engine(Settings(DB_NAME=TEST_DB_NAME).db_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE edges DROP COLUMN eet"))
+            await conn.execute(text("ALTER TABLE jobs DROP COLUMN heartbeat_at"))
+            await conn.execute(text("DROP INDEX ix_flights_departure_time_brin"))
+
+            await conn.run_sync(_upgrade_tables)
+            await conn.run_sync(_upgrade_tables)  # and again, as on every boot
+
+            columns = await conn.execute(
+                text(
+                    """
+                    SELECT table_name || '.' || column_name
+                    FROM information_schema.columns
+                    WHERE table_name IN ('edges', 'jobs')
+                    """
+                )
+            )
+            assert {"edges.eet", "jobs.heartbeat_at"} <= set(columns.scalars())
+            assert await conn.scalar(
+                text("SELECT to_regclass('ix_flights_departure_time_brin')")
+            )
+            assert await conn.scalar(text("SELECT route_signature('{1,2}')"))
+    finally:
+        await engine.dispose()
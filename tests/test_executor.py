@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.executor import ComputeExecutor, ExecutorSaturated
+
+
+def square(x):
+    return x * x
+
+
+async def test_run_wout_db():
+    executor = ComputeExecutor(processes=1, threads=2)
+    try:
+        assert await executor.run(square, 3) == 9
+        assert await executor.run_process(square, 4) == 16
+        assert executor.stats.submitted == executor.stats.completed == 2
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+
+async def test_saturated_wout_db():
+    release = threading.Event()
+    executor = ComputeExecutor(processes=0, threads=1, max_pending=2)
+    try:
+        blocked = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(square, 2)
+        assert executor.stats.rejected == 1
+
+        release.set()
+        assert await asyncio.gather(*blocked) == [True, True]
+        assert await executor.run(square, 2) == 4
+    finally:
+        executor.shutdown()
+
+
+async def test_timeout_wout_db():
+    executor = ComputeExecutor(processes=0, threads=1)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(time.sleep, 0.2, timeout=0.01)
+        assert executor.stats.timeouts == 1
+        # the sleep cannot be interrupted and still holds its slot
+        assert executor.pending == 1
+    finally:
+        executor.shutdown()
+
+
+async def test_failed_submit_releases_its_slot_wout_db():
+    executor = ComputeExecutor(processes=0, threads=1, max_pending=1)
+    executor.shutdown()
+    with pytest.raises(RuntimeError, match="after shutdown"):
+        await executor.run(square, 2)
+    assert executor.pending == 0
+    assert executor.stats.submitted == 0
@@ -1,11 +1,20 @@
+import asyncio
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 
 import pytest
 from databases import Database
 from httpx import AsyncClient
 
-from app.models import aircrafts, airlines, flights, waypoints
+from app.cache import LocalResultCache
+from app.executor import ComputeExecutor
+from app.graph import RouteGraphEngine
+from app.jobs import JOB_SPEC, JobRunner
+from app.models import aircrafts, airlines, edges, waypoints
+from app.partitions import FlightPartitions
+from app.schemas import FlightCreate
+from app.services import FlightService, _to_copy, iter_lines
+from app.waypoints import WaypointDirectory
 
 
 @pytest.fixture
@@ -36,6 +45,17 @@ def create_waypoint(db: Database):
     return _
 
 
+@pytest.fixture
+def create_edge(db: Database):
+    async def _(source: int, target: int, cost: float, eet: float = None):
+        query = edges.insert().values(
+            name=f"{source}-{target}", source=source, target=target, cost=cost, eet=eet
+        )
+        await db.execute(query)
+
+    return _
+
+
 @pytest.fixture
 def create_flight(
     create_waypoint,
@@ -64,7 +84,7 @@ def create_flight(
         if fpl is None:
             fpl = [departure, arrival]
 
-        values = dict(
+        flight = FlightCreate(
             fpl=fpl,
             departure=departure,
             arrival=arrival,
@@ -74,9 +94,19 @@ def create_flight(
             departure_time=departure_time,
             arrival_time=arrival_time,
         )
-        query = flights.insert()
-        created_id = await db.execute(query, values=values)
-        return created_id
+        # through the service, so route_usage is maintained as in production
+        service = FlightService(
+            db,
+            RouteGraphEngine(),
+            LocalResultCache(),
+            WaypointDirectory(),
+            ComputeExecutor(processes=0),
+            metrics=None,
+            slow_queries=None,
+            partitions=FlightPartitions(),
+        )
+        created = await service.create_flight(flight)
+        return created["id"]
 
     return _
 
@@ -136,6 +166,197 @@ async def test_create_flight(
             assert data[k] == v
 
 
+async def test_create_flight_with_offset(
+    client: AsyncClient, db: Database, create_waypoint, create_airline, create_aircraft
+):
+    departure, arrival = await create_waypoint("dep"), await create_waypoint("arr")
+    data = {
+        "fpl": [departure, arrival],
+        "airline_id": await create_airline(),
+        "aircraft_id": await create_aircraft(),
+        "fuel_consumption": 500,
+        "departure": departure,
+        "arrival": arrival,
+        "departure_time": "2024-01-05T08:30:00+10:00",
+        "arrival_time": "2024-01-05T09:30:00+10:00",
+    }
+    response = await client.post("/flights/routes", json=data)
+    assert response.status_code == 200, response.json()
+    # stored, and bucketed, as naive UTC
+    assert response.json()["departure_time"] == "2024-01-04T22:30:00"
+    day = await db.fetch_val(
+        "SELECT day FROM route_usage WHERE departure = :dep", values={"dep": departure}
+    )
+    assert day == date(2024, 1, 4)
+
+
+async def test_route_usage_day_is_utc_wout_db():
+    class RecordingConnection:
+        async def execute(self, query, values):
+            self.values = values
+
+    service = FlightService(
+        RecordingConnection(),
+        RouteGraphEngine(),
+        LocalResultCache(),
+        WaypointDirectory(),
+        ComputeExecutor(processes=0),
+        metrics=None,
+        slow_queries=None,
+        partitions=FlightPartitions(),
+    )
+    departure_time = datetime(2024, 1, 5, 8, 0, tzinfo=timezone(timedelta(hours=10)))
+    flight = {
+        "departure": 1,
+        "arrival": 2,
+        "airline_id": 1,
+        "aircraft_id": 1,
+        "fuel_consumption": 500.0,
+        "departure_time": departure_time,
+        "arrival_time": departure_time + timedelta(hours=1),
+        "fpl": [1, 2],
+    }
+    await service._add_route_usage([flight])
+    single = service.db.values["days"]
+    await service._add_route_usage([{k: _to_copy(v) for k, v in flight.items()}])
+    assert single == service.db.values["days"] == [date(2024, 1, 4)]
+
+
+def test_date_filters_are_utc_wout_db():
+    service = FlightService(
+        None,
+        RouteGraphEngine(),
+        LocalResultCache(),
+        WaypointDirectory(),
+        ComputeExecutor(processes=0),
+        metrics=None,
+        slow_queries=None,
+        partitions=FlightPartitions(),
+    )
+    offset = timezone(timedelta(hours=10))
+    start = datetime(2024, 1, 5, 8, 0, tzinfo=offset)
+    end = datetime(2024, 1, 6, 8, 0, tzinfo=offset)
+
+    _, values = service._get_filters("route_usage", start_date=start, end_date=end)
+    assert values == {"start_date": date(2024, 1, 4), "end_date": date(2024, 1, 5)}
+    _, values = service._get_filters("flights", start_date=start, end_date=end)
+    assert values == {
+        "start_date": datetime(2024, 1, 4, 22, 0),
+        "end_date": datetime(2024, 1, 5, 22, 0),
+    }
+
+
+async def test_iter_lines_wout_db():
+    async def stream():
+        for chunk in [b'{"a": 1}\n{"b"', b': 2}\n', b"", b'{"c": 3}']:
+            yield chunk
+
+    assert [line async for line in iter_lines(stream())] == [
+        b'{"a": 1}',
+        b'{"b": 2}',
+        b'{"c": 3}',
+    ]
+
+
+async def test_bulk_create_flights(
+    client: AsyncClient,
+    create_waypoint,
+    create_airline,
+    create_aircraft,
+):
+    airport1 = await create_waypoint(name="wp1")
+    airport2 = await create_waypoint(name="wp2")
+    data = {
+        "fpl": [airport1, airport2],
+        "airline_id": await create_airline(),
+        "aircraft_id": await create_aircraft(),
+        "fuel_consumption": 500,
+        "departure": airport1,
+        "arrival": airport2,
+        "departure_time": "2024-01-05T14:30:00",
+        "arrival_time": "2024-01-05T15:30:00",
+    }
+    lines = [json.dumps(data)] * 3 + ['{"fpl": "broken"}', json.dumps(data)]
+    response = await client.post(
+        "/flights/routes/bulk",
+        content="\n".join(lines),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert result["inserted"] == 4
+    assert result["failed"] == 1
+    assert result["errors"][0]["line"] == 4
+    assert result["rows_per_second"] > 0
+
+
+async def test_import_ofps(client: AsyncClient, create_airline, create_aircraft):
+    with open("sample_tech_test.json") as f:
+        document = json.loads(f.read())
+    del document["LATITUDE"], document["LONGITUDE"], document["ALTITUDE"]
+    params = {
+        "airline_id": await create_airline(),
+        "aircraft_id": await create_aircraft(),
+        "departure_time": "2023-10-31T06:30:00",
+    }
+    response = await client.post(
+        "/flights/ofp",
+        params=params,
+        content="\n".join([json.dumps(document)] * 2 + ['{"lastOfp": {}}']),
+    )
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert result["inserted"] == 2
+    assert result["failed"] == 1
+
+
+async def test_store_and_read_trajectory(client: AsyncClient, create_flight):
+    flight = await create_flight(
+        departure_time=datetime(2023, 10, 31, 6, 0),
+        arrival_time=datetime(2023, 10, 31, 9, 39),  # 13141 points, 1 per second
+    )
+    with open("sample_tech_test.json", "rb") as f:
+        response = await client.put(f"/flights/{flight}/trajectory", content=f.read())
+    assert response.status_code == 200, response.json()
+    assert response.json()["points"] == 13141
+    assert response.json()["flown_fpl"] == ["departure", "arrival"]
+
+    response = await client.get(
+        f"/flights/{flight}/trajectory", params={"start": 0, "stop": 3}
+    )
+    result = response.json()
+    assert result["latitude"] == pytest.approx([28.437255, 28.4380275, 28.4388])
+    assert len(result["altitude"]) == 3
+
+    response = await client.get(
+        f"/flights/{flight}/trajectory",
+        params={"start_time": "2023-10-31T06:00:00", "end_time": "2023-10-31T06:01:00"},
+    )
+    assert 55 <= len(response.json()["latitude"]) <= 65
+
+    response = await client.get(
+        f"/flights/{flight}/trajectory",
+        params={
+            "start_time": "2023-10-31T08:00:00+02:00",
+            "end_time": "2023-10-31T06:01:00Z",
+        },
+    )
+    assert response.status_code == 200, response.json()
+    assert 55 <= len(response.json()["latitude"]) <= 65
+    assert response.json()["time"] is None
+
+    params = {"tolerance": 1000, "points": 20}
+    response = await client.get(f"/flights/{flight}/trajectory", params=params)
+    simplified = response.json()
+    assert 2 <= len(simplified["latitude"]) <= 20
+    assert simplified["latitude"][0] == pytest.approx(28.437255)
+
+    response = await client.get("/flights/0/trajectory")
+    assert response.status_code == 404
+
+
 async def test_get_most_used_flight_routes(
     client: AsyncClient, gen_flight, create_waypoint
 ):
@@ -159,10 +380,90 @@ async def test_get_most_used_flight_routes(
     assert response.status_code == 200
     assert result["fpl"] == ["dep", "wp", "arr"]
 
+    # gen_flight departs on 2024-01-05, day buckets cover the whole day
+    params["start_date"] = "2024-01-05T23:00:00"
+    response = await client.get("/flights/most_used", params=params)
+    assert response.json()["fpl"] == ["dep", "wp", "arr"]
+
+    params["start_date"] = "2024-01-06T00:00:00"
+    response = await client.get("/flights/most_used", params=params)
+    assert response.status_code == 404
+
+
+async def test_get_most_used_flight_routes_batch(
+    client: AsyncClient, gen_flight, create_waypoint
+):
+    dep, wp, arr, other = (
+        await create_waypoint("dep"),
+        await create_waypoint("wp"),
+        await create_waypoint("arr"),
+        await create_waypoint("other"),
+    )
+    await gen_flight(departure=dep, arrival=arr, fpl=[dep, wp, arr])
+    await gen_flight(departure=dep, arrival=arr, fpl=[dep, wp, arr])
+    await gen_flight(departure=dep, arrival=arr)
+    await gen_flight(departure=arr, arrival=dep)
+
+    pairs = [
+        {"departure": dep, "arrival": arr},
+        {"departure": dep, "arrival": other},
+        {"departure": arr, "arrival": dep},
+    ]
+    response = await client.post("/flights/most_used/batch", json={"pairs": pairs})
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert [r["fpl"] for r in result] == [["dep", "wp", "arr"], None, ["arr", "dep"]]
+    assert [r["usage_count"] for r in result] == [2, 0, 1]
+
+    response = await client.post(
+        "/flights/most_used/batch",
+        json={"pairs": pairs, "start_date": "2024-01-06T00:00:00"},
+    )
+    assert all(r["fpl"] is None for r in response.json())
+
+
+async def test_most_used_cache_invalidated_on_create(
+    client: AsyncClient, gen_flight, create_waypoint, create_airline, create_aircraft
+):
+    departure, wp, arrival = (
+        await create_waypoint("dep"),
+        await create_waypoint("wp"),
+        await create_waypoint("arr"),
+    )
+    await gen_flight(departure=departure, arrival=arrival)
+    params = {"departure": departure, "arrival": arrival}
+    response = await client.get("/flights/most_used", params=params)
+    assert response.json()["fpl"] == ["dep", "arr"]
+
+    data = {
+        "fpl": [departure, wp, arrival],
+        "airline_id": await create_airline(),
+        "aircraft_id": await create_aircraft(),
+        "fuel_consumption": 500,
+        "departure": departure,
+        "arrival": arrival,
+        "departure_time": "2024-01-05T14:30:00",
+        "arrival_time": "2024-01-05T15:30:00",
+    }
+    for _ in range(2):
+        await client.post("/flights/routes", json=data)
+
+    response = await client.get("/flights/most_used", params=params)
+    assert response.json()["fpl"] == ["dep", "wp", "arr"]
+
+    stats = (await client.get("/flights/cache/stats")).json()
+    assert stats["misses"] == 2
+    assert stats["invalidations"] == 1
+
 
 @pytest.mark.parametrize(
-    ["by_time", "by_fuel"],
-    [(True, False), (False, True)],
+    ["by_time", "by_fuel", "expected"],
+    [
+        (True, False, "best_time"),
+        (False, True, "best_fuel"),
+        (False, False, "best_fuel"),
+    ],
 )
 async def test_get_most_efficient_flight_route(
     client: AsyncClient,
@@ -170,6 +471,7 @@ async def test_get_most_efficient_flight_route(
     create_waypoint,
     by_time,
     by_fuel,
+    expected,
 ):
     departure, arrival = await create_waypoint("dep"), await create_waypoint("arr")
     default = dict(departure=departure, arrival=arrival)
@@ -191,48 +493,356 @@ async def test_get_most_efficient_flight_route(
     }
     response = await client.get("/flights/most_efficient", params=params)
     result = response.json()
-    fpl = result["fpl"]
-    if by_time:
-        assert fpl[1] == "best_time", result
-    elif by_fuel:
-        assert fpl[1] == "best_fuel"
-
-
-# async def test_get_alternative_route(
-#     client: AsyncClient, create_waypoint, gen_flight, create_flight
-# ):
-#     departure, arrival = await create_waypoint("dep"), await create_waypoint("arr")
-#     route1, route2, route3 = (
-#         await create_flight(fpl=[departure, arrival]),
-#         await create_flight(fpl=[departure, await create_waypoint("alt1"), arrival]),
-#         await create_flight(fpl=[departure, await create_waypoint("alt2"), arrival]),
-#     )
-#     default = dict(departure=departure, arrival=arrival)
-#     await gen_flight(fpl=route1, **default)
-#     await gen_flight(fpl=route2, **default, duration=timedelta(minutes=30))
-#     await gen_flight(fpl=route3, **default, fuel_consumption=500)
-#     response = await client.get(f"/flights/alternatives?flightroute_id_id={route1}")
-#     result = response.json()
-#     assert len(result) == 2
-#     assert result[0]["id"] == route2
-#     assert result[0]["time_savings"] == "0:30:00"
-#     assert result[1]["id"] == route3
-#     assert result[1]["fuel_savings"] == 500
-
-
-# async def test_get_shortest_route(client: AsyncClient, db):
-#     with open("sample_tech_test.json") as f:
-#         data = json.loads(f.read())
-
-#     sample_waypoints = [
-#         {
-#             "name": waypoint["name"],
-#             "latitude": waypoint["latitude"],
-#             "longitude": waypoint["longitude"],
-#         }
-#         for waypoint in data["lastOfp"]["waypoints"]
-#     ]
-
-#     query = waypoints.insert().values(sample_waypoints)
-#     created_id = await db.execute(query)
-#     assert created_id
+    assert result["fpl"][1] == expected, result
+
+
+async def test_get_most_efficient_needs_one_criterion(client: AsyncClient):
+    params = {"departure": 1, "arrival": 2, "by_time": True, "by_fuel": True}
+    response = await client.get("/flights/most_efficient", params=params)
+    assert response.status_code == 422
+
+
+async def test_get_pareto_flight_routes(
+    client: AsyncClient, gen_flight, create_waypoint, create_edge
+):
+    departure, arrival = await create_waypoint("dep"), await create_waypoint("arr")
+    fast, frugal, worse = (
+        await create_waypoint("fast"),
+        await create_waypoint("frugal"),
+        await create_waypoint("worse"),
+    )
+    default = dict(departure=departure, arrival=arrival)
+    await gen_flight(
+        **default, fpl=[departure, fast, arrival], duration=timedelta(minutes=30)
+    )
+    await gen_flight(**default, fpl=[departure, frugal, arrival], fuel_consumption=500)
+    await gen_flight(**default, fpl=[departure, worse, arrival])
+    await create_edge(departure, fast, 1.0, eet=600)
+    await create_edge(fast, arrival, 1.0, eet=600)
+    await create_edge(departure, frugal, 0.5, eet=900)
+    await create_edge(frugal, arrival, 0.5, eet=900)
+
+    params = {"departure": departure, "arrival": arrival}
+    response = await client.get("/flights/pareto", params=params)
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert [r["fpl"][1] for r in result["history"]] == ["fast", "frugal"]
+    assert result["history"][0]["time"] == 1800
+    assert result["history"][1]["fuel"] == 500
+    assert [r["fpl"][1] for r in result["graph"]] == ["fast", "frugal"]
+    assert [r["distance"] for r in result["graph"]] == [2.0, 1.0]
+    assert result["graph"][0]["fuel"] > 0
+
+
+async def test_get_route_statistics(
+    client: AsyncClient, gen_flight, create_waypoint
+):
+    departure, arrival = await create_waypoint("dep"), await create_waypoint("arr")
+    via = await create_waypoint("via")
+    for minutes in range(60, 160):
+        await gen_flight(
+            departure=departure,
+            arrival=arrival,
+            fpl=[departure, via, arrival],
+            fuel_consumption=minutes * 10,
+            duration=timedelta(minutes=minutes),
+        )
+    await gen_flight(departure=departure, arrival=arrival)
+
+    params = {"departure": departure, "arrival": arrival}
+    response = await client.get("/flights/statistics", params=params)
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert [r["flights"] for r in result] == [100, 1]
+    assert result[0]["fpl"] == ["dep", "via", "arr"]
+    assert result[0]["block_time"]["p50"] == pytest.approx(110 * 60, rel=0.01)
+    assert result[0]["fuel"]["p99"] == pytest.approx(1590, rel=0.01)
+    assert result[1]["fuel"] == {"p50": 1000, "p90": 1000, "p99": 1000}
+
+    params["end_date"] = "2024-01-04T00:00:00"
+    response = await client.get("/flights/statistics", params=params)
+    assert response.json() == []
+
+
+async def test_get_alternative_route(
+    client: AsyncClient, create_waypoint, gen_flight, create_flight
+):
+    departure, arrival = await create_waypoint("dep"), await create_waypoint("arr")
+    alt1, alt2 = await create_waypoint("alt1"), await create_waypoint("alt2")
+    default = dict(departure=departure, arrival=arrival)
+    flight = await create_flight(
+        **default,
+        fpl=[departure, arrival],
+        fuel_consumption=1000,
+        departure_time=datetime(2024, 1, 5, 14, 30),
+        arrival_time=datetime(2024, 1, 5, 15, 30),
+    )
+    await gen_flight(
+        **default, fpl=[departure, alt1, arrival], duration=timedelta(minutes=30)
+    )
+    await gen_flight(**default, fpl=[departure, alt2, arrival], fuel_consumption=500)
+
+    response = await client.get("/flights/alternatives", params={"flight_id": flight})
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert len(result) == 2
+    assert result[0]["fpl"] == ["dep", "alt2", "arr"]
+    assert result[0]["fuel_savings"] == 500
+    assert result[1]["fpl"] == ["dep", "alt1", "arr"]
+    assert result[1]["time_savings"] == "0:30:00"
+
+
+async def test_get_shortest_route(client: AsyncClient, create_waypoint, create_edge):
+    dep, wp1, wp2, arr = (
+        await create_waypoint("dep"),
+        await create_waypoint("wp1"),
+        await create_waypoint("wp2"),
+        await create_waypoint("arr"),
+    )
+    await create_edge(dep, wp1, 1.0, eet=600)
+    await create_edge(wp1, arr, 5.0, eet=600)
+    await create_edge(dep, wp2, 2.0, eet=900)
+    await create_edge(wp2, arr, 2.0, eet=900)
+
+    params = {"departure": dep, "arrival": arr}
+    response = await client.get("/flights/shortest", params=params)
+    result = response.json()
+
+    assert response.status_code == 200, result
+    assert result["fpl"] == ["dep", "wp2", "arr"]
+    assert result["cost"] == 4.0
+    assert result["algorithm"] == "dijkstra"
+    assert result["expanded"] > 0
+
+    params = {"departure": dep, "arrival": arr, "algorithm": "bidirectional"}
+    response = await client.get("/flights/shortest", params=params)
+    assert response.json()["fpl"] == ["dep", "wp2", "arr"]
+
+    # the hierarchy is built off the request, which is told to come back
+    params = {"departure": dep, "arrival": arr, "algorithm": "ch"}
+    response = await client.get("/flights/shortest", params=params)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    for _ in range(100):
+        response = await client.get("/flights/shortest", params=params)
+        if response.status_code != 503:
+            break
+        await asyncio.sleep(0.05)
+    assert response.json()["fpl"] == ["dep", "wp2", "arr"]
+
+    # shorter is not faster, e.g. against a headwind
+    params = {"departure": dep, "arrival": arr, "metric": "time"}
+    response = await client.get("/flights/shortest", params=params)
+    assert response.json()["fpl"] == ["dep", "wp1", "arr"]
+    assert response.json()["cost"] == 1200.0
+
+    params = {"departure": arr, "arrival": dep}
+    response = await client.get("/flights/shortest", params=params)
+    assert response.status_code == 404
+
+
+async def test_shortest_routes_job(
+    client: AsyncClient,
+    db: Database,
+    job_runner: JobRunner,
+    create_waypoint,
+    create_edge,
+):
+    dep, wp1, arr = (
+        await create_waypoint("dep"),
+        await create_waypoint("wp1"),
+        await create_waypoint("arr"),
+    )
+    await create_edge(dep, wp1, 1.0)
+    await create_edge(wp1, arr, 1.0)
+    await job_runner.start(
+        db,
+        lambda connection: FlightService(
+            connection,
+            RouteGraphEngine(),
+            LocalResultCache(),
+            WaypointDirectory(),
+            ComputeExecutor(processes=0),
+            metrics=None,
+            slow_queries=None,
+            partitions=FlightPartitions(),
+        ),
+    )
+
+    body = {"kind": "shortest_routes", "waypoints": [dep, arr]}
+    response = await client.post("/flights/jobs", json=body)
+    job = response.json()
+    assert response.status_code == 202, job
+    assert job["status"] == "queued"
+
+    for _ in range(100):
+        job = (await client.get(f"/flights/jobs/{job['id']}")).json()
+        if job["status"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.05)
+    assert job["status"] == "succeeded", job
+    assert job["done"] == job["total"] == 2
+    assert job["expires_at"] is not None
+
+    response = await client.get(f"/flights/jobs/{job['id']}/results")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["fpl"] == ["dep", "wp1", "arr"]
+    assert results[1] == {"departure": arr, "arrival": dep, "fpl": None}
+
+
+async def test_expired_job_lease_is_reclaimed(
+    client: AsyncClient,
+    db: Database,
+    job_runner: JobRunner,
+    create_waypoint,
+    create_edge,
+):
+    dep, arr = await create_waypoint("dep"), await create_waypoint("arr")
+    await create_edge(dep, arr, 1.0)
+    body = {"kind": "shortest_routes", "waypoints": [dep, arr]}
+    job = (await client.post("/flights/jobs", json=body)).json()
+    # as left by a worker process that died mid-job
+    await db.execute(
+        """
+        UPDATE jobs SET status = 'running', started_at = now() - interval '1 hour',
+            heartbeat_at = now() - interval '1 hour'
+        WHERE id = :job_id
+        """,
+        values={"job_id": job["id"]},
+    )
+    await db.execute(
+        """
+        INSERT INTO job_results (job_id, seq, item)
+        VALUES (:job_id, 1, CAST('{"stale": true}' AS jsonb))
+        """,
+        values={"job_id": job["id"]},
+    )
+    await job_runner.start(
+        db,
+        lambda connection: FlightService(
+            connection,
+            RouteGraphEngine(),
+            LocalResultCache(),
+            WaypointDirectory(),
+            ComputeExecutor(processes=0),
+            metrics=None,
+            slow_queries=None,
+            partitions=FlightPartitions(),
+        ),
+    )
+
+    for _ in range(100):
+        job = (await client.get(f"/flights/jobs/{job['id']}")).json()
+        if job["status"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.05)
+    assert job["status"] == "succeeded", job
+
+    response = await client.get(f"/flights/jobs/{job['id']}/results")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["fpl"] for r in results] == [["dep", "arr"], None]
+
+
+async def test_cancel_queued_job(client: AsyncClient):
+    body = {"kind": "map_match", "flight_ids": [1, 2, 3]}
+    job = (await client.post("/flights/jobs", json=body)).json()
+
+    response = await client.delete(f"/flights/jobs/{job['id']}")
+    assert response.json()["status"] == "cancelled"
+    # cancelling again leaves the job as it is
+    response = await client.delete(f"/flights/jobs/{job['id']}")
+    assert response.json()["status"] == "cancelled"
+
+    response = await client.get(f"/flights/jobs/{job['id']}/results")
+    assert response.text == ""
+
+    missing = "00000000-0000-0000-0000-000000000000"
+    response = await client.get(f"/flights/jobs/{missing}")
+    assert response.status_code == 404
+
+
+def test_job_spec_wout_db():
+    job = JOB_SPEC.validate_python({"kind": "alternatives", "day": "2024-01-05"})
+    assert job.k == 5
+    with pytest.raises(ValueError):
+        JOB_SPEC.validate_python({"kind": "shortest_routes", "waypoints": [1]})
+
+
+async def test_job_worker_survives_claim_errors_wout_db():
+    class FlakyDatabase:
+        claims = 0
+
+        def connection(self):
+            return self
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            pass
+
+        async def fetch_one(self, query, values):
+            self.claims += 1
+            if self.claims == 1:
+                raise ConnectionError("connection lost")
+
+        async def fetch_all(self, query):
+            return []
+
+    database = FlakyDatabase()
+    runner = JobRunner(workers=1, poll_interval=0.01)
+    await runner.start(database, None)
+    await asyncio.sleep(0.1)
+    assert not runner._tasks[0].done()
+    assert database.claims > 2  # retried, then idled through poll timeouts
+    await runner.stop()
+
+
+async def test_job_purge_runs_on_a_timer_wout_db():
+    class BusyDatabase:
+        purges = 0
+
+        def connection(self):
+            return self
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            pass
+
+        async def fetch_one(self, query, values):
+            await asyncio.sleep(1)  # a claim that never comes back idle
+
+        async def fetch_all(self, query):
+            self.purges += 1
+            return []
+
+    database = BusyDatabase()
+    runner = JobRunner(workers=1, purge_interval=0.01)
+    await runner.start(database, None)
+    await asyncio.sleep(0.1)
+    assert database.purges > 2
+    await runner.stop()
+
+
+async def test_waypoint_directory(db: Database, create_waypoint):
+    directory = WaypointDirectory()
+    await directory.warm(db)
+    wp1 = await create_waypoint("wp1")
+    assert wp1 not in directory
+
+    # unseen ids are fetched in one batch and remembered
+    assert await directory.resolve(db, [wp1, wp1]) == ["wp1", "wp1"]
+    assert wp1 in directory
+
+    wp2 = await create_waypoint("wp2")
+    await directory.refresh(db)
+    assert directory.get(wp2) == "wp2"
+
+    directory.update(wp2, "renamed")
+    assert await directory.resolve(db, [wp2, wp1]) == ["renamed", "wp1"]
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pytest
+from geopy.distance import great_circle
+
+from app.geodesy import EARTH_RADIUS_KM, SpatialIndex, haversine, pairwise_haversine
+
+
+@pytest.fixture(scope="module")
+def sample_waypoints():
+    with open("sample_tech_test.json") as f:
+        data = json.loads(f.read())
+    wps = data["lastOfp"]["waypoints"]
+    return (
+        np.array([wp["latitude"] for wp in wps]),
+        np.array([wp["longitude"] for wp in wps]),
+    )
+
+
+def test_haversine_matches_geopy_wout_db(sample_waypoints):
+    lat, lon = sample_waypoints
+    distances = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+    for i, distance in enumerate(distances):
+        expected = great_circle(
+            (lat[i], lon[i]), (lat[i + 1], lon[i + 1]), radius=EARTH_RADIUS_KM
+        ).km
+        assert distance == pytest.approx(expected, abs=1e-6)
+
+    matrix = pairwise_haversine(lat, lon)
+    assert matrix.shape == (len(lat), len(lat))
+    assert np.allclose(matrix, matrix.T)
+
+
+def test_knn_edges_wout_db():
+    # three points close together on the equator and one far away
+    index = SpatialIndex([0, 0, 0, 40], [0, 1, 2, 40])
+    edges = index.knn_edges(k=1)
+    pairs = set(zip(edges.sources.tolist(), edges.targets.tolist()))
+
+    assert (0, 1) in pairs and (1, 0) in pairs
+    assert all(s != t for s, t in pairs)
+    assert edges.costs[edges.sources == 0][0] == pytest.approx(111.2, abs=0.1)
+
+
+def test_radius_edges_wout_db():
+    index = SpatialIndex([0, 0, 0, 40], [0, 1, 2, 40])
+    edges = index.radius_edges(150)
+    pairs = set(zip(edges.sources.tolist(), edges.targets.tolist()))
+
+    assert pairs == {(0, 1), (1, 0), (1, 2), (2, 1)}
+
+    distances, positions = index.nearest([0.1], [1.9], k=1)
+    assert positions.tolist() == [2]
+    assert distances[0] < 20
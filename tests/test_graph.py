@@ -0,0 +1,170 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.geodesy import SpatialIndex
+from app.graph import CostMetric, RouteGraph, RouteGraphEngine, SearchAlgorithm
+from app.hierarchy import verify
+
+
+def random_graph(size=500, k=6, seed=0) -> RouteGraph:
+    rng = np.random.default_rng(seed)
+    lat, lon = rng.uniform(25, 60, size), rng.uniform(-20, 20, size)
+    edges = SpatialIndex(lat, lon).knn_edges(k)
+    ids = np.arange(1, size + 1)
+    return RouteGraph.from_arrays(
+        ids,
+        [f"WP{i}" for i in ids],
+        lat,
+        lon,
+        ids[edges.sources],
+        ids[edges.targets],
+        edges.costs,
+    )
+
+
+@pytest.fixture
+def graph():
+    #   10 -> 20 -> 40
+    #    \--> 30 --/      (10 -> 30 -> 40 is cheaper)
+    #   50 is isolated
+    return RouteGraph.from_arrays(
+        ids=[40, 10, 30, 20, 50],
+        names=["D", "A", "C", "B", "E"],
+        lat=[0, 0, 1, 1, 5],
+        lon=[3, 0, 1, 2, 5],
+        sources=[10, 20, 10, 30, 99],
+        targets=[20, 40, 30, 40, 10],
+        costs=[1.0, 5.0, 2.0, 2.0, 1.0],
+    )
+
+
+def test_csr_layout_wout_db(graph: RouteGraph):
+    assert graph.ids.tolist() == [10, 20, 30, 40, 50]
+    assert graph.names == ["A", "B", "C", "D", "E"]
+    # edge from unknown waypoint 99 is dropped
+    assert graph.edge_count == 4
+    assert graph.indptr.tolist() == [0, 2, 3, 4, 4, 4]
+    assert graph.indices.tolist() == [1, 2, 3, 3]
+
+
+def test_shortest_path_wout_db(graph: RouteGraph):
+    result = graph.shortest_path(graph.index_of(10), graph.index_of(40))
+
+    assert graph.waypoint_names(result.path) == ["A", "C", "D"]
+    assert graph.waypoint_ids(result.path) == [10, 30, 40]
+    assert result.cost == 4.0
+
+
+def test_shortest_path_unreachable_wout_db(graph: RouteGraph):
+    result = graph.shortest_path(graph.index_of(10), graph.index_of(50))
+
+    assert result.path == []
+    assert graph.index_of(99) is None
+
+
+@pytest.mark.parametrize("algorithm", list(SearchAlgorithm))
+def test_algorithms_agree_wout_db(algorithm):
+    graph = random_graph()
+    rng = np.random.default_rng(1)
+    for source, target in rng.integers(0, graph.node_count, (20, 2)).tolist():
+        expected = graph.shortest_path(source, target)
+        result = graph.search(source, target, algorithm)
+
+        assert result.cost == pytest.approx(expected.cost)
+        if result.path:
+            assert result.path[0] == source and result.path[-1] == target
+
+
+def test_astar_expands_less_wout_db():
+    graph = random_graph()
+    source, target = 0, int(np.argmax(graph.lat))
+
+    dijkstra = graph.search(source, target, SearchAlgorithm.dijkstra)
+    astar = graph.search(source, target, SearchAlgorithm.astar)
+
+    assert graph.heuristic_scale == pytest.approx(1.0)
+    assert astar.cost == pytest.approx(dijkstra.cost)
+    assert astar.expanded < dijkstra.expanded
+
+
+def test_contraction_hierarchy_matches_dijkstra_wout_db():
+    graph = random_graph()
+    hierarchy = graph.hierarchy
+
+    assert hierarchy.shortcut_count > 0
+    assert verify(graph, hierarchy, samples=100) == []
+
+    source, target = 0, int(np.argmax(graph.lat))
+    assert graph.search(source, target, SearchAlgorithm.ch).expanded < (
+        graph.search(source, target, SearchAlgorithm.dijkstra).expanded
+    )
+
+
+async def test_hierarchy_built_once_in_background_wout_db():
+    engine = RouteGraphEngine()
+    graph = random_graph().by_time
+
+    assert not engine.hierarchy_ready(graph, CostMetric.time)
+    (building,) = engine._contracting.values()
+    # concurrent requests wait for the same build
+    assert not engine.hierarchy_ready(graph, CostMetric.time)
+    assert list(engine._contracting.values()) == [building]
+
+    await building
+    await asyncio.sleep(0)  # done callbacks run on the next loop iteration
+    assert engine.hierarchy_ready(graph, CostMetric.time)
+    assert not engine._contracting
+    result = graph.search(0, 1, SearchAlgorithm.ch)
+    assert result.cost == pytest.approx(graph.shortest_path(0, 1).cost)
+
+
+def test_k_shortest_paths_wout_db(graph: RouteGraph):
+    source, target = graph.index_of(10), graph.index_of(40)
+    paths = graph.k_shortest_paths(source, target, k=5)
+
+    assert [graph.waypoint_names(p.path) for p in paths] == [
+        ["A", "C", "D"],
+        ["A", "B", "D"],
+    ]
+    assert [p.cost for p in paths] == [4.0, 6.0]
+
+
+def test_k_shortest_paths_are_loopless_and_sorted_wout_db():
+    graph = random_graph()
+    paths = graph.k_shortest_paths(0, int(np.argmax(graph.lat)), k=8)
+
+    assert len(paths) == 8
+    costs = [p.cost for p in paths]
+    assert costs == sorted(costs)
+    assert costs[0] == pytest.approx(graph.shortest_path(0, paths[0].path[-1]).cost)
+    assert all(len(set(p.path)) == len(p.path) for p in paths)
+    assert len({tuple(p.path) for p in paths}) == 8
+
+    assert len(graph.k_shortest_paths(0, paths[0].path[-1], k=8, deadline=0)) == 1
+
+
+def test_time_weighted_search_wout_db(graph):
+    # same topology, but the longer 10 -> 20 -> 40 is the faster route
+    timed = RouteGraph.from_arrays(
+        ids=[40, 10, 30, 20, 50],
+        names=["D", "A", "C", "B", "E"],
+        lat=[0, 0, 1, 1, 5],
+        lon=[3, 0, 1, 2, 5],
+        sources=[10, 20, 10, 30],
+        targets=[20, 40, 30, 40],
+        costs=[1.0, 5.0, 2.0, 2.0],
+        times=[60.0, 60.0, 200.0, np.nan],
+    )
+    source, target = timed.index_of(10), timed.index_of(40)
+
+    by_distance = timed.weighted(CostMetric.distance).search(source, target)
+    assert timed.waypoint_names(by_distance.path) == ["A", "C", "D"]
+    by_time = timed.weighted(CostMetric.time)
+    for algorithm in SearchAlgorithm:
+        result = by_time.search(source, target, algorithm)
+        assert timed.waypoint_names(result.path) == ["A", "B", "D"]
+        assert result.cost == pytest.approx(120.0)
+    # missing times fall back to the still-air time of the distance
+    assert graph.times[0] > 0
@@ -0,0 +1,49 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from app.graph import RouteGraph
+from app.matching import match_track
+from tests.test_graph import random_graph
+
+
+@pytest.fixture(scope="module")
+def track():
+    with open("sample_tech_test.json") as f:
+        sample = json.loads(f.read())
+    return (
+        np.array(sample["LATITUDE"], dtype=np.float32),
+        np.array(sample["LONGITUDE"], dtype=np.float32),
+    )
+
+
+def test_match_track_wout_db(track):
+    lat, lon = track
+    # fixes 1 km off every 2000th track point, plus a far away decoy
+    along = np.arange(0, len(lat), 2000)
+    graph = RouteGraph.from_arrays(
+        ids=[*(along + 1), 99999, 5],
+        names=[*(f"FIX{i}" for i in along), "FAR", "NOPOS"],
+        lat=[*(lat[along] + 0.009), -40.0, np.nan],
+        lon=[*lon[along], 100.0, np.nan],
+        sources=[],
+        targets=[],
+        costs=[],
+    )
+
+    nodes = match_track(graph, lat, lon, radius_km=3)
+
+    assert graph.waypoint_ids(nodes) == (along + 1).tolist()
+    assert match_track(graph, lat, lon, radius_km=0.1) == []
+
+
+def test_match_track_speed_wout_db(track):
+    lat, lon = track
+    graph = random_graph(size=20_000, k=1)
+    match_track(graph, lat, lon)  # builds the spatial index
+
+    started = time.perf_counter()
+    match_track(graph, lat, lon)
+    assert time.perf_counter() - started < 0.1
@@ -0,0 +1,80 @@
+import httpx
+from fastapi import FastAPI
+
+from app.cache import LocalResultCache
+from app.executor import ComputeExecutor
+from app.graph import RouteGraphEngine
+from app.metrics import Histogram, Metrics, MetricsMiddleware, TimedConnection
+
+
+class FakeConnection:
+    async def fetch_val(self, query, values=None, column=0):
+        return 1
+
+    def transaction(self):
+        return "transaction"
+
+
+class Service:
+    def __init__(self, db):
+        self.db = db
+
+    async def get_report(self):
+        return await self._fetch()
+
+    async def _fetch(self):
+        return await self.db.fetch_val("SELECT 1")
+
+
+def test_histogram_render_wout_db():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5.0, "/a")
+
+    assert list(histogram.render()) == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.55',
+        'latency_seconds_count{route="/a"} 3',
+    ]
+
+
+async def test_timed_connection_wout_db():
+    metrics = Metrics()
+    service = Service(TimedConnection(FakeConnection(), metrics.db_seconds))
+
+    assert await service.get_report() == 1
+    # private helpers are charged to the public method that called them
+    assert list(metrics.db_seconds._series) == [("Service.get_report", "fetch_val")]
+    assert service.db.transaction() == "transaction"
+
+
+async def test_metrics_middleware_wout_db():
+    metrics = Metrics()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/items/1")
+        await client.get("/items/2")
+        await client.get("/missing")
+
+    series = metrics.request_seconds._series
+    assert sum(series[("GET", "/items/{item_id}", "200")][:-1]) == 2
+    assert ("GET", "unmatched", "404") in series
+
+    text = metrics.render(
+        LocalResultCache(), RouteGraphEngine(), ComputeExecutor(processes=0)
+    )
+    assert 'http_request_duration_seconds_count{method="GET"' in text
+    assert "result_cache_hits_total 0" in text
+    assert "route_graph_nodes 0" in text
@@ -0,0 +1,81 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from app.ofp import RoutePoint, RouteSyntaxError, parse_ofp, parse_route
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open("sample_tech_test.json") as f:
+        return json.loads(f.read())
+
+
+def test_parse_sample_route_wout_db(sample):
+    route = parse_route(sample["fpl"])
+
+    assert (route.departure, route.departure_runway) == ("GCFV", "01")
+    assert (route.arrival, route.arrival_runway) == ("EDDL", "23L")
+    assert route.cruise == "F360"
+    assert route.star == "BIKMU1G"
+    assert route.points[0] == RoutePoint("VASTO")
+    assert RoutePoint("NUBLO", speed_level="F380") in route.points
+    assert RoutePoint("TSU", via="UM163") in route.points
+    assert RoutePoint("VALEK", via="UN858", speed_level="F370") in route.points
+    assert route.names[-3:] == ["NVO", "BIKMU", "EDDL"]
+
+
+@pytest.mark.parametrize(
+    ["route", "expected"],
+    [
+        ("EGLL N0450F350 DVR9J DVR UL9 KONAN EHAM", ("DVR9J", "N0450F350")),
+        ("EGLL/27R M082F370 5530N02000W DCT 56N030W EHAM", (None, "M082F370")),
+    ],
+)
+def test_parse_route_variants_wout_db(route, expected):
+    parsed = parse_route(route)
+
+    assert (parsed.sid, parsed.cruise) == expected
+    assert len(parsed.points) == 2
+
+
+def test_parse_route_a_series_airway_wout_db():
+    route = parse_route("EGLL N0450F350 DVR A791 KOK UL607 EDDL")
+
+    assert route.cruise == "N0450F350"
+    assert route.points == [
+        RoutePoint("DVR"),
+        RoutePoint("KOK", via="A791"),
+    ]
+
+
+def test_parse_route_rejects_garbage_wout_db():
+    with pytest.raises(RouteSyntaxError):
+        parse_route("GCFV VASTO dct EDDL")
+    with pytest.raises(RouteSyntaxError):
+        parse_route("VASTO BAROK")
+    with pytest.raises(RouteSyntaxError):
+        parse_route("EGLL DVR DET/garbage EDDL")
+
+
+def test_parse_ofp_wout_db(sample):
+    ofp = parse_ofp(sample)
+    names = ofp.fpl_names()
+
+    assert ofp.route.sid == "VASTO9Q"
+    assert ofp.fuel_consumption == 9752
+    assert ofp.duration == timedelta(hours=3, minutes=52, seconds=16)
+    assert names[0] == "GCFV" and names[-1] == "EDDL"
+    # climb/descent points and FIR boundaries are not fixes
+    assert not {"TOC", "TOD", "GCCC", "LPPC"} & set(names)
+    assert {p.name for p in ofp.route.points} <= set(names)
+
+
+def test_parse_ofp_needs_aerodrome_positions_wout_db(sample):
+    document = json.loads(json.dumps(sample))
+    document["lastOfp"]["waypoints"] = [
+        wp for wp in document["lastOfp"]["waypoints"] if wp["name"] != "EDDL"
+    ]
+    with pytest.raises(ValueError, match="EDDL"):
+        parse_ofp(document)
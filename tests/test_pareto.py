@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.graph import RouteGraph
+from app.pareto import non_dominated
+from tests.test_graph import random_graph
+
+
+def test_non_dominated_wout_db():
+    costs = [
+        [3, 1],
+        [1, 3],
+        [2, 2],
+        [3, 3],  # dominated by all of the above
+        [1, 3],  # a tie is not dominated
+    ]
+    assert non_dominated(costs).tolist() == [1, 4, 2, 0]
+    assert non_dominated(costs, max_size=2).tolist() == [1, 0]
+    assert non_dominated(np.empty((0, 2))).tolist() == []
+
+
+def test_pareto_paths_wout_db():
+    graph = random_graph(size=300)
+    # times that disagree with distance, so the front has trade-offs
+    times = graph.costs * np.random.default_rng(1).uniform(0.5, 1.5, graph.edge_count)
+    graph = RouteGraph(
+        graph.ids,
+        graph.names,
+        graph.lat,
+        graph.lon,
+        graph.indptr,
+        graph.indices,
+        graph.costs,
+        times,
+    )
+    front = graph.pareto_paths(0, 250, max_front=1000)
+
+    assert len(front) > 1
+    costs = [(p.time, p.distance) for p in front]
+    assert non_dominated(costs).tolist() == list(range(len(front)))
+    # the ends of the front are the single-criterion optima
+    assert front[0].time == graph.by_time.shortest_path(0, 250).cost
+    assert front[-1].distance == graph.shortest_path(0, 250).cost
+    for path in front:
+        assert path.path[0] == 0 and path.path[-1] == 250
+
+    capped = graph.pareto_paths(0, 250, max_front=3)
+    assert len(capped) == 3
+    assert all(path in front for path in capped)
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+from databases import Database
+from httpx import AsyncClient
+
+from app.deps import get_settings
+from app.models import aircrafts, airlines, waypoints
+from app.partitions import (
+    add_months,
+    months,
+    partition_month,
+    partition_name,
+    retire_partition,
+)
+from app.settings import Settings
+from main import app
+
+
+def test_months_wout_db():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert months(datetime(2023, 11, 20, 8), date(2024, 1, 31)) == [
+        date(2023, 11, 1),
+        date(2023, 12, 1),
+        date(2024, 1, 1),
+    ]
+    assert partition_name(date(2024, 3, 1)) == "flights_p202403"
+    assert partition_month("flights_p202403") == date(2024, 3, 1)
+    assert partition_month("flights_p2024") is None
+    assert partition_month("flights_default") is None
+
+
+def test_retire_partition_wout_db():
+    dropped = retire_partition(date(2024, 3, 1), None)
+    assert dropped[0] == "ALTER TABLE flights DETACH PARTITION flights_p202403"
+    assert dropped[-1] == "DROP TABLE flights_p202403"
+
+    archived = retire_partition(date(2024, 3, 1), "archive")
+    assert archived[-1] == "ALTER TABLE flights_p202403 SET SCHEMA archive"
+    assert not any(s.startswith("DROP") for s in archived)
+
+
+async def test_flights_partitioned_by_month(client: AsyncClient, db: Database):
+    airline = await db.execute(airlines.insert().values(name="airline"))
+    aircraft = await db.execute(aircrafts.insert().values(name="aircraft"))
+    dep = await db.execute(waypoints.insert().values(name="dep"))
+    arr = await db.execute(waypoints.insert().values(name="arr"))
+    # partitions for months this far back are created on first write
+    flights = []
+    for day in ("2019-03-05", "2019-04-05"):
+        flight = {
+            "fpl": [dep, arr],
+            "airline_id": airline,
+            "aircraft_id": aircraft,
+            "fuel_consumption": 500,
+            "departure": dep,
+            "arrival": arr,
+            "departure_time": f"{day}T14:30:00",
+            "arrival_time": f"{day}T15:30:00",
+        }
+        response = await client.post("/flights/routes", json=flight)
+        assert response.status_code == 200, response.json()
+        flights.append(flight)
+
+    partitions = (await client.get("/admin/partitions")).json()
+    names = [partition["name"] for partition in partitions]
+    assert {"flights_p201903", "flights_p201904"} <= set(names)
+
+    rows = await db.fetch_all(
+        """
+        EXPLAIN SELECT count(*) FROM flights
+        WHERE departure_time >= :start AND departure_time < :end
+        """,
+        values={"start": datetime(2019, 3, 1), "end": datetime(2019, 4, 1)},
+    )
+    plan = "\n".join(row["QUERY PLAN"] for row in rows)
+    assert "flights_p201903" in plan
+    assert "flights_p201904" not in plan
+
+    retire = {"before": "2019-04-01"}
+    response = await client.post("/admin/partitions/retire", params=retire)
+    assert response.status_code == 404  # off unless PARTITION_ADMIN_ENABLED
+
+    app.dependency_overrides[get_settings] = lambda: Settings(
+        PARTITION_ADMIN_ENABLED=True
+    )
+    response = await client.post("/admin/partitions/retire", params=retire)
+    assert response.json() == {"retired": ["flights_p201903"], "archived": True}
+    assert await db.fetch_val("SELECT count(*) FROM archive.flights_p201903") == 1
+    assert await db.fetch_val(
+        "SELECT count(*) FROM flights WHERE departure = :dep", values={"dep": dep}
+    ) == 1
+
+    # the month is written to again, and cannot be archived over the first copy
+    response = await client.post("/flights/routes", json=flights[0])
+    assert response.status_code == 200, response.json()
+    response = await client.post("/admin/partitions/retire", params=retire)
+    assert response.status_code == 409
+    assert "archive.flights_p201903 already exists" in response.json()["detail"]
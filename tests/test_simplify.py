@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.geodesy import to_unit_vectors
+from app.simplify import (
+    EARTH_RADIUS_M,
+    _segment_distance,
+    douglas_peucker,
+    downsample,
+    visvalingam,
+)
+
+
+@pytest.fixture(scope="module")
+def track():
+    with open("sample_tech_test.json") as f:
+        sample = json.loads(f.read())
+    return (
+        np.array(sample["LATITUDE"], dtype=np.float32),
+        np.array(sample["LONGITUDE"], dtype=np.float32),
+    )
+
+
+def recursive_douglas_peucker(points, first, last, max_angle, kept):
+    if last - first < 2:
+        return
+    n = last - first - 1
+    angles = _segment_distance(
+        points[first + 1:last],
+        np.repeat(points[first][None], n, 0),
+        np.repeat(points[last][None], n, 0),
+    )
+    farthest = int(np.argmax(angles))
+    if angles[farthest] > max_angle:
+        middle = first + 1 + farthest
+        kept.add(middle)
+        recursive_douglas_peucker(points, first, middle, max_angle, kept)
+        recursive_douglas_peucker(points, middle, last, max_angle, kept)
+
+
+@pytest.mark.parametrize("tolerance", [10, 500])
+def test_douglas_peucker_wout_db(track, tolerance):
+    lat, lon = track
+    kept = douglas_peucker(lat, lon, tolerance)
+
+    points = to_unit_vectors(lat.astype(np.float64), lon.astype(np.float64))
+    expected = {0, len(lat) - 1}
+    recursive_douglas_peucker(
+        points, 0, len(lat) - 1, tolerance / EARTH_RADIUS_M, expected
+    )
+    assert kept.tolist() == sorted(expected)
+
+    # every dropped point is within tolerance of the segment it falls in
+    segment = np.searchsorted(kept, np.arange(len(lat)), "right") - 1
+    segment = np.minimum(segment, len(kept) - 2)
+    distance = _segment_distance(
+        points, points[kept[segment]], points[kept[segment + 1]]
+    )
+    assert distance.max() * EARTH_RADIUS_M <= tolerance
+
+
+def test_visvalingam_wout_db(track):
+    lat, lon = track
+    coarse = visvalingam(lat, lon, 1000)
+    fine = visvalingam(lat, lon, 10)
+
+    assert coarse[0] == fine[0] == 0
+    assert coarse[-1] == fine[-1] == len(lat) - 1
+    assert 2 <= len(coarse) < len(fine) < len(lat)
+
+
+def test_short_tracks_wout_db():
+    assert douglas_peucker([1.0, 2.0], [1.0, 2.0], 10).tolist() == [0, 1]
+    assert visvalingam([1.0], [1.0], 10).tolist() == [0]
+
+
+def test_downsample_wout_db():
+    assert downsample(5, 10).tolist() == [0, 1, 2, 3, 4]
+    assert downsample(101, 5).tolist() == [0, 25, 50, 75, 100]
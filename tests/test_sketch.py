@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.sketch import PERCENTILES, TDigest, fold_sketches, merged_percentiles
+
+
+def test_quantiles_within_rank_error_wout_db():
+    values = np.random.default_rng(1).lognormal(8, 0.4, 100_000)
+    digest = TDigest.of(values)
+
+    assert digest.count == len(values)
+    assert len(digest) <= digest.compression
+    for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+        rank = (values < digest.quantile(q)).mean()
+        assert abs(rank - q) < 0.002 * max(1, 10 * min(q, 1 - q))
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+
+
+def test_merged_digests_match_one_digest_wout_db():
+    values = np.random.default_rng(2).normal(3600, 600, 50_000)
+    days = [TDigest.of(day) for day in np.array_split(values, 365)]
+    merged = TDigest.merged(TDigest.from_bytes(d.to_bytes()) for d in days)
+
+    assert merged.count == len(values)
+    assert len(merged) <= merged.compression
+    estimates = merged.quantile([0.5, 0.9, 0.99])
+    np.testing.assert_allclose(
+        estimates, np.quantile(values, [0.5, 0.9, 0.99]), rtol=0.005
+    )
+
+
+def test_empty_and_missing_values_wout_db():
+    assert TDigest.of([]).to_bytes() == b""
+    assert TDigest.from_bytes(b"").count == 0
+    assert np.isnan(TDigest().quantile(0.5))
+
+    (fuel,) = fold_sketches([b""], [[None, 100.0, 300.0]])
+    assert TDigest.from_bytes(fuel).count == 2
+    (sketch,) = fold_sketches([fuel], [[200.0]])
+    assert TDigest.from_bytes(sketch).quantile(0.5) == 200.0
+
+    (stats, empty) = merged_percentiles([[sketch, b""], [b""]], PERCENTILES)
+    assert stats == {"p50": 200.0, "p90": 300.0, "p99": 300.0}
+    assert empty == {"p50": None, "p90": None, "p99": None}
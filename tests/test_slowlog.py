@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+from databases import Database
+from sqlalchemy import select
+
+from app.models import flights
+from app.schemas import SlowQuery as SlowQuerySchema
+from app.slowlog import SlowQuery, SlowQueryLog, is_read_only, normalize, summarize
+
+
+def test_slow_queries_grouped_by_shape_wout_db():
+    log = SlowQueryLog(threshold=0.1, size=2)
+    log.record("SELECT 1", None, 0.05, "fast")
+    assert len(log) == 0
+
+    query = """
+        SELECT fpl FROM route_usage
+        WHERE departure = :departure;
+    """
+    log.record(query, {"departure": 1}, 0.5, "get_most_used_route")
+    log.record(" ".join(query.split()), {"departure": 2}, 0.2, "get_most_used_route")
+    log.record("SELECT :ids", {"ids": list(range(100))}, 0.3, "bulk")
+
+    slowest, other = log.entries()
+    assert slowest.shape == "SELECT fpl FROM route_usage WHERE departure = :departure"
+    assert slowest.count == 2
+    assert slowest.total_seconds == 0.7
+    assert slowest.max_seconds == 0.5
+    assert slowest.last_values == {"departure": 2}
+    assert other.last_values["ids"][-1] == "... 100 items"
+
+    # least recently slow shape goes first
+    log.record("SELECT 2", None, 1.0, "other")
+    assert [q.shape for q in log.entries()] == ["SELECT 2", "SELECT :ids"]
+
+
+def test_binary_values_summarized_wout_db():
+    summary = summarize(
+        {"latitude": b"\xff" * 4000, "fuel": [b"\x00" * 16, memoryview(b"ab")]}
+    )
+    assert summary == {
+        "latitude": "<bytes len=4000>",
+        "fuel": ["<bytes len=16>", "<bytes len=2>"],
+    }
+    # what GET /admin/slow-queries serializes
+    SlowQuerySchema.model_validate(
+        {
+            **SlowQuery("abc", "UPDATE", "test", last_values=summary).as_dict(),
+            "last_seen": datetime.now(timezone.utc),
+        }
+    ).model_dump_json()
+
+
+def test_only_selects_are_explained_wout_db():
+    assert is_read_only(normalize("  SELECT * FROM flights"))
+    assert not is_read_only(normalize("SELECT id FROM jobs FOR UPDATE SKIP LOCKED"))
+    assert not is_read_only(normalize("UPDATE jobs SET status = 'running'"))
+    assert not is_read_only(normalize("INSERT INTO edges SELECT 1"))
+
+
+async def test_slow_query_explained(db: Database):
+    log = SlowQueryLog(threshold=0.0, explain_rate=1.0)
+    log.database = db
+    log.record("SELECT :value + 1", {"value": 1}, 0.5, "test")
+    await log._explaining
+
+    (entry,) = log.entries()
+    assert "Result" in entry.plan
+    assert "Execution Time" not in entry.plan  # not run again by default
+    assert entry.plan_values == {"value": 1}
+    assert log._explaining is None
+
+    log = SlowQueryLog(threshold=0.0, explain_rate=1.0, analyze=True)
+    log.database = db
+    log.record("SELECT :value + 1", {"value": 1}, 0.5, "test")
+    await log._explaining
+    assert "Execution Time" in log.entries()[0].plan
+
+
+def test_statements_not_explained_wout_db():
+    log = SlowQueryLog(threshold=0.0, explain_rate=1.0)
+    log.database = object()  # never reached
+    log.record(select(flights.c.id).where(flights.c.id == 1), None, 0.5, "test")
+
+    (entry,) = log.entries()
+    assert entry.shape.startswith("SELECT flights.id FROM flights")
+    assert log._explaining is None
@@ -0,0 +1,93 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.graph import RouteGraph, RouteGraphEngine
+from app.snapshot import HEADER_SIZE, SnapshotError, read_header
+from tests.test_graph import random_graph
+
+
+def test_snapshot_round_trip_wout_db(tmp_path):
+    graph = random_graph(size=300)
+    graph.names[7] = None  # waypoints without a name survive as None
+    path = str(tmp_path / "graph.snapshot")
+    graph.save(path)
+
+    loaded = RouteGraph.load(path)
+    assert read_header(path).node_count == graph.node_count
+    assert not loaded.costs.flags.writeable
+    for name in ("ids", "lat", "lon", "indptr", "indices", "costs", "times"):
+        assert np.array_equal(getattr(loaded, name), getattr(graph, name))
+    assert list(loaded.names) == graph.names
+    assert loaded.index_of(42) == graph.index_of(42) == 41
+    assert loaded.index_of(10_000) is None
+
+    expected = graph.shortest_path(0, 250)
+    assert loaded.shortest_path(0, 250) == expected
+    assert loaded.waypoint_names(expected.path) == graph.waypoint_names(expected.path)
+
+
+def test_snapshot_replaced_atomically_wout_db(tmp_path):
+    path = str(tmp_path / "graph.snapshot")
+    random_graph(size=50).save(path)
+    old = RouteGraph.load(path)
+
+    random_graph(size=80, seed=1).save(path)
+    # the old mapping keeps the file it was made from
+    assert old.node_count == 50
+    assert old.shortest_path(0, 40).cost > 0
+    assert RouteGraph.load(path).node_count == 80
+    assert [p for p in os.listdir(tmp_path)] == ["graph.snapshot"]
+
+
+def test_corrupt_snapshot_wout_db(tmp_path):
+    path = str(tmp_path / "graph.snapshot")
+    random_graph(size=50).save(path)
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + 3)
+        f.write(b"\xff")
+    with pytest.raises(SnapshotError):
+        RouteGraph.load(path)
+    RouteGraph.load(path, verify=False)  # only the checksum catches this
+
+    with open(path, "r+b") as f:
+        f.truncate(HEADER_SIZE + 16)
+    with pytest.raises(SnapshotError):
+        RouteGraph.load(path, verify=False)
+
+
+async def test_engine_maps_shared_snapshot_wout_db(tmp_path):
+    path = str(tmp_path / "graph.snapshot")
+    random_graph(size=50).save(path)
+    engine = RouteGraphEngine(snapshot_path=path)
+    engine.SNAPSHOT_CHECK_INTERVAL = 0.0
+
+    # a fresh snapshot is mapped without touching the database
+    graph = await engine.get(db=None)
+    assert graph.node_count == 50
+    assert await engine.get(db=None) is graph
+
+    # another worker rebuilt the graph
+    random_graph(size=80, seed=1).save(path)
+    assert (await engine.get(db=None)).node_count == 80
+    assert engine.version == 2
+
+
+async def test_engine_contracts_off_the_event_loop_wout_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "graph.snapshot")
+    random_graph(size=50).save(path)
+    engine = RouteGraphEngine(contract=True, verify_samples=5, snapshot_path=path)
+    threads = []
+    contract = engine._contract
+    monkeypatch.setattr(
+        engine,
+        "_contract",
+        lambda *args: threads.append(threading.get_ident()) or contract(*args),
+    )
+
+    graph = await engine.get(db=None)
+    assert len(threads) == 2  # one hierarchy per cost metric
+    assert threading.get_ident() not in threads
+    assert "hierarchy" in graph.__dict__  # built, and cached on the graph
@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.trajectory import Trajectory, pack, read_track_arrays, seconds_since
+
+
+async def stream_file(path, chunk_size):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open("sample_tech_test.json") as f:
+        return json.loads(f.read())
+
+
+@pytest.mark.parametrize("chunk_size", [7, 65536])
+async def test_read_track_arrays_wout_db(sample, chunk_size):
+    arrays = await read_track_arrays(
+        stream_file("sample_tech_test.json", chunk_size)
+    )
+
+    assert set(arrays) == {"latitude", "longitude", "altitude"}
+    for column in arrays:
+        expected = np.array(sample[column.upper()], dtype=np.float32)
+        assert arrays[column].dtype == np.float32
+        assert np.array_equal(arrays[column], expected)
+
+
+async def chunked(document: bytes, chunk_size: int):
+    for start in range(0, len(document), chunk_size):
+        yield document[start : start + chunk_size]
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'{"LATITUDE": [1.5, 2.5, 3.5], "LONGITUDE": [1.5, oops, 3.5]}',
+        b'{"LATITUDE": [1.0, 2.0, 3.0',
+        b'{"LATITUDE": [1.0, 2.0, 3.0]',
+        b'{"LATITUDE": [1.0, NaN, 3.0]}',
+        b'{"LATITUDE": [1.0, 1e400, 3.0]}',
+        b'{"LATITUDE": [1.0, 1e39, 3.0]}',  # beyond float32
+    ],
+)
+async def test_read_track_arrays_rejects_garbage_wout_db(document):
+    with pytest.raises(ValueError):
+        await read_track_arrays(chunked(document, 5))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+async def test_read_track_arrays_top_level_only_wout_db(chunk_size):
+    document = (
+        b'{"x": {"LATITUDE": [9]}, "note": "\\"LONGITUDE\\": [9]",'
+        b' "LATITUDE": [1, 2], "LONGITUDE": [3, 4], "y": [["TIME", [9]]]}'
+    )
+    arrays = await read_track_arrays(chunked(document, chunk_size))
+
+    assert set(arrays) == {"latitude", "longitude"}
+    assert arrays["latitude"].tolist() == [1, 2]
+    assert arrays["longitude"].tolist() == [3, 4]
+
+
+def test_trajectory_views_wout_db():
+    row = {
+        "latitude": pack(np.arange(10)),
+        "longitude": pack(np.arange(10) * 2),
+        "altitude": None,
+        "time": pack(np.arange(10) * 60),
+    }
+    trajectory = Trajectory.from_row(row)
+
+    sliced = trajectory[2:5]
+    assert sliced.latitude.tolist() == [2, 3, 4]
+    assert np.shares_memory(sliced.longitude, trajectory.longitude)
+    assert sliced.altitude is None
+
+    window = trajectory.time_slice(start=120, end=300)
+    assert window.latitude.tolist() == [2, 3, 4, 5]
+    assert window.to_dict()["longitude"] == [4, 6, 8, 10]
+    assert window.to_dict()["time"] == [120, 180, 240, 300]
+
+
+def test_seconds_since_wout_db():
+    departure = datetime(2023, 10, 31, 6, 0)  # stored as naive UTC
+    moment = datetime(2023, 10, 31, 8, 1, tzinfo=timezone(timedelta(hours=2)))
+
+    assert seconds_since(departure, moment) == 60
+    assert seconds_since(departure, moment.replace(tzinfo=None)) == 7260
+    assert seconds_since(departure, None) is None
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.geodesy import haversine
+from app.wind import (
+    KM_PER_NM,
+    WindField,
+    leg_times,
+    true_airspeed,
+    wind_from_ofp,
+    wind_report,
+)
+
+
+def test_true_airspeed_wout_db():
+    assert true_airspeed(0.78, 350) == pytest.approx(450, abs=2)
+    # above the tropopause temperature, hence TAS, stops falling
+    assert true_airspeed(0.78, 390) == pytest.approx(true_airspeed(0.78, 370))
+    assert true_airspeed(0.78, 350, delta_isa=10) > true_airspeed(0.78, 350)
+
+
+def test_leg_times_wout_db():
+    # a 100 kt westerly over a west-east leg along the equator
+    wind = WindField(lat=[0.0], lon=[5.0], direction=[270], speed=[100])
+    lat1, lon1, lat2, lon2 = [0.0, 0.0], [4.0, 6.0], [0.0, 0.0], [6.0, 4.0]
+    distance_nm = haversine(0.0, 4.0, 0.0, 6.0) / KM_PER_NM
+
+    calm = leg_times(lat1, lon1, lat2, lon2, 450)
+    east, west = leg_times(lat1, lon1, lat2, lon2, 450, wind)
+
+    assert calm == pytest.approx([distance_nm / 450 * 3600] * 2)
+    assert east < calm[0] < west
+    assert east == pytest.approx(distance_nm / (450 + 100) * 3600, rel=0.01)
+
+
+def test_crosswind_wout_db():
+    wind = WindField(lat=[0.0], lon=[5.0], direction=[180], speed=[100])
+    (seconds,) = leg_times([0.0], [4.0], [0.0], [6.0], 450, wind)
+    distance_nm = haversine(0.0, 4.0, 0.0, 6.0) / KM_PER_NM
+    ground_speed = np.sqrt(450**2 - 100**2)
+    assert seconds == pytest.approx(distance_nm / ground_speed * 3600, rel=0.01)
+
+
+def test_wind_fades_to_calm_wout_db():
+    wind = WindField(lat=[0.0], lon=[0.0], direction=[270], speed=[100])
+    east, north = wind.at(np.array([0.0, 0.0]), np.array([0.1, 90.0]))
+    assert east[0] == pytest.approx(100, rel=0.01)
+    assert east[1] == north[1] == 0
+
+
+def test_wind_from_ofp_wout_db():
+    with open("sample_tech_test.json") as f:
+        snapshot = wind_from_ofp(json.loads(f.read()))
+    assert len(snapshot.wind) > 0
+    assert snapshot.mach == 0.76
+    assert snapshot.flight_level == 360
+    assert 440 < snapshot.true_airspeed < 470
+
+
+def test_wind_report_round_trip_wout_db():
+    with open("sample_tech_test.json") as f:
+        document = json.loads(f.read())
+    # stored as JSON, and read back by any worker
+    report = json.loads(json.dumps(wind_report(document)))
+    stored, applied = wind_from_ofp(report), wind_from_ofp(document)
+    assert len(stored.wind) == len(applied.wind)
+    assert stored.true_airspeed == applied.true_airspeed
+    np.testing.assert_array_equal(stored.wind.east, applied.wind.east)